@@ -31,6 +31,13 @@ class CustomInfiniteCursorPaginationLoadInv(CursorPagination):
     max_page_size = 30
     ordering = "-issued_at"   # ✅ correct field
 
+
+class StockMovementCursorPagination(CursorPagination):
+    page_size = 50
+    page_size_query_param = "limit"
+    max_page_size = 200
+    ordering = ("-created_at", "-id")   # id breaks ties of rows posted together
+
 # class StandardResultsSetPagination(PageNumberPagination):
 #     page_size = 15
 #     page_size_query_param = 'page_size'
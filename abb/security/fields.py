@@ -1,41 +1,114 @@
 from django.db import models
+from django.db.models.query_utils import DeferredAttribute
+
 from .crypto import secret_crypto
 
 
+class EncryptedValue:
+    """
+    Ciphertext of a lazy encrypted field, as loaded from the database and not
+    read yet. Written back as is, without decrypting / re-encrypting.
+    """
+    __slots__ = ("ciphertext",)
 
-class EncryptedTextField(models.TextField):
-    description = "Encrypted text field"
+    def __init__(self, ciphertext):
+        self.ciphertext = ciphertext
+
+    def __repr__(self):
+        return "<EncryptedValue>"
+
+
+class LazyDecryptedAttribute(DeferredAttribute):
+    """
+    Decrypt the value on first access and keep it on the instance
+    (deferred fields are loaded first, as for any field). A data descriptor,
+    so reads go through it even once the value is in the instance __dict__.
+    """
+
+    def __set__(self, instance, value):
+        instance.__dict__[self.field.attname] = value
+
+    def __get__(self, instance, cls=None):
+        if instance is None:
+            return self
+
+        value = super().__get__(instance, cls)
+
+        if isinstance(value, EncryptedValue):
+            value = self.field.decrypt(value.ciphertext)
+            instance.__dict__[self.field.attname] = value
+
+        return value
+
+
+class EncryptedFieldMixin:
+    """
+    lazy=True: rows are loaded without decrypting; the value is decrypted
+    when the attribute is first read. values() / values_list() return
+    EncryptedValue for the field.
+    """
+
+    def __init__(self, *args, lazy=False, **kwargs):
+        self.lazy = lazy
+        super().__init__(*args, **kwargs)
+
+    @property
+    def descriptor_class(self):
+        return LazyDecryptedAttribute if self.lazy else DeferredAttribute
+
+    def deconstruct(self):
+        name, path, args, kwargs = super().deconstruct()
+        if self.lazy:
+            kwargs["lazy"] = True
+        return name, path, args, kwargs
 
     def from_db_value(self, value, expression, connection):
         if value is None:
             return value
-        return secret_crypto.decrypt_text(value)
+        if self.lazy:
+            return EncryptedValue(value)
+        return self.decrypt(value)
 
-    def to_python(self, value):
-        # When already loaded into python, keep as-is.
-        if value is None or not isinstance(value, str):
+    def pre_save(self, model_instance, add):
+        # a value never read is saved without going through the descriptor
+        value = model_instance.__dict__.get(self.attname)
+        if isinstance(value, EncryptedValue):
             return value
-        return value
+        return super().pre_save(model_instance, add)
 
     def get_prep_value(self, value):
         if value is None:
             return value
-        return secret_crypto.encrypt_text(str(value))
+        if isinstance(value, EncryptedValue):
+            return value.ciphertext
+        return self.encrypt(value)
 
 
-class EncryptedJSONField(models.TextField):
+class EncryptedTextField(EncryptedFieldMixin, models.TextField):
+    description = "Encrypted text field"
 
-    def from_db_value(self, value, expression, connection):
-        if value is None:
+    def decrypt(self, value):
+        return secret_crypto.decrypt_text(value)
+
+    def encrypt(self, value):
+        return secret_crypto.encrypt_text(str(value))
+
+    def to_python(self, value):
+        # When already loaded into python, keep as-is.
+        if value is None or not isinstance(value, str):
             return value
+        return value
+
+
+class EncryptedJSONField(EncryptedFieldMixin, models.TextField):
+
+    def decrypt(self, value):
         return secret_crypto.decrypt_json(value)
 
+    def encrypt(self, value):
+        return secret_crypto.encrypt_json(value)
+
     def to_python(self, value):
         if isinstance(value, (dict, list)) or value is None:
             return value
         return value
-
-    def get_prep_value(self, value):
-        if value is None:
-            return value
-        return secret_crypto.encrypt_json(value)
\ No newline at end of file
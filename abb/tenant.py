@@ -0,0 +1,102 @@
+from django.core.cache import cache
+from django.db.models import Q
+from django.utils import timezone
+
+import logging
+logger = logging.getLogger(__name__)
+
+# Company / subscription of a user, resolved once per request.
+#
+# The result is memoized on the user (DRF and the auth middleware load a new user
+# instance for every request) and on the company, and backed by Redis so the next
+# request does not query either. app.signals invalidates the Redis entries on
+# membership, company and subscription changes; the TTL bounds staleness for
+# writes that bypass signals (queryset.update()).
+
+TENANT_CACHE_TTL = 300
+
+_MISSING = object()
+
+
+def _user_company_key(user_id):
+    return f"tenant:user_company:{user_id}"
+
+
+def _company_subscription_key(company_id):
+    return f"tenant:company_subscription:{company_id}"
+
+
+def _cache_get(key):
+    try:
+        return cache.get(key)
+    except Exception as e:
+        logger.error(f'EU901 tenant cache get {key}. Error: {e}')
+        return None
+
+
+def _cache_set(key, value):
+    try:
+        cache.set(key, value, TENANT_CACHE_TTL)
+    except Exception as e:
+        logger.error(f'EU902 tenant cache set {key}. Error: {e}')
+
+
+def _cache_delete_many(keys):
+    try:
+        cache.delete_many(keys)
+    except Exception as e:
+        logger.error(f'EU903 tenant cache delete. Error: {e}')
+
+
+def resolve_user_company(user):
+    company = getattr(user, "_tenant_company", _MISSING)
+    if company is not _MISSING:
+        return company
+
+    if not user.pk:
+        return user.company_set.all().first()
+
+    key = _user_company_key(user.pk)
+    entry = _cache_get(key)
+
+    if entry is None:
+        company = user.company_set.all().first()
+        # wrapped, so a user without company is cached too
+        _cache_set(key, (company,))
+    else:
+        company = entry[0]
+
+    user._tenant_company = company
+    return company
+
+
+def resolve_company_subscription(company):
+    """
+    Active subscription of the company today (with plan), or None.
+    """
+    today_date = timezone.now().date()
+
+    memo = getattr(company, "_tenant_subscription", None)
+    if memo is not None and memo[0] == today_date:
+        return memo[1]
+
+    key = _company_subscription_key(company.pk)
+    entry = _cache_get(key)
+
+    if entry is not None and entry[0] == today_date:
+        subscription = entry[1]
+    else:
+        subscription = company.company_subscriptions.select_related('plan').filter(
+            Q(active=True) & Q(date_start__date__lte=today_date) & Q(date_exp__date__gte=today_date)).first()
+        _cache_set(key, (today_date, subscription))
+
+    company._tenant_subscription = (today_date, subscription)
+    return subscription
+
+
+def invalidate_user_company(user_ids):
+    _cache_delete_many([_user_company_key(user_id) for user_id in user_ids])
+
+
+def invalidate_company_subscription(company_id):
+    _cache_delete_many([_company_subscription_key(company_id)])
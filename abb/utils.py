@@ -5,7 +5,6 @@ from django.utils.timezone import make_aware
 import base64
 import os
 import uuid
-import re
 import hmac
 import hashlib
 import time
@@ -18,6 +17,8 @@ from django.db.models.query import QuerySet
 from django.core.exceptions import ValidationError
 from urllib.parse import urlencode
 
+from abb.tenant import resolve_company_subscription, resolve_user_company
+
 import logging
 logger = logging.getLogger(__name__)
 
@@ -34,8 +35,9 @@ def get_default_notification_status_3():
 
 
 def get_user_company(user):
+    """ Company of the user; one lookup per request, see abb.tenant """
     try:
-        user_company = user.company_set.all().first()
+        user_company = resolve_user_company(user)
         return user_company
 
     except Exception as e:
@@ -81,8 +83,6 @@ def get_company_current_membership(user_or_company_instance=None):
     Example:
         company_current_active_subscription, current_subscription_plan_str = get_company_current_membership(request.user)
     """
-    today_date = timezone.now().date()
-
     current_subscription_plan_str = 'basic'
     company_current_active_subscription = None
     user_company = None
@@ -103,12 +103,7 @@ def get_company_current_membership(user_or_company_instance=None):
                 # print('U552', user_company)
 
                 if user_company is not None:
-                    user_company_subsriptions = user_company.company_subscriptions.all()
-
-                    # print('UT554',)
-
-                    company_current_active_subscription = user_company_subsriptions.select_related('plan').filter(
-                        Q(active=True) & Q(date_start__date__lte=today_date) & Q(date_exp__date__gte=today_date)).first()
+                    company_current_active_subscription = resolve_company_subscription(user_company)
 
                     if company_current_active_subscription:
                         current_subscription_plan_str = company_current_active_subscription.plan.membership_type
@@ -144,79 +139,6 @@ def get_contact_type_default():
     return ['client']
 
 
-def assign_new_num(items_list_qs, num):
-    """
-    Generate next sequential number based on the numeric suffix of the field `num`.
-    Example: existing numbers ['CMR1', 'CMR2'] → returns 'CMR3'
-    """
-    items_list = []
-
-    try:
-        # Extract numeric parts
-        for item in items_list_qs.iterator():
-            value = getattr(item, num, None)
-            if not value:
-                continue
-            match = re.search(r'\d+$', str(value))
-            if match:
-                items_list.append(int(match.group()))
-
-        if items_list:
-            max_int = max(items_list)
-            # Get last object's non-numeric prefix
-            query = {f"{num}__endswith": str(max_int)}
-            last_obj = items_list_qs.filter(Q(**query)).first()
-            if last_obj:
-                last_value = getattr(last_obj, num, "")
-                prefix = last_value[0:-len(str(max_int))] if last_value else ""
-                new_num = f"{prefix}{max_int + 1}"
-            else:
-                # fallback, just use number
-                new_num = str(max_int + 1)
-        else:
-            # No existing numbers → start with 1
-            new_num = "1"
-
-        return new_num
-
-    except Exception as e:
-        logger.error(f"EU433 Error in assign_new_num: {e}")
-        return "1"  # fallback
-
-
-def assign_new_num_inv(items_list_qs, num):
-    """Assigns the next number with zero-padding based on the highest existing number."""
-
-    items_list = []
-    new_num = ''
-
-    try:
-        for item in items_list_qs.iterator():
-            # Capture optional prefix (letters) and numeric part
-            match = re.match(r'(\D*)(\d+)$', str(getattr(item, num)))
-            if match:
-                prefix, number_part = match.groups()
-                items_list.append((prefix, int(number_part), len(number_part)))
-
-        if not items_list:
-            return '001'  # Default value if no records are found
-
-        # Find the highest numeric value
-        prefix, max_int, num_length = max(items_list, key=lambda x: x[1])
-
-        # Generate the next number with leading zeros preserved
-        next_number_str = str(max_int + 1).zfill(num_length)
-
-        # Construct new number (with or without prefix)
-        new_num = f'{prefix}{next_number_str}'
-
-        return new_num
-
-    except Exception as e:
-        logger.error(f"EU433 Error in assign_new_num: {e}")
-        return new_num
-
-
 def _totalsEntries(entriesList):
     piecesList = []
     weightList = []
@@ -509,6 +431,18 @@ def normalize_excel_datetime(value, tz=None):
 
     return dt.isoformat()
 
+
+def normalize_excel_datetime_series(values, tz=None):
+    """
+    Column version of normalize_excel_datetime (pandas Series in, Series out).
+    Every distinct value is parsed once, exports repeat timestamps a lot.
+    """
+    normalized = {
+        value: normalize_excel_datetime(value, tz)
+        for value in pd.unique(values)
+    }
+    return values.map(normalized.get)
+
 ###### Start Image, files uploads utils ######
 
 
@@ -0,0 +1,128 @@
+import copy
+import hashlib
+import hmac
+import threading
+import time
+
+from cryptography.fernet import Fernet
+from django.apps import apps as global_apps
+from django.conf import settings
+from django.core.cache import cache
+
+import logging
+logger = logging.getLogger(__name__)
+
+# Personal API keys (UserPersonalApiToken) are looked up by api_key_hash, an
+# HMAC-SHA256 of the raw key (keyed with ENCRYPTION_KEY), unique and indexed;
+# the encrypted key is only kept to show it to its owner.
+#
+# Validated tokens are cached in-process for API_KEY_CACHE_TTL seconds. A
+# revocation (token saved / deleted, user deactivated) bumps a version in the
+# shared cache, which empties the local caches of every process on their next
+# lookup; the TTL bounds staleness when the shared cache is unavailable.
+
+API_KEY_CACHE_TTL = 30
+API_KEY_CACHE_MAX_SIZE = 10000
+
+API_KEY_VERSION_KEY = "api_keys:version"
+
+_local_cache = {}
+_local_version = None
+_lock = threading.Lock()
+
+
+def hash_api_key(raw_key):
+    return hmac.new(
+        settings.ENCRYPTION_KEY.encode(), raw_key.encode(), hashlib.sha256
+    ).hexdigest()
+
+
+def _shared_version():
+    try:
+        return cache.get(API_KEY_VERSION_KEY, 0)
+    except Exception as e:
+        logger.error(f'EU911 api key cache version. Error: {e}')
+        return None
+
+
+def invalidate_api_keys():
+    """
+    Drop the validated tokens cached by every process.
+    """
+    with _lock:
+        _local_cache.clear()
+
+    try:
+        try:
+            cache.incr(API_KEY_VERSION_KEY)
+        except ValueError:
+            cache.set(API_KEY_VERSION_KEY, 1, None)
+    except Exception as e:
+        logger.error(f'EU912 api key cache invalidate. Error: {e}')
+
+
+def get_api_token(raw_key):
+    """
+    Active UserPersonalApiToken of the raw key (with user), or None.
+    Returns a copy of the cached instances, so request code may annotate them.
+    """
+    global _local_version
+
+    key_hash = hash_api_key(raw_key)
+    now = time.monotonic()
+    version = _shared_version()
+
+    with _lock:
+        if version != _local_version:
+            _local_cache.clear()
+            _local_version = version
+
+        entry = _local_cache.get(key_hash)
+
+    if entry is None or entry[0] < now:
+        UserPersonalApiToken = global_apps.get_model('app', 'UserPersonalApiToken')
+
+        token = (
+            UserPersonalApiToken.objects
+            .select_related("user")
+            .filter(api_key_hash=key_hash, is_active=True)
+            .first()
+        )
+
+        # a version bumped meanwhile means the token may be stale: do not cache it
+        if token is not None and version is not None:
+            with _lock:
+                if _local_version == version:
+                    if len(_local_cache) >= API_KEY_CACHE_MAX_SIZE:
+                        _local_cache.clear()
+                    _local_cache[key_hash] = (now + API_KEY_CACHE_TTL, token)
+    else:
+        token = entry[1]
+
+    if token is None:
+        return None
+
+    token = copy.copy(token)
+    token.user = copy.copy(token.user)
+    return token
+
+
+def backfill_api_key_hashes():
+    """
+    Set api_key_hash of the tokens that have an encrypted key but no hash.
+    """
+    UserPersonalApiToken = global_apps.get_model('app', 'UserPersonalApiToken')
+    cipher = Fernet(settings.ENCRYPTION_KEY)
+
+    tokens = list(
+        UserPersonalApiToken.objects
+        .filter(api_key_hash__isnull=True, encrypted_api_key__isnull=False)
+        .only("id", "encrypted_api_key")
+    )
+    for token in tokens:
+        raw_key = cipher.decrypt(bytes(token.encrypted_api_key)).decode()
+        token.api_key_hash = hash_api_key(raw_key)
+
+    UserPersonalApiToken.objects.bulk_update(tokens, ["api_key_hash"], batch_size=500)
+
+    return len(tokens)
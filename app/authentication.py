@@ -4,7 +4,7 @@ from rest_framework_simplejwt.authentication import JWTAuthentication
 from rest_framework import exceptions
 
 
-from .models import UserPersonalApiToken
+from .api_keys import get_api_token
 
 
 class CustomJWTAuthentication(JWTAuthentication):
@@ -51,17 +51,14 @@ class PersonalApiTokenAuthentication(BaseAuthentication):
         if not raw_key:
             return None
 
-        # Lookup token
-        try:
-            token = UserPersonalApiToken.objects.select_related("user").all()
-            for t in token:
-                if t.api_key == raw_key:  # decrypt & compare
-                    if not t.user.is_active:
-                        raise exceptions.AuthenticationFailed("User inactive")
-                    if not t.is_token_valid():
-                        raise exceptions.AuthenticationFailed("Token expired")
-                    return (t.user, t)  # user + token
-        except UserPersonalApiToken.DoesNotExist:
+        # constant-time lookup by key hash (app.api_keys)
+        token = get_api_token(raw_key)
+        if token is None:
             raise exceptions.AuthenticationFailed("Invalid API key")
 
-        raise exceptions.AuthenticationFailed("Invalid API key")
+        if not token.user.is_active:
+            raise exceptions.AuthenticationFailed("User inactive")
+        if not token.is_token_valid():
+            raise exceptions.AuthenticationFailed("Token expired")
+
+        return (token.user, token)  # user + token
@@ -0,0 +1,13 @@
+from django.core.management.base import BaseCommand
+
+from app.api_keys import backfill_api_key_hashes, invalidate_api_keys
+
+
+class Command(BaseCommand):
+    help = "Set the lookup hash of the personal API keys created before it existed"
+
+    def handle(self, *args, **options):
+        updated = backfill_api_key_hashes()
+        invalidate_api_keys()
+
+        self.stdout.write(self.style.SUCCESS(f"{updated} API key hashes set"))
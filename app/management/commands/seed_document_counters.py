@@ -0,0 +1,15 @@
+from django.core.management.base import BaseCommand
+
+from app.numbering import seed_document_counters
+
+
+class Command(BaseCommand):
+    help = "Seed the document number counters from the existing documents"
+
+    def add_arguments(self, parser):
+        parser.add_argument("--company", type=int, action="append", help="Company id (repeatable)")
+
+    def handle(self, *args, **options):
+        changed = seed_document_counters(options["company"])
+
+        self.stdout.write(self.style.SUCCESS(f"{changed} document counters seeded"))
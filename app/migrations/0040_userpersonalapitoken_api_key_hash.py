@@ -0,0 +1,45 @@
+# Generated by Django 5.2.10 on 2026-10-17 12:51
+
+import hashlib
+import hmac
+
+from cryptography.fernet import Fernet
+from django.conf import settings
+from django.db import migrations, models
+
+def backfill_hashes(apps, schema_editor):
+    """
+    Snapshot of app.api_keys.backfill_api_key_hashes: HMAC-SHA256 of the
+    decrypted key, keyed with ENCRYPTION_KEY.
+    """
+    UserPersonalApiToken = apps.get_model('app', 'UserPersonalApiToken')
+    cipher = Fernet(settings.ENCRYPTION_KEY)
+
+    tokens = list(
+        UserPersonalApiToken.objects
+        .filter(api_key_hash__isnull=True, encrypted_api_key__isnull=False)
+        .only('id', 'encrypted_api_key')
+    )
+    for token in tokens:
+        raw_key = cipher.decrypt(bytes(token.encrypted_api_key)).decode()
+        token.api_key_hash = hmac.new(
+            settings.ENCRYPTION_KEY.encode(), raw_key.encode(), hashlib.sha256
+        ).hexdigest()
+
+    UserPersonalApiToken.objects.bulk_update(tokens, ['api_key_hash'], batch_size=500)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('app', '0039_companysettings_broker_invoice_start_number'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='userpersonalapitoken',
+            name='api_key_hash',
+            field=models.CharField(blank=True, editable=False, max_length=64, null=True, unique=True),
+        ),
+        migrations.RunPython(backfill_hashes, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,29 @@
+# Generated by Django 5.2.10 on 2026-10-17 12:54
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('app', '0040_userpersonalapitoken_api_key_hash'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='DocumentCounter',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('document_type', models.CharField(choices=[('trip', 'Trip'), ('load', 'Load'), ('tor', 'Tor'), ('ctr', 'Ctr'), ('inv', 'Invoice'), ('quote', 'Quote'), ('exp', 'Expense'), ('route_sheet', 'Route sheet'), ('cmr', 'CMR')], max_length=20)),
+                ('series', models.CharField(blank=True, default='', max_length=36)),
+                ('prefix', models.CharField(blank=True, default='', max_length=50)),
+                ('last_number', models.PositiveBigIntegerField(default=0)),
+                ('width', models.PositiveSmallIntegerField(default=0)),
+                ('company', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='company_document_counters', to='app.company')),
+            ],
+            options={
+                'constraints': [models.UniqueConstraint(fields=('company', 'document_type', 'series'), name='unique_document_counter_company_type_series')],
+            },
+        ),
+    ]
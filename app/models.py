@@ -18,6 +18,7 @@ from abb.validators import validate_columns_arrayfield_length_exactly_20
 
 import logging
 
+from app.api_keys import hash_api_key
 from app.validations import validate_invoice_start_number
 logger = logging.getLogger(__name__)
 
@@ -416,6 +417,9 @@ class UserPersonalApiToken(models.Model):
     encrypted_api_key = models.BinaryField(null=True, blank=True)
     encrypted_refresh_key = models.BinaryField(null=True, blank=True)
 
+    # HMAC of the raw key, the authentication lookup (app.api_keys)
+    api_key_hash = models.CharField(max_length=64, unique=True, null=True, blank=True, editable=False)
+
     created_at = models.DateTimeField(auto_now_add=True)
     expires_at = models.DateTimeField(null=True, blank=True)
 
@@ -441,6 +445,7 @@ class UserPersonalApiToken(models.Model):
     def api_key(self, raw_value: str) -> None:
         cipher = Fernet(settings.ENCRYPTION_KEY)
         self.encrypted_api_key = cipher.encrypt(raw_value.encode())
+        self.api_key_hash = hash_api_key(raw_value)
 
     @property
     def refresh_key(self) -> str:
@@ -520,6 +525,49 @@ class DocumentSeries(models.Model):
         return f"{self.company.company_name} - {self.series} {self.number_from}-{self.number_to}"
 
 
+class DocumentCounterType(models.TextChoices):
+    TRIP = "trip", "Trip"
+    LOAD = "load", "Load"
+    TOR = "tor", "Tor"
+    CTR = "ctr", "Ctr"
+    INV = "inv", "Invoice"
+    QUOTE = "quote", "Quote"
+    EXP = "exp", "Expense"
+    ROUTE_SHEET = "route_sheet", "Route sheet"
+    CMR = "cmr", "CMR"
+
+
+class DocumentCounter(models.Model):
+    """
+    Last number issued per company, document type and series (app.numbering).
+    Next number: prefix + (last_number + 1), zero-padded to `width`.
+    """
+    company = models.ForeignKey(
+        Company, on_delete=models.CASCADE, related_name="company_document_counters")
+
+    document_type = models.CharField(max_length=20, choices=DocumentCounterType.choices)
+    # Series id of invoices, "" for the other documents
+    series = models.CharField(max_length=36, blank=True, default="")
+
+    prefix = models.CharField(max_length=50, blank=True, default="")
+    last_number = models.PositiveBigIntegerField(default=0)
+    width = models.PositiveSmallIntegerField(default=0)
+
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(
+                fields=['company', 'document_type', 'series'],
+                name='unique_document_counter_company_type_series'
+            )
+        ]
+
+    def format_number(self, number):
+        return f"{self.prefix}{str(number).zfill(self.width)}"
+
+    def __str__(self):
+        return f"{self.company_id} {self.document_type} {self.series} {self.format_number(self.last_number)}"
+
+
 class SMTPSettings(models.Model):
     uf = models.CharField(max_length=36, default=hex_uuid, unique=True)
     user = models.ForeignKey(
@@ -0,0 +1,233 @@
+import re
+
+from django.apps import apps as global_apps
+from django.db import IntegrityError, transaction
+
+from app.models import DocumentCounter, DocumentCounterType
+
+import logging
+logger = logging.getLogger(__name__)
+
+# Document numbers (Trip.rn, Load.sn, Inv.vn, ...) come from DocumentCounter:
+# one row per company / document type / series, locked and incremented by
+# next_document_number(). A counter is seeded from the existing documents the
+# first time it is used (or by the seed_document_counters command), with the
+# previous rules:
+#   - prefix + number, the prefix being everything before the trailing
+#     number of the highest-numbered document ('CMR2' → 'CMR3');
+#   - invoices (vn) keep the non-digit prefix and zero-padding of the
+#     highest invoice ('INV009' → 'INV010'), starting at '001'.
+# Numbers entered by hand move the counter forward the same way
+# (observe_document_number()).
+
+# document type: (app label, model, number field, filters, zero-padded)
+DOCUMENT_NUMBERS = {
+    DocumentCounterType.TRIP: ('axx', 'Trip', 'rn', {}, False),
+    DocumentCounterType.LOAD: ('axx', 'Load', 'sn', {}, False),
+    DocumentCounterType.TOR: ('axx', 'Tor', 'tn', {}, False),
+    DocumentCounterType.CTR: ('axx', 'Ctr', 'cn', {}, False),
+    DocumentCounterType.INV: ('axx', 'Inv', 'vn', {'is_quote': False}, True),
+    DocumentCounterType.QUOTE: ('axx', 'Inv', 'qn', {'is_quote': True}, False),
+    DocumentCounterType.EXP: ('axx', 'Exp', 'xn', {}, False),
+    DocumentCounterType.ROUTE_SHEET: ('ayy', 'RouteSheet', 'rs_number', {}, False),
+    DocumentCounterType.CMR: ('ayy', 'CMR', 'number', {}, False),
+}
+
+INV_NUMBER_WIDTH = 3
+
+_TRAILING_NUMBER_RE = re.compile(r'\d+$')
+_INV_NUMBER_RE = re.compile(r'(\D*)(\d+)$')
+
+
+def _series_key(series_id):
+    return str(series_id) if series_id else ""
+
+
+def _documents(company_id, document_type, series_id):
+    app_label, model_name, field, filters, padded = DOCUMENT_NUMBERS[document_type]
+    model = global_apps.get_model(app_label, model_name)
+
+    qs = model.objects.filter(company_id=company_id, **filters)
+    if document_type == DocumentCounterType.INV:
+        qs = qs.filter(series_id=series_id)
+
+    return qs, field, padded
+
+
+def parse_number(value, padded):
+    """
+    (prefix, number, width) of a document number, None when it has no
+    trailing number.
+    """
+    value = str(value)
+
+    if padded:
+        match = _INV_NUMBER_RE.match(value)
+        return (match[1], int(match[2]), len(match[2])) if match else None
+
+    match = _TRAILING_NUMBER_RE.search(value)
+    return (value[:match.start()], int(match.group()), 0) if match else None
+
+
+def seed_values(company_id, document_type, series_id=None):
+    """
+    (prefix, last_number, width) of the existing documents.
+    """
+    qs, field, padded = _documents(company_id, document_type, series_id)
+    values = qs.exclude(**{f'{field}__isnull': True}).values_list(field, flat=True)
+
+    best = None
+    for value in values.iterator():
+        parsed = parse_number(value, padded)
+        if parsed and (best is None or parsed[1] > best[1]):
+            best = parsed
+
+    return best or ("", 0, INV_NUMBER_WIDTH if padded else 0)
+
+
+def _locked_counter(company_id, document_type, series):
+    return (
+        DocumentCounter.objects
+        .select_for_update()
+        .filter(company_id=company_id, document_type=document_type, series=series)
+        .first()
+    )
+
+
+def next_document_number(company_id, document_type, series_id=None):
+    """
+    Allocate the next number of a document type for the company (and invoice
+    series). The counter row stays locked until the caller's transaction ends,
+    so concurrent creates get distinct numbers.
+    """
+    series = _series_key(series_id)
+
+    with transaction.atomic():
+        counter = _locked_counter(company_id, document_type, series)
+
+        if counter is None:
+            prefix, last_number, width = seed_values(company_id, document_type, series_id)
+            try:
+                with transaction.atomic():
+                    counter = DocumentCounter.objects.create(
+                        company_id=company_id,
+                        document_type=document_type,
+                        series=series,
+                        prefix=prefix,
+                        last_number=last_number,
+                        width=width,
+                    )
+            except IntegrityError:
+                # seeded concurrently
+                counter = _locked_counter(company_id, document_type, series)
+
+        counter.last_number += 1
+        counter.save(update_fields=['last_number'])
+
+    return counter.format_number(counter.last_number)
+
+
+class DocumentNumberMixin:
+    """
+    Model mixin remembering the document number fields as loaded, so save()
+    observes a number only when it is new or was edited (number_changed()).
+    """
+    document_number_fields = ()
+
+    @classmethod
+    def from_db(cls, db, field_names, values):
+        instance = super().from_db(db, field_names, values)
+        instance._remember_document_numbers()
+        return instance
+
+    def _remember_document_numbers(self):
+        self._loaded_document_numbers = {
+            field: self.__dict__.get(field) for field in self.document_number_fields
+        }
+
+    def number_changed(self, *fields):
+        loaded = getattr(self, '_loaded_document_numbers', None)
+        if self._state.adding or loaded is None:
+            return True
+
+        return any(self.__dict__.get(field) != loaded.get(field) for field in fields)
+
+    def save(self, *args, **kwargs):
+        super().save(*args, **kwargs)
+        self._remember_document_numbers()
+
+
+def observe_document_number(company_id, document_type, value, series_id=None):
+    """
+    Move the counter forward to a number set by hand (prefix and width
+    included), so the next allocated number follows it. Call it in the
+    transaction that saves the document.
+
+    A missing counter is left alone: it is seeded from the saved documents,
+    this one included, on first use.
+    """
+    if not company_id or value is None or value == '':
+        return
+
+    parsed = parse_number(value, DOCUMENT_NUMBERS[document_type][4])
+    if parsed is None:
+        return
+
+    prefix, number, width = parsed
+
+    # row-locking UPDATE, re-checked against concurrent allocations
+    (
+        DocumentCounter.objects
+        .filter(
+            company_id=company_id,
+            document_type=document_type,
+            series=_series_key(series_id),
+            last_number__lt=number,
+        )
+        .update(last_number=number, prefix=prefix, width=width)
+    )
+
+
+def seed_document_counters(company_ids=None):
+    """
+    Create the missing counters from the existing documents and move the
+    existing ones forward when documents have higher numbers.
+    Returns the number of counters created or moved.
+    """
+    Company = global_apps.get_model('app', 'Company')
+    Inv = global_apps.get_model('axx', 'Inv')
+
+    companies = Company.objects.order_by('id')
+    if company_ids:
+        companies = companies.filter(id__in=company_ids)
+
+    changed = 0
+
+    for company_id in companies.values_list('id', flat=True):
+        for document_type in DOCUMENT_NUMBERS:
+            series_ids = [None]
+            if document_type == DocumentCounterType.INV:
+                series_ids = list(
+                    Inv.objects.filter(company_id=company_id, is_quote=False)
+                    .values_list('series_id', flat=True).distinct().order_by()
+                ) or [None]
+
+            for series_id in series_ids:
+                prefix, last_number, width = seed_values(company_id, document_type, series_id)
+
+                with transaction.atomic():
+                    counter, created = DocumentCounter.objects.select_for_update().get_or_create(
+                        company_id=company_id,
+                        document_type=document_type,
+                        series=_series_key(series_id),
+                        defaults={'prefix': prefix, 'last_number': last_number, 'width': width},
+                    )
+
+                    if created:
+                        changed += 1
+                    elif counter.last_number < last_number:
+                        counter.last_number = last_number
+                        counter.save(update_fields=['last_number'])
+                        changed += 1
+
+    return changed
@@ -1,14 +1,16 @@
 
 from django.utils import timezone
-from django.db.models.signals import post_save, pre_delete, post_delete
+from django.db.models.signals import m2m_changed, post_save, pre_delete, post_delete
 from django.contrib.auth.models import Group
 from django.contrib.auth import get_user_model
 from django.dispatch import receiver
 from djoser.signals import user_registered, user_activated
 
 from abb.constants import INITIAL_VALIDITY_OF_SUBSCRIPTION_DAYS
+from abb.tenant import invalidate_company_subscription, invalidate_user_company
 from abb.utils import get_user_company
-from app.models import Company, CompanySettings, Subscription, UserCompensationSettings, UserSettings
+from app.api_keys import invalidate_api_keys
+from app.models import Company, CompanySettings, Subscription, UserCompensationSettings, UserPersonalApiToken, UserSettings
 from app.utils import is_user_member_group
 
 import logging
@@ -152,3 +154,50 @@ def clear_user_companies_relations_if_user_is_manager_signal(sender, instance, *
 def create_company_settings(sender, instance, created, **kwargs):
     if created:
         CompanySettings.objects.create(company=instance)
+
+
+### TENANT CACHE INVALIDATION (abb.tenant) ###
+
+@receiver(m2m_changed, sender=Company.user.through)
+def invalidate_tenant_company_on_membership_change(sender, instance, action, reverse, pk_set, **kwargs):
+    if action not in ('post_add', 'post_remove', 'pre_clear'):
+        return
+
+    if reverse:
+        # user.company_set.add(...) / .remove(...) / .clear()
+        instance.__dict__.pop('_tenant_company', None)
+        invalidate_user_company([instance.pk])
+    elif action == 'pre_clear':
+        invalidate_user_company(list(instance.user.values_list('id', flat=True)))
+    else:
+        invalidate_user_company(pk_set or [])
+
+
+@receiver(post_save, sender=Company)
+@receiver(pre_delete, sender=Company)
+def invalidate_tenant_company_on_company_change(sender, instance, **kwargs):
+    invalidate_user_company(list(instance.user.values_list('id', flat=True)))
+    invalidate_company_subscription(instance.pk)
+
+
+@receiver(post_save, sender=Subscription)
+@receiver(post_delete, sender=Subscription)
+def invalidate_tenant_subscription(sender, instance, **kwargs):
+    if instance.company_id:
+        invalidate_company_subscription(instance.company_id)
+
+
+### API KEY CACHE INVALIDATION (app.api_keys) ###
+
+@receiver(post_save, sender=UserPersonalApiToken)
+@receiver(post_delete, sender=UserPersonalApiToken)
+def invalidate_api_keys_on_token_change(sender, instance, created=False, **kwargs):
+    # a new key cannot be cached yet
+    if not created:
+        invalidate_api_keys()
+
+
+@receiver(post_save, sender=User)
+def invalidate_api_keys_on_user_deactivation(sender, instance, created, **kwargs):
+    if not created and not instance.is_active:
+        invalidate_api_keys()
@@ -0,0 +1,58 @@
+from unittest import mock
+
+from django.test import SimpleTestCase, TestCase
+
+from app.models import Company, DocumentCounter, DocumentCounterType
+from app.numbering import next_document_number, parse_number
+from axx.models import Load
+
+
+class ParseNumberTests(SimpleTestCase):
+    def test_trailing_number(self):
+        self.assertEqual(parse_number('CMR12', False), ('CMR', 12, 0))
+        self.assertEqual(parse_number(7, False), ('', 7, 0))
+        self.assertIsNone(parse_number('CMR', False))
+
+    def test_padded_number(self):
+        self.assertEqual(parse_number('INV009', True), ('INV', 9, 3))
+        self.assertIsNone(parse_number('INV-2024-A', True))
+
+
+class ManualDocumentNumberTests(TestCase):
+    def setUp(self):
+        self.company = Company.objects.create()
+
+    def test_auto_number_follows_manual_number(self):
+        Load.objects.create(company=self.company)
+        Load.objects.create(company=self.company, sn='L100')
+
+        load = Load.objects.create(company=self.company)
+
+        self.assertEqual(load.sn, 'L101')
+
+    def test_manual_number_before_the_counter_exists(self):
+        Load.objects.create(company=self.company, sn='50')
+
+        self.assertEqual(next_document_number(self.company.id, DocumentCounterType.LOAD), '51')
+
+    def test_lower_manual_number_keeps_the_counter(self):
+        Load.objects.create(company=self.company, sn='20')
+        Load.objects.create(company=self.company)
+        Load.objects.create(company=self.company, sn='5')
+
+        counter = DocumentCounter.objects.get(company=self.company, document_type=DocumentCounterType.LOAD)
+
+        self.assertEqual(counter.format_number(counter.last_number), '21')
+
+    def test_unchanged_number_is_not_observed(self):
+        load = Load.objects.create(company=self.company, sn='L10')
+        load = Load.objects.get(pk=load.pk)
+
+        with mock.patch('axx.models.observe_document_number') as observe:
+            load.customer_ref = 'REF'
+            load.save()
+            observe.assert_not_called()
+
+            load.sn = 'L20'
+            load.save()
+            observe.assert_called_once_with(self.company.id, DocumentCounterType.LOAD, 'L20')
@@ -4,3 +4,6 @@ from django.apps import AppConfig
 class AxxConfig(AppConfig):
     default_auto_field = 'django.db.models.BigAutoField'
     name = 'axx'
+
+    def ready(self):
+        import axx.signals
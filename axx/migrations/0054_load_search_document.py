@@ -0,0 +1,88 @@
+# Generated by Django 5.2.10 on 2026-10-17 12:30
+
+import django.contrib.postgres.indexes
+from django.conf import settings
+from django.contrib.postgres.operations import TrigramExtension
+from django.db import migrations, models
+
+# Load.search_document as defined by axx.search when this migration was written
+# (kept here so later changes to that module do not alter the migration)
+
+CHUNK_SIZE = 500
+
+LOAD_SEARCH_FIELDS = (
+    'sn',
+    'hb',
+    'mb',
+    'booking_number',
+    'customer_ref',
+    'customer_notes',
+    'load_address',
+    'unload_address',
+    'trip__rn',
+    'bill_to__company_name',
+    'carrier__company_name',
+    'carrier__alias_company_name',
+    'vehicle_tractor__reg_number',
+    'vehicle_trailer__reg_number',
+)
+
+RELATED_SEARCH_FIELDS = (
+    ('Tor', ('tn', 'vehicle_tractor__reg_number', 'vehicle_trailer__reg_number')),
+    ('Ctr', ('cn',)),
+    ('Inv', ('qn', 'vn')),
+    ('Exp', ('xn',)),
+)
+
+
+def backfill_load_search_documents(apps, schema_editor):
+    Load = apps.get_model('axx', 'Load')
+
+    load_ids = list(Load.objects.order_by('id').values_list('id', flat=True))
+
+    for start in range(0, len(load_ids), CHUNK_SIZE):
+        chunk = load_ids[start:start + CHUNK_SIZE]
+        values = {load_id: [] for load_id in chunk}
+
+        for row in Load.objects.filter(id__in=chunk).values_list('id', *LOAD_SEARCH_FIELDS):
+            values[row[0]].extend(row[1:])
+
+        for model_name, fields in RELATED_SEARCH_FIELDS:
+            model = apps.get_model('axx', model_name)
+
+            for row in model.objects.filter(load_id__in=chunk).values_list('load_id', *fields):
+                values[row[0]].extend(row[1:])
+
+        Load.objects.bulk_update(
+            [
+                Load(id=load_id, search_document='\n'.join(str(v) for v in load_values if v).upper())
+                for load_id, load_values in values.items()
+            ],
+            ['search_document'],
+        )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('abb', '0010_alter_statustype_options'),
+        ('app', '0039_companysettings_broker_invoice_start_number'),
+        ('att', '0074_remove_contact_invoice_reference_date_and_more'),
+        ('axx', '0053_loadmovement_role_loadmovement_status'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        TrigramExtension(),
+        migrations.AddField(
+            model_name='load',
+            name='search_document',
+            field=models.TextField(blank=True, default=''),
+        ),
+        # filled before the index exists, the GIN build is cheaper than per-row updates
+        migrations.RunPython(backfill_load_search_documents, migrations.RunPython.noop),
+        migrations.AddIndex(
+            model_name='load',
+            index=django.contrib.postgres.indexes.GinIndex(fields=['search_document'], name='load_search_document_trgm', opclasses=['gin_trgm_ops']),
+        ),
+    ]
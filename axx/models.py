@@ -2,14 +2,16 @@
 from django.db import models
 from django.contrib.auth import get_user_model
 from django.contrib.postgres.fields import ArrayField
-from django.db import IntegrityError
+from django.contrib.postgres.indexes import GinIndex
+from django.db import IntegrityError, transaction
 from django.core.exceptions import ValidationError
 
 from abb.constants import DOCUMENT_TYPES, LOAD_SIZE, DOC_LANG_CHOICES, LOAD_TYPES
 from abb.custom_exceptions import CustomApiException
 from abb.models import Currency, BodyType, ModeType, StatusType, Incoterm
-from abb.utils import assign_new_num_inv, hex_uuid, assign_new_num, image_upload_path, tripLoadsTotals, upload_to
-from app.models import CategoryGeneral, Company, LoadWarehouse
+from abb.utils import hex_uuid, image_upload_path, tripLoadsTotals, upload_to
+from app.models import CategoryGeneral, Company, DocumentCounterType, LoadWarehouse
+from app.numbering import DocumentNumberMixin, next_document_number, observe_document_number
 from att.models import Contact, Person, RouteSheetNumber, Term, Vehicle, VehicleUnit, PaymentTerm
 
 import logging
@@ -68,7 +70,7 @@ class Series(models.Model):
         return f"{self.document_type}-{self.prefix}"
 
 
-class Trip(models.Model):
+class Trip(DocumentNumberMixin, models.Model):
     ''' Trip model '''
     uf = models.CharField(max_length=36, default=hex_uuid,
                           db_index=True, unique=True)
@@ -147,22 +149,23 @@ class Trip(models.Model):
 
     stops_version = models.PositiveIntegerField(default=1)
 
+    document_number_fields = ('rn',)
+
+    @transaction.atomic
     def save(self, *args, **kwargs):
         if self.rn == None or self.rn == '':
-            items_list_qs, num_new = None, None
+            num_new = None
 
             try:
-                user_company = self.company
-                items_list_qs = Trip.objects.filter(
-                    company__id=user_company.id).exclude(id=self.id)
-
-                num_new = assign_new_num(items_list_qs, 'rn')
+                num_new = next_document_number(self.company.id, DocumentCounterType.TRIP)
 
             except Exception as e:
                 logger.error(f"ERRORLOG119 Trip. Error: {e}")
                 pass
 
             self.rn = num_new if num_new else 1
+        elif self.number_changed('rn'):
+            observe_document_number(self.company_id, DocumentCounterType.TRIP, self.rn)
 
         super(Trip, self).save(*args, **kwargs)
 
@@ -292,7 +295,7 @@ class TripAdvancePayment(models.Model):
 ###### START LOAD ######
 
 
-class Load(models.Model):
+class Load(DocumentNumberMixin, models.Model):
     ''' Load/Order model '''
 
     LOCATION_TYPES = [
@@ -402,28 +405,35 @@ class Load(models.Model):
         related_name="warehouse_loads"
     )
 
+    # textQuery search text, maintained by axx.signals (see axx.search)
+    search_document = models.TextField(blank=True, default='')
+
+    document_number_fields = ('sn',)
+
+    @transaction.atomic
     def save(self, *args, **kwargs):
         if self.sn == None or self.sn == '':
-            items_list_qs, num_new = None, None
+            num_new = None
 
             try:
-                user_company = self.company
-                items_list_qs = Load.objects.select_related('company').filter(
-                    company__id=user_company.id).exclude(id=self.id)
-
-                num_new = assign_new_num(items_list_qs, 'sn')
+                num_new = next_document_number(self.company.id, DocumentCounterType.LOAD)
 
             except Exception as e:
                 logger.error(f"ERRORLOG163 Load. Error: {e}")
                 pass
 
             self.sn = num_new if num_new else 1
+        elif self.number_changed('sn'):
+            observe_document_number(self.company_id, DocumentCounterType.LOAD, self.sn)
 
         super(Load, self).save(*args, **kwargs)
 
     class Meta:
         verbose_name = "Load"
         verbose_name_plural = "Loads"
+        indexes = [
+            GinIndex(fields=['search_document'], opclasses=['gin_trgm_ops'], name='load_search_document_trgm'),
+        ]
 
     def __str__(self):
         return str(self.sn) or ''
@@ -662,7 +672,7 @@ class LoadMovement(models.Model):
 ###### END LOAD ######
 
 
-class Tor(models.Model):
+class Tor(DocumentNumberMixin, models.Model):
     ''' Carrier transport order '''
     company = models.ForeignKey(
         Company, on_delete=models.CASCADE, null=True, blank=True, related_name='company_tors')
@@ -718,6 +728,9 @@ class Tor(models.Model):
     contract_terms = models.ForeignKey(Term, on_delete=models.SET_NULL,
                                        blank=True, null=True, related_name='contract_terms_tors',)
 
+    document_number_fields = ('tn', 'is_tor')
+
+    @transaction.atomic
     def save(self, *args, **kwargs):
         # if self.assigned_user == None or self.assigned_user == '':
         #     self.assigned_user = self.owner
@@ -727,20 +740,18 @@ class Tor(models.Model):
             # print("0122", self.vn)
 
         if self.is_tor == True and (self.tn == None or self.tn == ''):
-            items_list_qs, num_new = None, None
+            num_new = None
 
             try:
-                user_company = self.company
-                items_list_qs = Tor.objects.select_related('company').filter(
-                    company__id=user_company.id).exclude(id=self.id)
-
-                num_new = assign_new_num(items_list_qs, 'tn')
+                num_new = next_document_number(self.company.id, DocumentCounterType.TOR)
                 # print('7272')
             except:
                 print('EM373')
                 pass
 
             self.tn = num_new if num_new else 1
+        elif self.is_tor == True and self.number_changed('tn', 'is_tor'):
+            observe_document_number(self.company_id, DocumentCounterType.TOR, self.tn)
 
         super(Tor, self).save(*args, **kwargs)
 
@@ -752,7 +763,7 @@ class Tor(models.Model):
         return str(self.tn) or str(self.id) or ''
 
 
-class Ctr(models.Model):
+class Ctr(DocumentNumberMixin, models.Model):
     ''' Customer transport order '''
     company = models.ForeignKey(
         Company, on_delete=models.CASCADE, null=True, blank=True, related_name='company_ctrs')
@@ -798,24 +809,26 @@ class Ctr(models.Model):
     contract_terms = models.ForeignKey(Term, on_delete=models.SET_NULL,
                                        blank=True, null=True, related_name='contract_terms_ctrs')
 
+    document_number_fields = ('cn',)
+
+    @transaction.atomic
     def save(self, *args, **kwargs):
         # if self.assigned_user == None or self.assigned_user == '':
         #     self.assigned_user = self.owner
 
         if self.cn == None or self.cn == '':
-            items_list_qs, num_new = None, None
+            num_new = None
 
             try:
-                user_company = self.company
-                items_list_qs = Ctr.objects.filter(
-                    company__id=user_company.id).exclude(id=self.id)
-                num_new = assign_new_num(items_list_qs, 'cn')
+                num_new = next_document_number(self.company.id, DocumentCounterType.CTR)
 
             except:
                 print('EM359')
                 pass
 
             self.cn = num_new if num_new else 1
+        elif self.number_changed('cn'):
+            observe_document_number(self.company_id, DocumentCounterType.CTR, self.cn)
 
         super(Ctr, self).save(*args, **kwargs)
 
@@ -827,7 +840,7 @@ class Ctr(models.Model):
         return str(self.id) or ''
 
 
-class Inv(models.Model):
+class Inv(DocumentNumberMixin, models.Model):
     ''' invoice & quote model '''
 
     uf = models.CharField(max_length=36, default=hex_uuid,
@@ -893,43 +906,41 @@ class Inv(models.Model):
     internal_use_only = ArrayField(models.CharField(
         max_length=1000, null=True, blank=True), blank=True, null=True, size=10)
 
+    document_number_fields = ('vn', 'qn', 'series_id', 'is_quote')
+
+    @transaction.atomic
     def save(self, *args, **kwargs):
 
         # print('223344', )
 
         if self.is_quote == False and (self.vn == None or self.vn == ''):
-            items_list_qs, num_new = None, None
+            num_new = None
 
             try:
-                user_company = self.company
-                items_list_qs = Inv.objects.filter(
-                    company__id=user_company.id, series=self.series, is_quote=False).exclude(id=self.id)
-
-                # print('2321', )
-                num_new = assign_new_num_inv(items_list_qs, 'vn')
+                num_new = next_document_number(self.company.id, DocumentCounterType.INV, self.series_id)
             except Exception as e:
                 logger.error(f'EM201 class Inv: {e}')
                 pass
 
             self.vn = num_new if num_new else 1
+        elif self.is_quote == False and self.number_changed('vn', 'series_id', 'is_quote'):
+            observe_document_number(self.company_id, DocumentCounterType.INV, self.vn, self.series_id)
 
         if self.is_quote == True and (self.qn == None or self.qn == ''):
-            items_list_qs, num_new = None, None
+            num_new = None
 
             # print('223388', )
 
             try:
-                user_company = self.company
-                items_list_qs = Inv.objects.filter(
-                    company__id=user_company.id, is_quote=True).exclude(id=self.id)
-
-                num_new = assign_new_num(items_list_qs, 'qn')
+                num_new = next_document_number(self.company.id, DocumentCounterType.QUOTE)
 
             except Exception as e:
                 logger.error(f'EM219 class Inv {e}')
                 pass
 
             self.qn = num_new if num_new else 1
+        elif self.is_quote == True and self.number_changed('qn', 'is_quote'):
+            observe_document_number(self.company_id, DocumentCounterType.QUOTE, self.qn)
 
         super(Inv, self).save(*args, **kwargs)
 
@@ -941,7 +952,7 @@ class Inv(models.Model):
         return str(self.id) or ''
 
 
-class Exp(models.Model):
+class Exp(DocumentNumberMixin, models.Model):
     ''' expense model '''
 
     company = models.ForeignKey(
@@ -977,22 +988,23 @@ class Exp(models.Model):
     tor = models.ForeignKey(
         Tor, on_delete=models.CASCADE, blank=True, null=True, related_name='tor_exps')
 
+    document_number_fields = ('xn',)
+
+    @transaction.atomic
     def save(self, *args, **kwargs):
         if (self.xn == None or self.xn == ''):
-            items_list_qs, num_new = None, None
+            num_new = None
 
             try:
-                user_company = self.company
-                items_list_qs = Exp.objects.select_related('company').filter(
-                    company__id=user_company.id).exclude(id=self.id)
-
-                num_new = assign_new_num(items_list_qs, 'xn')
+                num_new = next_document_number(self.company.id, DocumentCounterType.EXP)
 
             except Exception as e:
                 print('EM409', e)
                 pass
 
             self.xn = num_new if num_new else 1
+        elif self.number_changed('xn'):
+            observe_document_number(self.company_id, DocumentCounterType.EXP, self.xn)
 
         super(Exp, self).save(*args, **kwargs)
 
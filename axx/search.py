@@ -0,0 +1,112 @@
+from collections import defaultdict
+
+from django.apps import apps as global_apps
+from django.db.models import Q
+
+# Load.search_document: every value the load list `textQuery` matches on, one per
+# line, upper-cased. The list filters it with `contains` on the upper-cased query,
+# which the trigram GIN index answers; \n keeps a match from spanning two values.
+
+SEARCH_DOCUMENT_CHUNK_SIZE = 500
+
+LOAD_SEARCH_FIELDS = (
+    'sn',
+    'hb',
+    'mb',
+    'booking_number',
+    'customer_ref',
+    'customer_notes',
+    'load_address',
+    'unload_address',
+    'trip__rn',
+    'bill_to__company_name',
+    'carrier__company_name',
+    'carrier__alias_company_name',
+    'vehicle_tractor__reg_number',
+    'vehicle_trailer__reg_number',
+)
+
+# (model, fields) of the load's related documents
+RELATED_SEARCH_FIELDS = (
+    ('Tor', ('tn', 'vehicle_tractor__reg_number', 'vehicle_trailer__reg_number')),
+    ('Ctr', ('cn',)),
+    ('Inv', ('qn', 'vn')),
+    ('Exp', ('xn',)),
+)
+
+
+def normalize_search_text(value):
+    return str(value).upper()
+
+
+def _build_search_documents(load_ids, apps):
+    Load = apps.get_model('axx', 'Load')
+
+    values = defaultdict(list)
+
+    for row in Load.objects.filter(id__in=load_ids).values_list('id', *LOAD_SEARCH_FIELDS):
+        values[row[0]].extend(row[1:])
+
+    for model_name, fields in RELATED_SEARCH_FIELDS:
+        model = apps.get_model('axx', model_name)
+
+        for row in model.objects.filter(load_id__in=load_ids).values_list('load_id', *fields):
+            values[row[0]].extend(row[1:])
+
+    return {
+        load_id: normalize_search_text('\n'.join(str(v) for v in load_values if v))
+        for load_id, load_values in values.items()
+    }
+
+
+def refresh_load_search_documents(load_ids, apps=global_apps):
+    """
+    Rebuild Load.search_document for the given loads.
+    `apps` lets data migrations run it against historical models.
+    """
+    Load = apps.get_model('axx', 'Load')
+
+    load_ids = sorted({load_id for load_id in load_ids if load_id})
+    updated = 0
+
+    for start in range(0, len(load_ids), SEARCH_DOCUMENT_CHUNK_SIZE):
+        chunk = load_ids[start:start + SEARCH_DOCUMENT_CHUNK_SIZE]
+        documents = _build_search_documents(chunk, apps)
+
+        # bulk_update skips save(): date_modified is not touched
+        Load.objects.bulk_update(
+            [Load(id=load_id, search_document=document) for load_id, document in documents.items()],
+            ['search_document'],
+        )
+        updated += len(documents)
+
+    return updated
+
+
+def load_ids_for_contact(contact_id):
+    Load = global_apps.get_model('axx', 'Load')
+
+    return list(
+        Load.objects
+        .filter(Q(bill_to_id=contact_id) | Q(carrier_id=contact_id))
+        .values_list('id', flat=True)
+    )
+
+
+def load_ids_for_vehicle(vehicle_id):
+    Load = global_apps.get_model('axx', 'Load')
+    Tor = global_apps.get_model('axx', 'Tor')
+
+    load_ids = set(
+        Load.objects
+        .filter(Q(vehicle_tractor_id=vehicle_id) | Q(vehicle_trailer_id=vehicle_id))
+        .values_list('id', flat=True)
+    )
+    load_ids.update(
+        Tor.objects
+        .filter(Q(vehicle_tractor_id=vehicle_id) | Q(vehicle_trailer_id=vehicle_id))
+        .filter(load__isnull=False)
+        .values_list('load_id', flat=True)
+    )
+
+    return list(load_ids)
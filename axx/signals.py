@@ -0,0 +1,92 @@
+from django.db import transaction
+from django.db.models.signals import post_delete, post_init, post_save
+from django.dispatch import receiver
+
+from att.models import Contact, Vehicle
+from axx.models import Ctr, Exp, Inv, Load, Tor, Trip
+from axx.search import refresh_load_search_documents
+from axx.tasks import refresh_load_search_documents_task
+
+import logging
+logger = logging.getLogger(__name__)
+
+
+### LOAD SEARCH DOCUMENT (axx.search) ###
+
+LOAD_DOCUMENT_MODELS = (Tor, Ctr, Inv, Exp)
+
+# values of the tracked fields as loaded, to skip saves that do not change them
+TRACKED_SEARCH_FIELDS = {
+    Trip: ('rn',),
+    Contact: ('company_name', 'alias_company_name'),
+    Vehicle: ('reg_number',),
+    **{model: ('load_id',) for model in LOAD_DOCUMENT_MODELS},
+}
+
+
+def _tracked_values(instance):
+    return tuple(instance.__dict__.get(field) for field in TRACKED_SEARCH_FIELDS[type(instance)])
+
+
+def _refresh_on_commit(load_ids):
+    load_ids = [load_id for load_id in load_ids if load_id]
+
+    if load_ids:
+        transaction.on_commit(lambda: refresh_load_search_documents(load_ids))
+
+
+def _search_fields_changed(instance, created):
+    return created or getattr(instance, '_search_initial', None) != _tracked_values(instance)
+
+
+def remember_search_fields(sender, instance, **kwargs):
+    instance._search_initial = _tracked_values(instance)
+
+
+@receiver(post_save, sender=Load)
+def refresh_load_search_document_on_load_save(sender, instance, raw=False, **kwargs):
+    if not raw:
+        _refresh_on_commit([instance.pk])
+
+
+def refresh_load_search_document_on_document_change(sender, instance, raw=False, **kwargs):
+    if raw:
+        return
+
+    # a document moved to another load leaves its number on the previous one
+    previous_load_id = getattr(instance, '_search_initial', (None,))[0]
+    _refresh_on_commit({instance.load_id, previous_load_id})
+
+
+@receiver(post_save, sender=Trip)
+def refresh_load_search_document_on_trip_save(sender, instance, created, raw=False, **kwargs):
+    if raw or created or not _search_fields_changed(instance, created):
+        return
+
+    _refresh_on_commit(list(instance.trip_loads.values_list('id', flat=True)))
+
+
+@receiver(post_save, sender=Contact)
+def refresh_load_search_document_on_contact_save(sender, instance, created, raw=False, **kwargs):
+    if raw or created or not _search_fields_changed(instance, created):
+        return
+
+    contact_id = instance.pk
+    transaction.on_commit(lambda: refresh_load_search_documents_task.delay(contact_id=contact_id))
+
+
+@receiver(post_save, sender=Vehicle)
+def refresh_load_search_document_on_vehicle_save(sender, instance, created, raw=False, **kwargs):
+    if raw or created or not _search_fields_changed(instance, created):
+        return
+
+    vehicle_id = instance.pk
+    transaction.on_commit(lambda: refresh_load_search_documents_task.delay(vehicle_id=vehicle_id))
+
+
+for model in TRACKED_SEARCH_FIELDS:
+    post_init.connect(remember_search_fields, sender=model)
+
+for model in LOAD_DOCUMENT_MODELS:
+    post_save.connect(refresh_load_search_document_on_document_change, sender=model)
+    post_delete.connect(refresh_load_search_document_on_document_change, sender=model)
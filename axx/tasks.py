@@ -0,0 +1,19 @@
+from axx.search import load_ids_for_contact, load_ids_for_vehicle, refresh_load_search_documents
+from xumma.celery import app
+
+
+@app.task(bind=True, queue="low_priority")
+def refresh_load_search_documents_task(self, load_ids=None, contact_id=None, vehicle_id=None):
+    """
+    Rebuild Load.search_document for the loads whose text depends on a renamed
+    contact or vehicle (can be thousands of loads, so not done in the request).
+    """
+    load_ids = list(load_ids or [])
+
+    if contact_id:
+        load_ids += load_ids_for_contact(contact_id)
+
+    if vehicle_id:
+        load_ids += load_ids_for_vehicle(vehicle_id)
+
+    return refresh_load_search_documents(load_ids)
@@ -2,7 +2,7 @@ from django.conf import settings
 import os
 from django.utils import timezone
 from datetime import datetime, timedelta
-from django.db import models
+from django.db import models, transaction
 from django.contrib.auth import get_user_model
 from django.contrib.postgres.fields import ArrayField
 from django.db.models import QuerySet, Prefetch, Q, F
@@ -11,8 +11,9 @@ from phonenumber_field.modelfields import PhoneNumberField
 
 from abb.constants import ACTION_CHOICES, UNIT_MEASUREMENT_CHOICES, VAT_CHOICES, VAT_EXEMPTION_REASON, VAT_TYPE_CHOICES
 from abb.models import Country, Currency
-from abb.utils import assign_new_num, hex_uuid, default_notification_status_3, image_upload_path
-from app.models import CategoryGeneral, Company, TypeCost, TypeGeneral
+from abb.utils import hex_uuid, default_notification_status_3, image_upload_path
+from app.models import CategoryGeneral, Company, DocumentCounterType, TypeCost, TypeGeneral
+from app.numbering import DocumentNumberMixin, next_document_number, observe_document_number
 from axx.models import Ctr, Exp, Inv, Load, Tor, Trip
 from att.models import Contact, ContactSite, Person, Vehicle
 
@@ -278,7 +279,7 @@ class ImageZipToken(models.Model):
         )
 
 
-class RouteSheet(models.Model):
+class RouteSheet(DocumentNumberMixin, models.Model):
     uf = models.CharField(max_length=36, default=hex_uuid,
                           unique=True, db_index=True)
     company = models.ForeignKey(
@@ -320,22 +321,23 @@ class RouteSheet(models.Model):
     drivers = models.ManyToManyField(
         User, through="RouteSheetDriver", related_name="route_sheets",  blank=True)
 
+    document_number_fields = ('rs_number',)
+
+    @transaction.atomic
     def save(self, *args, **kwargs):
         if self.rs_number == None or self.rs_number == '':
-            items_list_qs, num_new = None, None
+            num_new = None
 
             try:
-                user_company = self.company
-                items_list_qs = RouteSheet.objects.select_related('company').filter(
-                    company__id=user_company.id).exclude(id=self.id)
-
-                num_new = assign_new_num(items_list_qs, 'rs_number')
+                num_new = next_document_number(self.company.id, DocumentCounterType.ROUTE_SHEET)
 
             except Exception as e:
                 logger.error(f"EM454 RouteSheet def save. Error: {e}")
                 pass
 
             self.rs_number = num_new if num_new else 1
+        elif self.number_changed('rs_number'):
+            observe_document_number(self.company_id, DocumentCounterType.ROUTE_SHEET, self.rs_number)
 
         super(RouteSheet, self).save(*args, **kwargs)
 
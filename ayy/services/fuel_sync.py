@@ -6,7 +6,8 @@ from django.utils import timezone
 from django.core.exceptions import ValidationError as DjangoValidationError
 from rest_framework.exceptions import ValidationError as DRFValidationError
 
-from azz.models import FuelTank, TankRefill, TruckFueling
+from ayy.models import ItemCost
+from azz.models import FuelTank, TankRefill, TankRefillConsumption, TruckFueling
 
 FUEL_COST_CODE_TO_TANK = {
     "adblue_tanc": FuelTank.FUEL_ADBLUE,
@@ -20,31 +21,77 @@ FUEL_COST_CODE_TO_TANK = {
 }
 
 
-def fifo_valuation(tank, quantity_l: Decimal):
-    remaining = Decimal(quantity_l)
-    total_cost = Decimal("0")
-
-    refills = (
-        tank.tank_refills
-        .filter(actual_quantity_l__gt=0)
+def _open_refills(tank):
+    """
+    Refills of the tank with liters left, oldest first (partial index
+    tankrefill_open_fifo): a valuation never reads the consumed history.
+    """
+    return (
+        TankRefill.objects
+        .filter(tank=tank, remaining_l__gt=0)
         .order_by("date", "id")
-        .select_for_update()
     )
 
-    for refill in refills:
+
+def release_fueling(fueling):
+    """
+    Give the liters of a fueling back to the refills it consumed.
+    """
+    consumptions = list(fueling.fueling_consumptions.all())
+
+    for consumption in consumptions:
+        TankRefill.objects.filter(pk=consumption.refill_id).update(
+            remaining_l=F("remaining_l") + consumption.quantity_l
+        )
+
+    TankRefillConsumption.objects.filter(
+        pk__in=[consumption.pk for consumption in consumptions]
+    ).delete()
+
+
+def fifo_valuation(fueling):
+    """
+    Consume fueling.quantity_l from the tank's open refills, oldest first,
+    and record it in TankRefillConsumption (a re-valued fueling first gives
+    back what it took before).
+
+    Only the open refills are read and row-locked, so fuelings of the same
+    tank wait for each other only while those few rows are updated.
+    """
+    release_fueling(fueling)
+
+    quantity_l = Decimal(fueling.quantity_l)
+    remaining = quantity_l
+    total_cost = Decimal("0")
+    consumptions = []
+
+    for refill in _open_refills(fueling.tank).select_for_update():
         if remaining <= 0:
             break
 
-        available = refill.actual_quantity_l
-        take = min(available, remaining)
+        take = min(refill.remaining_l, remaining)
 
         total_cost += take * refill.price_l
         remaining -= take
+        refill.remaining_l -= take
+
+        consumptions.append(TankRefillConsumption(
+            fueling=fueling,
+            refill=refill,
+            quantity_l=take,
+            price_l=refill.price_l,
+        ))
 
     if remaining > 0:
         raise DjangoValidationError("Not enough fuel in tank")
 
-    unit_price = (total_cost / Decimal(quantity_l)).quantize(Decimal("0.0001"))
+    TankRefill.objects.bulk_update(
+        [consumption.refill for consumption in consumptions],
+        ["remaining_l"],
+    )
+    TankRefillConsumption.objects.bulk_create(consumptions)
+
+    unit_price = (total_cost / quantity_l).quantize(Decimal("0.0001"))
     total_cost = total_cost.quantize(Decimal("0.01"))
 
     return unit_price, total_cost
@@ -65,17 +112,11 @@ def sync_fueling_from_item_cost(item_cost):
 
     try:
         with transaction.atomic():
-            tank = FuelTank.objects.select_for_update().get(
+            tank = FuelTank.objects.get(
                 company=item_cost.company,
                 fuel_type=fuel_type,
             )
 
-            # 🔥 FIFO valuation
-            unit_price, total_cost = fifo_valuation(
-                tank,
-                Decimal(item_cost.quantity)
-            )
-
             # 🚚 Fueling event (physical stock movement)
             fueling, _ = TruckFueling.objects.update_or_create(
                 item_cost=item_cost,
@@ -91,6 +132,9 @@ def sync_fueling_from_item_cost(item_cost):
             fueling.full_clean()
             fueling.save()
 
+            # 🔥 FIFO valuation (locks only the tank's open refills)
+            unit_price, total_cost = fifo_valuation(fueling)
+
             # Write valuation back to ItemCost
             item_cost.amount = unit_price          # price per liter
             item_cost.save(update_fields=["amount"])
@@ -110,23 +154,15 @@ def fifo_price_preview(*, tank: FuelTank, quantity_l: Decimal):
     total_cost = Decimal("0")
     consumed = Decimal("0")
 
-    refills = (
-        TankRefill.objects
-        .filter(tank=tank)
-        .order_by("date", "id")
-    )
+    refills = _open_refills(tank).values_list("remaining_l", "price_l")
 
-    for refill in refills:
+    for available, price_l in refills:
         if remaining <= 0:
             break
 
-        available = refill.actual_quantity_l
-        if available <= 0:
-            continue
-
         take = min(available, remaining)
 
-        total_cost += take * refill.price_l
+        total_cost += take * price_l
         consumed += take
         remaining -= take
 
@@ -139,3 +175,87 @@ def fifo_price_preview(*, tank: FuelTank, quantity_l: Decimal):
         "price_per_l": price_per_l,
         "total_cost": total_cost.quantize(Decimal("0.01")),
     }
+
+
+###### REBUILD ######
+
+REBUILD_BATCH_SIZE = 1000
+
+
+def rebuild_tank_fifo(tank_id, *, revalue_costs=False):
+    """
+    Rebuild the FIFO cursors of a tank from its history: every refill is
+    refilled to actual_quantity_l, then the fuelings (by fueled_at) consume
+    the refills (by date) in one pass. Optionally writes the resulting
+    price per liter back to the fuelings' ItemCost.
+
+    Returns {"refills", "fuelings", "uncovered_l"}; uncovered_l are liters
+    fueled with no refill left to take them from.
+    """
+    with transaction.atomic():
+        refills = list(
+            TankRefill.objects
+            .select_for_update()
+            .filter(tank_id=tank_id)
+            .order_by("date", "id")
+        )
+        for refill in refills:
+            refill.remaining_l = refill.actual_quantity_l
+
+        TankRefillConsumption.objects.filter(fueling__tank_id=tank_id).delete()
+
+        consumptions = []
+        item_costs = []
+        uncovered = Decimal("0")
+        fuelings = 0
+        position = 0
+
+        for fueling_id, item_cost_id, quantity_l in (
+            TruckFueling.objects
+            .filter(tank_id=tank_id)
+            .order_by("fueled_at", "id")
+            .values_list("id", "item_cost_id", "quantity_l")
+        ):
+            fuelings += 1
+            remaining = Decimal(quantity_l)
+            total_cost = Decimal("0")
+
+            while remaining > 0 and position < len(refills):
+                refill = refills[position]
+                take = min(refill.remaining_l, remaining)
+
+                if take > 0:
+                    total_cost += take * refill.price_l
+                    remaining -= take
+                    refill.remaining_l -= take
+
+                    consumptions.append(TankRefillConsumption(
+                        fueling_id=fueling_id,
+                        refill_id=refill.id,
+                        quantity_l=take,
+                        price_l=refill.price_l,
+                    ))
+
+                if refill.remaining_l <= 0:
+                    position += 1
+
+            uncovered += remaining
+
+            if revalue_costs and item_cost_id and quantity_l and remaining <= 0:
+                item_costs.append(ItemCost(
+                    id=item_cost_id,
+                    amount=(total_cost / Decimal(quantity_l)).quantize(Decimal("0.0001")),
+                ))
+
+        TankRefill.objects.bulk_update(
+            refills, ["remaining_l"], batch_size=REBUILD_BATCH_SIZE)
+        TankRefillConsumption.objects.bulk_create(
+            consumptions, batch_size=REBUILD_BATCH_SIZE)
+        ItemCost.objects.bulk_update(
+            item_costs, ["amount"], batch_size=REBUILD_BATCH_SIZE)
+
+    return {
+        "refills": len(refills),
+        "fuelings": fuelings,
+        "uncovered_l": uncovered,
+    }
@@ -30,7 +30,7 @@ class FuelTankAdmin(admin.ModelAdmin):
 
 @admin.register(TankRefill)
 class TankRefillAdmin(admin.ModelAdmin):
-    list_display = ('id', 'date', 'supplier', 'quantity_l', 'actual_quantity_l', 'price_l', 'comments',
+    list_display = ('id', 'date', 'supplier', 'quantity_l', 'actual_quantity_l', 'remaining_l', 'price_l', 'comments',
                     )
 
 
@@ -0,0 +1,45 @@
+from django.core.management.base import BaseCommand, CommandError
+
+from ayy.services.fuel_sync import rebuild_tank_fifo
+from azz.models import FuelTank
+
+
+class Command(BaseCommand):
+    help = "Rebuild the FIFO cursors (refill remaining liters) of fuel tanks from their fueling history"
+
+    def add_arguments(self, parser):
+        parser.add_argument("--tank", type=str, help="FuelTank uf")
+        parser.add_argument("--company", type=int, help="Company id")
+        parser.add_argument(
+            "--revalue-costs",
+            action="store_true",
+            help="Write the FIFO price per liter back to the fuelings' item costs",
+        )
+
+    def handle(self, *args, **options):
+        tanks = FuelTank.objects.order_by("id")
+
+        if options["tank"]:
+            tanks = tanks.filter(uf=options["tank"])
+        if options["company"]:
+            tanks = tanks.filter(company_id=options["company"])
+
+        if not tanks.exists():
+            raise CommandError("No fuel tank found")
+
+        for tank in tanks:
+            result = rebuild_tank_fifo(
+                tank.id, revalue_costs=options["revalue_costs"])
+
+            self.stdout.write(
+                f"Tank {tank.uf} ({tank.fuel_type}): "
+                f"refills={result['refills']}, fuelings={result['fuelings']}, "
+                f"uncovered_l={result['uncovered_l']}"
+            )
+
+            if result["uncovered_l"] > 0:
+                self.stdout.write(self.style.WARNING(
+                    f"Tank {tank.uf}: {result['uncovered_l']} l fueled without refill stock"
+                ))
+
+        self.stdout.write(self.style.SUCCESS("FIFO cursors rebuilt"))
@@ -0,0 +1,23 @@
+# Generated by Django 5.2.10 on 2026-10-17 12:38
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('azz', '0011_truckfueling_item_cost'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='importbatch',
+            name='checkpoint',
+            field=models.JSONField(blank=True, default=dict),
+        ),
+        migrations.AddField(
+            model_name='supplierformat',
+            name='offload_raw_rows',
+            field=models.BooleanField(default=False),
+        ),
+    ]
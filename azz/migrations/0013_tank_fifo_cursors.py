@@ -0,0 +1,96 @@
+# Generated by Django 5.2.10 on 2026-10-17 12:40
+
+import django.db.models.deletion
+from decimal import Decimal
+from django.db import migrations, models
+
+
+BATCH_SIZE = 1000
+
+
+def rebuild_fifo_cursors(apps, schema_editor):
+    """
+    Snapshot of ayy.services.fuel_sync.rebuild_tank_fifo (without the cost
+    revaluation): refill every refill to actual_quantity_l, then let the
+    fuelings (by fueled_at) consume the refills (by date).
+    """
+    FuelTank = apps.get_model('azz', 'FuelTank')
+    TankRefill = apps.get_model('azz', 'TankRefill')
+    TankRefillConsumption = apps.get_model('azz', 'TankRefillConsumption')
+    TruckFueling = apps.get_model('azz', 'TruckFueling')
+
+    for tank_id in FuelTank.objects.values_list('id', flat=True):
+        refills = list(TankRefill.objects.filter(tank_id=tank_id).order_by('date', 'id'))
+        for refill in refills:
+            refill.remaining_l = refill.actual_quantity_l
+
+        consumptions = []
+        position = 0
+
+        for fueling_id, quantity_l in (
+            TruckFueling.objects
+            .filter(tank_id=tank_id)
+            .order_by('fueled_at', 'id')
+            .values_list('id', 'quantity_l')
+        ):
+            remaining = Decimal(quantity_l)
+
+            while remaining > 0 and position < len(refills):
+                refill = refills[position]
+                take = min(refill.remaining_l, remaining)
+
+                if take > 0:
+                    remaining -= take
+                    refill.remaining_l -= take
+
+                    consumptions.append(TankRefillConsumption(
+                        fueling_id=fueling_id,
+                        refill_id=refill.id,
+                        quantity_l=take,
+                        price_l=refill.price_l,
+                    ))
+
+                if refill.remaining_l <= 0:
+                    position += 1
+
+        TankRefill.objects.bulk_update(refills, ['remaining_l'], batch_size=BATCH_SIZE)
+        TankRefillConsumption.objects.bulk_create(consumptions, batch_size=BATCH_SIZE)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('att', '0074_remove_contact_invoice_reference_date_and_more'),
+        ('azz', '0012_import_streaming_checkpoint'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='TankRefillConsumption',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('quantity_l', models.DecimalField(decimal_places=2, max_digits=10)),
+                ('price_l', models.DecimalField(decimal_places=4, max_digits=10)),
+            ],
+        ),
+        migrations.AddField(
+            model_name='tankrefill',
+            name='remaining_l',
+            field=models.DecimalField(decimal_places=2, default=Decimal('0'), editable=False, max_digits=10),
+        ),
+        migrations.AddIndex(
+            model_name='tankrefill',
+            index=models.Index(condition=models.Q(('remaining_l__gt', 0)), fields=['tank', 'date', 'id'], name='tankrefill_open_fifo'),
+        ),
+        migrations.AddField(
+            model_name='tankrefillconsumption',
+            name='fueling',
+            field=models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='fueling_consumptions', to='azz.truckfueling'),
+        ),
+        migrations.AddField(
+            model_name='tankrefillconsumption',
+            name='refill',
+            field=models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='refill_consumptions', to='azz.tankrefill'),
+        ),
+        migrations.RunPython(rebuild_fifo_cursors, migrations.RunPython.noop),
+    ]
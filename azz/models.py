@@ -4,7 +4,7 @@ from django.contrib.auth import get_user_model
 from django.db import models, transaction
 from django.db.models import Max
 from django.core.validators import MinValueValidator
-from django.db.models import Sum
+from django.db.models import F, Sum
 from django.core.exceptions import ValidationError
 from decimal import Decimal
 
@@ -50,6 +50,10 @@ class SupplierFormat(models.Model):
     currency = models.CharField(default='MDL')
     country = models.CharField(default='MD')
 
+    # keep the aggregated source rows in gzip side files (default_storage)
+    # instead of ImportRow.raw_data, for suppliers with very large statements
+    offload_raw_rows = models.BooleanField(default=False)
+
     is_active = models.BooleanField(default=True)
     created_at = models.DateTimeField(auto_now_add=True)
 
@@ -110,6 +114,10 @@ class ImportBatch(models.Model):
 
     totals = models.JSONField(default=dict)  # rows_total, imported, skipped
 
+    # progress of process_import_batch, committed with every chunk:
+    # file_index, row_offset, chunk, rows_total, rows_imported, rows_skipped
+    checkpoint = models.JSONField(default=dict, blank=True)
+
     class Meta:
         indexes = [
             models.Index(fields=["company", "supplier"]),
@@ -258,15 +266,71 @@ class TankRefill(models.Model):
         blank=True
     )
 
+    # FIFO cursor: liters of this refill not consumed by fuelings yet,
+    # maintained by ayy.services.fuel_sync (never written by save() on update)
+    remaining_l = models.DecimalField(
+        max_digits=10,
+        decimal_places=2,
+        default=Decimal("0"),
+        editable=False,
+    )
+
     class Meta:
         ordering = ["-date"]
-        indexes = [models.Index(fields=["tank", "-date"])]
+        indexes = [
+            models.Index(fields=["tank", "-date"]),
+            # the open refills of a tank, in FIFO order
+            models.Index(
+                fields=["tank", "date", "id"],
+                condition=models.Q(remaining_l__gt=0),
+                name="tankrefill_open_fifo",
+            ),
+        ]
 
     def clean(self):
         current_stock = self.tank.get_current_fuel_stock()
         if current_stock + self.actual_quantity_l > self.tank.capacity_l:
             raise ValidationError("Tank capacity exceeded")
 
+    def save(self, *args, **kwargs):
+        if self._state.adding:
+            self.remaining_l = self.actual_quantity_l
+            return super().save(*args, **kwargs)
+
+        # remaining_l is changed by fuelings concurrently: never written from
+        # this instance, a changed actual quantity is applied as a delta
+        previous = (
+            TankRefill.objects
+            .filter(pk=self.pk)
+            .values_list("actual_quantity_l", flat=True)
+            .first()
+        )
+
+        update_fields = kwargs.get("update_fields") or [
+            field.name for field in self._meta.concrete_fields if not field.primary_key
+        ]
+        kwargs["update_fields"] = [
+            name for name in update_fields if name != "remaining_l"]
+
+        if previous is not None and Decimal(self.actual_quantity_l) < self.consumed_l():
+            raise ValidationError("Cannot reduce refill below the fuel already used")
+
+        super().save(*args, **kwargs)
+
+        if previous is not None and previous != self.actual_quantity_l:
+            TankRefill.objects.filter(pk=self.pk).update(
+                remaining_l=F("remaining_l") + (Decimal(self.actual_quantity_l) - previous)
+            )
+
+    def consumed_l(self):
+        """
+        Liters of this refill taken by fuelings (FIFO ledger).
+        """
+        return (
+            self.refill_consumptions.aggregate(total=Sum("quantity_l"))["total"]
+            or Decimal("0")
+        )
+
 
 class TruckFueling(models.Model):
     uf = models.CharField(max_length=36, default=hex_uuid, db_index=True)
@@ -309,6 +373,26 @@ class TruckFueling(models.Model):
             raise ValidationError("Not enough fuel in tank")
 
 
+class TankRefillConsumption(models.Model):
+    """
+    Liters of a refill consumed by a fueling (FIFO ledger): lets a fueling be
+    re-valued or deleted by giving its liters back to the refills it took.
+    """
+    fueling = models.ForeignKey(
+        TruckFueling, on_delete=models.CASCADE, related_name="fueling_consumptions")
+    refill = models.ForeignKey(
+        TankRefill, on_delete=models.CASCADE, related_name="refill_consumptions")
+
+    quantity_l = models.DecimalField(
+        max_digits=10,
+        decimal_places=2
+    )
+    price_l = models.DecimalField(
+        max_digits=10,
+        decimal_places=4
+    )
+
+
 ###### END FUEL & ADBLUE ######
 
 
@@ -1,9 +1,11 @@
 from decimal import Decimal
 from django.utils import timezone
+from django.core.exceptions import ValidationError as DjangoValidationError
 from django.db import transaction
 from rest_framework import serializers
 
 from abb.utils import get_user_company
+from ayy.services.fuel_sync import fifo_valuation
 from att.models import Contact, Person
 from .models import FuelTank, TruckFueling, Vehicle
 from .models import FuelTank, TankRefill
@@ -239,6 +241,14 @@ class TruckFuelingCreateSerializer(serializers.ModelSerializer):
                 vehicle=vehicle,
                 **validated_data
             )
+
+            # keep the FIFO cursors of the tank's refills in step
+            try:
+                fifo_valuation(fueling)
+            except DjangoValidationError:
+                raise serializers.ValidationError(
+                    {"quantity_l": "Not enough fuel in tank"})
+
             return fueling
 
 
@@ -1,6 +1,6 @@
 
 from django.dispatch import receiver
-from django.db.models.signals import post_save, post_delete
+from django.db.models.signals import post_save, post_delete, pre_delete
 from django.db import transaction
 from django.core.exceptions import ValidationError
 from django.utils import timezone
@@ -9,6 +9,7 @@ from axx.models import Trip
 from ayy.models import ItemCost
 from azz.models import FuelTank, TruckFueling
 from azz.tasks import match_unmatched_import_rows
+from ayy.services.fuel_sync import release_fueling
 
 
 @receiver(post_save, sender=Trip)
@@ -17,6 +18,15 @@ def on_trip_closed(sender, instance, **kwargs):
         match_unmatched_import_rows.delay(company_id=instance.company_id)
 
 
+@receiver(pre_delete, sender=TruckFueling)
+def release_fueling_on_delete(sender, instance, **kwargs):
+    """
+    Give the liters of a deleted fueling back to its refills (FIFO cursors);
+    also runs when the fueling is deleted with its ItemCost.
+    """
+    release_fueling(instance)
+
+
 # ADBLUE_TANK_CODE = "adblue_tanc"
 
 
@@ -1,149 +1,789 @@
 import logging
 import os
+import time
 import pandas as pd
 from datetime import timedelta
 from django.utils.dateparse import parse_datetime
 from django.utils.timezone import make_aware, is_naive
 from celery import shared_task
-from django.db import transaction
+from openpyxl import load_workbook
+from django.db import InterfaceError, OperationalError, close_old_connections, transaction
 from django.db.models import Q
 from django.utils import timezone
 
-from abb.models import Currency
-from abb.utils import normalize_excel_datetime, normalize_reg_number
+from abb.models import Country, Currency
+from abb.utils import normalize_excel_datetime_series, normalize_reg_number
 from app.models import Company, TypeCost
 from axx.models import Trip
 from ayy.models import ItemCost, ItemForItemCost
-from azz.utils import json_safe, recompute_batch_totals, resolve_country
+from azz.utils import (
+    frame_column,
+    json_safe_frame,
+    raw_rows_storage_name,
+    recompute_batch_totals,
+    write_raw_rows,
+)
 
 from .models import ImportBatch, ImportRow, SupplierFormat
-from .models import ImportBatch, ImportRow, SupplierFormat
 
 
 logger = logging.getLogger(__name__)
 
 
-def _match_row_to_trip(row: ImportRow):
+MATCH_CHUNK_SIZE = 1000
+
+# process_import_batch resumes from its checkpoint on connection errors only,
+# data errors fail the batch right away
+IMPORT_RETRY_EXCEPTIONS = (OperationalError, InterfaceError)
+IMPORT_MAX_RETRIES = 3
+IMPORT_RETRY_DELAY = 60
+
+
+def _lookup_index(model, field, values):
+    """
+    {value: [objects]} for the given values, one query.
+    None is looked up as IS NULL, like model.objects.get(field=None).
     """
-    Tries to match one ImportRow to a Trip and create ItemCost.
+    values = set(values)
+    condition = Q(**{f"{field}__in": [v for v in values if v is not None]})
+    if None in values:
+        condition |= Q(**{f"{field}__isnull": True})
+
+    index = {}
+    for obj in model.objects.filter(condition):
+        index.setdefault(getattr(obj, field), []).append(obj)
+
+    return index
 
-    Returns:
-        ("matched", trip) |
-        ("unmatched", None)
 
-    Raises:
-        Exception → handled by caller and stored as row error
+def _lookup(index, model, value):
     """
+    Same outcome as model.objects.get(): one object or DoesNotExist /
+    MultipleObjectsReturned.
+    """
+    objects = index.get(value, [])
+
+    if not objects:
+        raise model.DoesNotExist(
+            f"{model._meta.object_name} matching query does not exist.")
+
+    if len(objects) > 1:
+        raise model.MultipleObjectsReturned(
+            f"get() returned more than one {model._meta.object_name} -- it returned {len(objects)}!")
+
+    return objects[0]
 
-    batch = row.batch
 
-    # ---- resolve FK defaults ----
+def _country_index():
+    """
+    resolve_country() as a dict: label / value / value_iso3 -> first country
+    in the model ordering, as the OR query's .first() returns.
+    """
+    index = {}
+    for country in Country.objects.all():
+        for key in (country.label, country.value, country.value_iso3):
+            index.setdefault(key, country)
+
+    return index
 
-    # ---- normalized payload ----
+
+def _parse_match_datetime(value):
+    dt = parse_datetime(value)
+    if dt and is_naive(dt):
+        dt = make_aware(dt)
+    return dt
+
+
+def _prepare_row_match(row, lookups, countries):
+    """
+    Validates one ImportRow's normalized payload and resolves its lookups.
+    Raises → stored as row error.
+    """
     normalized = row.raw_data.get("_normalized", {})
     truck_number = normalized.get("truck_number")
     total_amount = normalized.get("amount")
     country_code = (normalized.get("country_label") or "MD")
-    item_for_item_cost_code = normalized.get("article_code")
-    type_code = normalized.get("cost_type")
 
     currency_code = normalized.get(
         "currency_code") or row.raw_data.get("currency_code", "MDL")
 
-    item_for_item_cost_obj = ItemForItemCost.objects.get(
-        code=item_for_item_cost_code
-    )
-    type_obj = TypeCost.objects.get(code=type_code)
-    currency_obj = Currency.objects.get(currency_code=currency_code)
-    country_obj = resolve_country(country_code)
-    date_from = parse_datetime(normalized.get("date_from"))
-    date_to = parse_datetime(normalized.get("date_to"))
-
-    if date_from and is_naive(date_from):
-        date_from = make_aware(date_from)
-    if date_to and is_naive(date_to):
-        date_to = make_aware(date_to)
-
-    required_missing = [
-        truck_number is None,
-        date_from is None,
-        total_amount is None,
-    ]
-
-    # print('3580', row,  truck_number, date_from,
-    #       total_amount, date_from, date_to, )
-
-    if any(required_missing):
+    item_for_item_cost_obj = _lookup(
+        lookups["items"], ItemForItemCost, normalized.get("article_code"))
+    type_obj = _lookup(lookups["types"], TypeCost, normalized.get("cost_type"))
+    currency_obj = _lookup(lookups["currencies"], Currency, currency_code)
+
+    country_value = country_code.strip().upper()
+    country_obj = countries.get(country_value)
+    if not country_obj:
+        raise ValueError(f"Country not found: {country_value}")
+
+    date_from = _parse_match_datetime(normalized.get("date_from"))
+    date_to = _parse_match_datetime(normalized.get("date_to"))
+
+    if truck_number is None or date_from is None or total_amount is None:
         raise ValueError("Missing normalized data")
 
-    normalized_truck = normalize_reg_number(truck_number)
+    if date_to is None:
+        raise ValueError("Cannot use None as a query value")
+
+    return {
+        "plate": normalize_reg_number(truck_number),
+        "date_from": date_from,
+        "date_to": date_to,
+        "total_amount": total_amount,
+        "item_for_item_cost": item_for_item_cost_obj,
+        "type": type_obj,
+        "currency": currency_obj,
+        "country": country_obj,
+    }
+
+
+def _trip_index(company_ids, plates, date_from, date_to):
+    """
+    Trips of the companies overlapping [date_from, date_to] on any of the
+    plates, as {(company_id, plate): [(date_order, date_end, trip_id)]}
+    sorted by date_order.
+    """
+    index = {}
 
-    # ---- find trip ----
-    trip = (
+    trips = (
         Trip.objects
         .filter(
-            company=batch.company,
+            company_id__in=company_ids,
             date_order__lte=date_to,
             date_end__gte=date_from,
         )
         .filter(
-            Q(vehicle_tractor__normalized_reg_number=normalized_truck) |
-            Q(vehicle_trailer__normalized_reg_number=normalized_truck)
+            Q(vehicle_tractor__normalized_reg_number__in=plates) |
+            Q(vehicle_trailer__normalized_reg_number__in=plates)
+        )
+        .order_by("date_order", "id")
+        .values_list(
+            "id",
+            "company_id",
+            "date_order",
+            "date_end",
+            "vehicle_tractor__normalized_reg_number",
+            "vehicle_trailer__normalized_reg_number",
         )
-        .order_by("date_order")
-        .first()
     )
 
-    # print('3584', date_to, date_from)
-
-    if not trip:
-        return "unmatched", None
-
-    # ---- compute unit amount ----
-    quantity = row.raw_data.get("Cantitate", 1)
-    unit_amount = None
-    if quantity and quantity > 0:
-        unit_amount = total_amount / quantity
-
-    # ---- accounting date ----
-    date = date_from
-
-    # ---- create cost ----
-    ItemCost.objects.create(
-        company=trip.company,
-        trip=trip,
-        date=date,
-        item_for_item_cost=item_for_item_cost_obj,
-        currency=currency_obj,
-        type=type_obj,
-        country=country_obj,
-        quantity=quantity,
-        amount=unit_amount,
-        created_by=batch.created_by,
+    for trip_id, company_id, date_order, date_end, tractor, trailer in trips:
+        for plate in {tractor, trailer}:
+            if plate in plates:
+                index.setdefault((company_id, plate), []).append(
+                    (date_order, date_end, trip_id))
+
+    return index
+
+
+def _find_trip(intervals, date_from, date_to):
+    """
+    First trip (by date_order) with date_order <= date_to and
+    date_end >= date_from.
+    """
+    for date_order, date_end, trip_id in intervals:
+        if date_order > date_to:
+            break
+        if date_end >= date_from:
+            return trip_id
+
+    return None
+
+
+def _match_import_rows_chunk(rows, countries):
+    normalized = [row.raw_data.get("_normalized", {}) for row in rows]
+    lookups = {
+        "items": _lookup_index(
+            ItemForItemCost, "code", (n.get("article_code") for n in normalized)),
+        "types": _lookup_index(
+            TypeCost, "code", (n.get("cost_type") for n in normalized)),
+        "currencies": _lookup_index(
+            Currency,
+            "currency_code",
+            (
+                n.get("currency_code") or row.raw_data.get("currency_code", "MDL")
+                for row, n in zip(rows, normalized)
+            ),
+        ),
+    }
+
+    prepared = {}
+    for row in rows:
+        try:
+            prepared[row.pk] = _prepare_row_match(row, lookups, countries)
+        except Exception as exc:
+            row.status = ImportRow.STATUS_ERROR
+            row.error_message = str(exc)
+
+    trips = {}
+    if prepared:
+        trips = _trip_index(
+            {row.batch.company_id for row in rows if row.pk in prepared},
+            {data["plate"] for data in prepared.values()},
+            min(data["date_from"] for data in prepared.values()),
+            max(data["date_to"] for data in prepared.values()),
+        )
+
+    costs = []
+    for row in rows:
+        data = prepared.get(row.pk)
+        if data is None:
+            continue
+
+        try:
+            trip_id = _find_trip(
+                trips.get((row.batch.company_id, data["plate"]), ()),
+                data["date_from"],
+                data["date_to"],
+            )
+
+            if trip_id is None:
+                row.status = ImportRow.STATUS_UNMATCHED
+                continue
+
+            # ---- compute unit amount ----
+            quantity = row.raw_data.get("Cantitate", 1)
+            unit_amount = None
+            if quantity and quantity > 0:
+                unit_amount = data["total_amount"] / quantity
+
+            costs.append(ItemCost(
+                company_id=row.batch.company_id,
+                trip_id=trip_id,
+                date=data["date_from"],
+                item_for_item_cost=data["item_for_item_cost"],
+                currency=data["currency"],
+                type=data["type"],
+                country=data["country"],
+                quantity=quantity,
+                amount=unit_amount,
+                created_by_id=row.batch.created_by_id,
+            ))
+
+            row.matched_trip_id = trip_id
+            row.status = ImportRow.STATUS_MATCHED
+            row.error_message = ""
+
+        except Exception as exc:
+            row.status = ImportRow.STATUS_ERROR
+            row.error_message = str(exc)
+
+    with transaction.atomic():
+        ItemCost.objects.bulk_create(costs, batch_size=MATCH_CHUNK_SIZE)
+        ImportRow.objects.bulk_update(
+            rows,
+            ["matched_trip_id", "status", "error_message"],
+            batch_size=MATCH_CHUNK_SIZE,
+        )
+
+
+def match_import_rows(rows):
+    """
+    Matches ImportRows (with batch selected) to trips and creates their
+    ItemCosts, MATCH_CHUNK_SIZE rows at a time: lookups and the trips
+    overlapping the chunk are loaded once, rows are matched in memory, then
+    costs are bulk-created and rows bulk-updated.
+
+    Same rules as matching one row: first trip of the company by date_order
+    whose tractor or trailer plate is the row's and whose
+    [date_order, date_end] overlaps the row dates. Rows that cannot be
+    resolved end as STATUS_ERROR with the error message.
+
+    Returns {"matched", "unmatched", "errors", "batch_ids"}; batch_ids are
+    the batches with a matched or failed row.
+    """
+    countries = _country_index()
+    counts = {"matched": 0, "unmatched": 0, "errors": 0, "batch_ids": set()}
+
+    def flush(chunk):
+        _match_import_rows_chunk(chunk, countries)
+
+        for row in chunk:
+            if row.status == ImportRow.STATUS_UNMATCHED:
+                counts["unmatched"] += 1
+                continue
+
+            if row.status == ImportRow.STATUS_MATCHED:
+                counts["matched"] += 1
+            else:
+                counts["errors"] += 1
+            counts["batch_ids"].add(row.batch_id)
+
+    chunk = []
+    for row in rows:
+        chunk.append(row)
+        if len(chunk) >= MATCH_CHUNK_SIZE:
+            flush(chunk)
+            chunk = []
+
+    if chunk:
+        flush(chunk)
+
+    return counts
+
+
+IMPORT_BULK_BATCH_SIZE = 1000
+DUPLICATE_CHECK_CHUNK_SIZE = 5000
+
+# checked in this order when the mapped supplier_row_id column is empty
+SUPPLIER_ROW_ID_FALLBACK_COLUMNS = ("ID", "Id", "Transaction ID")
+
+AGGREGATION_KEYS = ["truck_number", "day", "article_code"]
+
+
+def _add_timing(timings, stage, started):
+    timings[stage] = round(
+        timings.get(stage, 0) + (time.monotonic() - started), 3
     )
 
-    return "matched", trip
+
+def _resolve_article_codes(frame, supplier_format):
+    """
+    Article code of every row: the format's fixed code, or the supplier code
+    column mapped through article_code_map (each distinct code resolved once).
+    """
+    mapping = supplier_format.column_mapping
+    article_code_override = mapping.get("article_code")
+    article_code_column = mapping.get("article_code_column")
+    article_code_map = mapping.get("article_code_map", {})
+
+    if article_code_override:
+        return pd.Series(article_code_override, index=frame.index, dtype=object)
+
+    if not article_code_column:
+        return pd.Series(None, index=frame.index, dtype=object)
+
+    supplier_codes = frame_column(frame, article_code_column)
+    resolved = {}
+
+    for supplier_code in pd.unique(supplier_codes):
+        if not supplier_code:
+            resolved[supplier_code] = None
+            continue
+
+        code = str(supplier_code).upper().replace(" ", "").strip()
+
+        if code not in article_code_map:
+            logger.warning(
+                "Unmapped article code %s for supplier %s",
+                code,
+                supplier_format.id
+            )
+
+        resolved[supplier_code] = article_code_map.get(code)
+
+    return supplier_codes.map(resolved.get)
+
+
+def _supplier_row_ids(frame, supplier_row_id_col):
+    supplier_row_ids = frame_column(frame, supplier_row_id_col)
+
+    for column in SUPPLIER_ROW_ID_FALLBACK_COLUMNS:
+        supplier_row_ids = supplier_row_ids.where(
+            supplier_row_ids.astype(bool), frame_column(frame, column)
+        )
+
+    return supplier_row_ids
+
+
+def _parse_import_datetimes(values, tz):
+    normalized = normalize_excel_datetime_series(values, tz)
+    parsed = {}
+
+    for value in pd.unique(normalized):
+        dt = parse_datetime(value) if isinstance(value, str) else value
+        if dt and is_naive(dt):
+            dt = make_aware(dt)
+        parsed[value] = dt
+
+    return [parsed[value] for value in normalized]
+
+
+def _existing_supplier_row_ids(company, supplier_row_ids):
+    supplier_row_ids = list(supplier_row_ids)
+    existing = set()
+
+    for start in range(0, len(supplier_row_ids), DUPLICATE_CHECK_CHUNK_SIZE):
+        existing.update(
+            ImportRow.objects
+            .filter(
+                batch__company=company,
+                supplier_row_id__in=supplier_row_ids[start:start + DUPLICATE_CHECK_CHUNK_SIZE],
+            )
+            .values_list("supplier_row_id", flat=True)
+        )
+
+    return existing
+
+
+def _aggregate_import_frame(df, supplier_format, tz, timings):
+    """
+    Normalize one file column-wise and aggregate it per (truck, day, article).
+
+    Returns (rows_total, rows_skipped, aggregated); aggregated keeps the order
+    in which the groups first appear in the file.
+    """
+    mapping = supplier_format.column_mapping
+
+    # ---- normalize, column-wise ----
+    started = time.monotonic()
+    frame = json_safe_frame(df)
+
+    article_codes = _resolve_article_codes(frame, supplier_format)
+    truck_numbers = frame_column(frame, mapping["truck_number"])
+    amounts = frame_column(frame, mapping["amount"])
+    dates_from = frame_column(frame, mapping["date_from"])
+
+    valid = (
+        article_codes.astype(bool)
+        & truck_numbers.astype(bool)
+        & amounts.notna()
+        & (amounts != "")
+        & dates_from.astype(bool)
+    )
+
+    # date_to is normalized from date_from as well, as before
+    normalized_dates = pd.Series(None, index=frame.index, dtype=object)
+    normalized_dates[valid] = pd.Series(
+        _parse_import_datetimes(dates_from[valid], tz),
+        index=frame.index[valid],
+        dtype=object,
+    )
+    valid &= normalized_dates.notna()
+
+    rows_skipped = int((~valid).sum())
+
+    records = frame[valid].to_dict("records")
+    supplier_row_ids = _supplier_row_ids(frame, mapping["supplier_row_id"])[valid].tolist()
+    normalized_dates = normalized_dates[valid].tolist()
+
+    rows = pd.DataFrame({
+        "truck_number": (
+            truck_numbers[valid].astype(str).str.upper()
+            .str.replace(" ", "", regex=False)
+            .str.replace("-", "", regex=False)
+            .tolist()
+        ),
+        "day": [dt.date() for dt in normalized_dates],
+        "article_code": article_codes[valid].tolist(),
+        "amount": amounts[valid].map(float).tolist(),
+    })
+    _add_timing(timings, "normalize", started)
+
+    # ---- aggregate ----
+    started = time.monotonic()
+    aggregated = []
+
+    if len(rows):
+        grouped = rows.groupby(AGGREGATION_KEYS, sort=False)
+        amount_totals = grouped["amount"].sum()
+        positions_by_key = grouped.indices
+
+        for key, amount in amount_totals.items():
+            positions = positions_by_key[key]
+            first = positions[0]
+
+            aggregated.append({
+                "truck_number": key[0],
+                "date_from": normalized_dates[first],
+                "date_to": normalized_dates[first],
+                "amount": float(amount),
+                "rows": [records[position] for position in positions],
+                "supplier_row_ids": {
+                    str(supplier_row_ids[position])
+                    for position in positions
+                    if supplier_row_ids[position]
+                },
+                "country_code": records[first].get(mapping["country_label"]),
+                "currency": records[first].get(mapping["currency_code"]),
+                "article_code": key[2],
+            })
+    _add_timing(timings, "aggregate", started)
+
+    return len(frame), rows_skipped, aggregated
+
+
+# files up to this size are read whole (one chunk); larger ones are streamed
+STREAMING_FILE_SIZE = 10 * 1024 * 1024
+IMPORT_CHUNK_ROWS = 20000
+
+
+def _xlsx_chunks(path, start_row):
+    """
+    Read-only openpyxl: rows are parsed as they are read, the sheet is never
+    loaded whole. Fully empty rows are dropped, as pd.read_excel does.
+    """
+    wb = load_workbook(path, read_only=True, data_only=True)
+
+    try:
+        ws = wb.worksheets[0]
+        rows = ws.iter_rows(values_only=True)
+        header = next(rows, None)
+        if header is None:
+            return
+
+        columns = [
+            str(value) if value is not None else f"Unnamed: {idx}"
+            for idx, value in enumerate(header)
+        ]
+
+        # resume: skip the rows committed by a previous run
+        for _skipped in zip(range(start_row), rows):
+            pass
+
+        row_offset = start_row
+        records = []
+
+        for values in rows:
+            row_offset += 1
+            if any(value is not None for value in values):
+                values = values[:len(columns)]
+                records.append(values + (None,) * (len(columns) - len(values)))
+
+            if row_offset - start_row >= IMPORT_CHUNK_ROWS:
+                yield row_offset, pd.DataFrame.from_records(records, columns=columns)
+                start_row = row_offset
+                records = []
+
+        if row_offset > start_row:
+            yield row_offset, pd.DataFrame.from_records(records, columns=columns)
+
+    finally:
+        wb.close()
+
+
+def _iter_import_chunks(path, start_row=0):
+    """
+    Yields (row_offset, DataFrame): the data rows of the file from start_row
+    on, in chunks; row_offset is the number of data rows read after the chunk
+    (the checkpoint to resume from).
+
+    Files up to STREAMING_FILE_SIZE are read whole. Larger CSV files are read
+    with a pandas chunked reader and larger XLSX files with read-only openpyxl.
+    """
+    lower = path.lower()
+
+    if not lower.endswith((".csv", ".xls", ".xlsx", ".xlsm")):
+        return
+
+    if os.path.getsize(path) > STREAMING_FILE_SIZE:
+        if lower.endswith(".csv"):
+            reader = pd.read_csv(
+                path,
+                chunksize=IMPORT_CHUNK_ROWS,
+                skiprows=range(1, start_row + 1),
+            )
+            row_offset = start_row
+            for df in reader:
+                row_offset += len(df)
+                if len(df):
+                    yield row_offset, df
+            return
+
+        if lower.endswith((".xlsx", ".xlsm")):
+            yield from _xlsx_chunks(path, start_row)
+            return
+
+    # small files, and .xls (not readable by openpyxl, at most 65536 rows)
+    df = pd.read_csv(path) if lower.endswith(".csv") else pd.read_excel(path)
+    df = df.iloc[start_row:]
+    if len(df):
+        yield start_row + len(df), df
+
+
+def _aggregate_key(truck_number, date_from, article_code):
+    return f"{truck_number}|{date_from[:10]}|{article_code}"
+
+
+def _file_aggregate_ids(batch, filename):
+    """
+    {aggregate key: ImportRow id} of the rows already stored for the file, so
+    a (truck, day, article) group split across chunks (or across a resumed
+    run) ends in one ImportRow.
+    """
+    return {
+        _aggregate_key(
+            normalized["truck_number"],
+            normalized["date_from"],
+            normalized["article_code"],
+        ): import_row_id
+        for import_row_id, normalized in (
+            ImportRow.objects
+            .filter(batch=batch, source_file=filename)
+            .values_list("id", "raw_data___normalized")
+        )
+    }
+
+
+def _join_supplier_row_ids(supplier_row_ids):
+    return ",".join(sorted(supplier_row_ids))[:100]
+
+
+def _store_import_chunk(batch, supplier_format, filename, aggregated, aggregate_ids, raw_rows_name):
+    """
+    Stores the aggregates of one chunk: new (truck, day, article) groups as
+    ImportRows, groups already stored for the file merged into their row.
+    Aggregates with a supplier row imported before are skipped.
+
+    With raw_rows_name the source rows go to that side file instead of
+    raw_data. Returns (rows_imported, rows_skipped).
+    """
+    cost_type = supplier_format.column_mapping.get("cost_type")
+
+    # ---- skip supplier rows imported before (one query per chunk) ----
+    existing_ids = _existing_supplier_row_ids(
+        batch.company,
+        set().union(*(data["supplier_row_ids"] for data in aggregated)),
+    )
+
+    new_rows = []
+    merged = {}
+    skipped = 0
+
+    for data in aggregated:
+
+        if data["supplier_row_ids"] & existing_ids:
+            skipped += 1
+            continue
+
+        key = _aggregate_key(
+            data["truck_number"],
+            data["date_from"].isoformat(),
+            data["article_code"],
+        )
+
+        if key in aggregate_ids:
+            merged[aggregate_ids[key]] = data
+            continue
+
+        supplier_row_id = _join_supplier_row_ids(data["supplier_row_ids"])
+        # rows created in this run count as existing for the next aggregates
+        existing_ids.add(supplier_row_id)
+
+        raw_data = {
+            "_normalized": {
+                "article_code": data["article_code"],
+                "cost_type": cost_type,
+                "truck_number": data["truck_number"],
+                "date_from": (
+                    data["date_from"].isoformat()
+                    if data["date_from"] else None
+                ),
+                "date_to": (
+                    data["date_to"].isoformat()
+                    if data["date_to"] else None
+                ),
+                "amount": data["amount"],
+                "currency_code": (
+                    data["currency"] or supplier_format.currency
+                ).strip().upper(),
+                "country_label": (
+                    data["country_code"] or supplier_format.country
+                ).strip().upper(),
+            },
+        }
+
+        if raw_rows_name:
+            raw_data["_aggregated_rows_files"] = [raw_rows_name]
+        else:
+            raw_data["_aggregated_rows"] = data["rows"]
+
+        new_rows.append((key, data, ImportRow(
+            batch=batch,
+            source_file=filename,
+            row_number=0,
+            supplier_row_id=supplier_row_id,
+            raw_data=raw_data,
+            status=ImportRow.STATUS_IMPORTED,
+        )))
+
+    ImportRow.objects.bulk_create(
+        [import_row for _key, _data, import_row in new_rows],
+        batch_size=IMPORT_BULK_BATCH_SIZE,
+    )
+
+    for key, _data, import_row in new_rows:
+        aggregate_ids[key] = import_row.id
+
+    # ---- groups continued from a previous chunk ----
+    merged_rows = list(ImportRow.objects.filter(id__in=merged.keys()))
+
+    for import_row in merged_rows:
+        data = merged[import_row.id]
+        raw_data = import_row.raw_data
+
+        raw_data["_normalized"]["amount"] += data["amount"]
+
+        if raw_rows_name:
+            files = raw_data.setdefault("_aggregated_rows_files", [])
+            if raw_rows_name not in files:
+                files.append(raw_rows_name)
+        else:
+            raw_data.setdefault("_aggregated_rows", []).extend(data["rows"])
+
+        stored_ids = set(filter(None, (import_row.supplier_row_id or "").split(",")))
+        import_row.supplier_row_id = _join_supplier_row_ids(
+            stored_ids | data["supplier_row_ids"])
+
+    ImportRow.objects.bulk_update(
+        merged_rows,
+        ["supplier_row_id", "raw_data"],
+        batch_size=IMPORT_BULK_BATCH_SIZE,
+    )
+
+    if raw_rows_name:
+        entries = [(import_row.id, data["rows"]) for _key, data, import_row in new_rows]
+        entries += [(import_row.id, merged[import_row.id]["rows"]) for import_row in merged_rows]
+        if entries:
+            write_raw_rows(raw_rows_name, entries)
+
+    return len(new_rows), skipped
+
+
+def _remove_temp_files(file_paths):
+    for path in file_paths:
+        try:
+            os.remove(path)
+        except FileNotFoundError:
+            pass
+        except Exception as e:
+            print(f"Could not delete temp file {path}: {e}")
 
 
 @shared_task(
     bind=True,
     autoretry_for=(),  # ❗ do NOT retry on data errors
+    max_retries=IMPORT_MAX_RETRIES,
+    default_retry_delay=IMPORT_RETRY_DELAY,
 )
 def process_import_batch(self, batch_id, supplier_format_id, file_paths):
     """
     Steps:
     1. Mark batch as PROCESSING
-    2. Read CSV/XLSX files
-    3. Normalize rows using SupplierFormat.column_mapping
-    4. Store ImportRow (raw_data + status)
-    5. Update totals
-    6. Cleanup temp files
+    2. Read CSV/XLSX files in chunks (large files are streamed)
+    3. Normalize rows using SupplierFormat.column_mapping (column-wise)
+    4. Aggregate per (truck, day, article) and drop already imported supplier rows
+    5. Store ImportRow (raw_data + status) in bulk, merging groups split
+       across chunks
+    6. Commit every chunk together with ImportBatch.checkpoint
+    7. Update totals (with per-stage timings)
+    8. Cleanup temp files
+
+    Memory is bounded by the chunk size, not by the file size. On a database
+    connection error the task is retried with the same files and resumes after
+    the last committed chunk. Any other error, or running out of retries, fails
+    the batch: the temp files are removed and the rows already committed are
+    still matched.
     """
 
     batch = ImportBatch.objects.get(id=batch_id)
     supplier_format = SupplierFormat.objects.get(id=supplier_format_id)
     mapping = supplier_format.column_mapping or {}
 
+    if batch.status == ImportBatch.STATUS_DONE:
+        return
+
     # ---- validate mapping ONCE (fail fast, no retry) ----
     REQUIRED_KEYS = {"truck_number", "amount", "date_from"}
 
@@ -155,217 +795,124 @@ def process_import_batch(self, batch_id, supplier_format_id, file_paths):
             "error": f"SupplierFormat.column_mapping missing keys: {', '.join(missing)}"
         }
         batch.save(update_fields=["status", "finished_at", "totals"])
+        _remove_temp_files(file_paths)
         return
 
-    article_code_override = supplier_format.column_mapping.get("article_code")
-    article_code_column = supplier_format.column_mapping.get(
-        "article_code_column")
-    article_code_map = supplier_format.column_mapping.get(
-        "article_code_map", {})
-
-    truck_col = mapping["truck_number"]
-    amount_col = mapping["amount"]
-    date_from_col = mapping["date_from"]
-    country_col = mapping["country_label"]
-    currency_col = mapping["currency_code"]
-    supplier_row_id_col = mapping["supplier_row_id"]
-
-    # derived from date_from_col as fallback
-    date_to_col = mapping.get("date_to", date_from_col)
-
     # ---- mark processing ----
     batch.status = ImportBatch.STATUS_PROCESSING
     batch.save(update_fields=["status"])
 
-    rows_total = 0
-    rows_imported = 0
-    rows_skipped = 0
+    # ---- resume from the last committed chunk ----
+    checkpoint = {
+        "file_index": 0,
+        "row_offset": 0,
+        "chunk": 0,
+        "rows_total": 0,
+        "rows_imported": 0,
+        "rows_skipped": 0,
+        "timings": {},
+        **batch.checkpoint,
+    }
+    timings = checkpoint["timings"]
+
+    tz = timezone.get_current_timezone()
 
     try:
-        with transaction.atomic():
-            for path in file_paths:
-                filename = os.path.basename(path)
-
-                # ---- load file ----
-                if path.lower().endswith(".csv"):
-                    df = pd.read_csv(path)
-                elif path.lower().endswith((".xls", ".xlsx", ".xlsm")):
-                    df = pd.read_excel(path)
-                else:
-                    continue
-
-                aggregated = {}
-
-                for idx, row in df.iterrows():
-                    rows_total += 1
-                    raw = {k: json_safe(v) for k, v in row.to_dict().items()}
-
-                    truck_number = raw.get(truck_col)
-                    amount = raw.get(amount_col)
-                    date_from = raw.get(date_from_col)
-                    date_to = raw.get(date_to_col)
-                    country_code = raw.get(country_col)
-                    currency = raw.get(currency_col)
-                    supplier_row_id = (
-                        raw.get(supplier_row_id_col)
-                        or raw.get("ID")
-                        or raw.get("Id")
-                        or raw.get("Transaction ID")
-                    )
+        for file_index, path in enumerate(file_paths):
+            if file_index < checkpoint["file_index"]:
+                continue
+
+            if file_index > checkpoint["file_index"]:
+                checkpoint["file_index"] = file_index
+                checkpoint["row_offset"] = 0
+
+            filename = os.path.basename(path)
+            aggregate_ids = _file_aggregate_ids(batch, filename)
 
-                    cost_type = supplier_format.column_mapping.get(
-                        'cost_type')
-
-                    def resolve_article_code(raw):
-                        if article_code_override:
-                            return article_code_override
-
-                        if not article_code_column:
-                            return None
-
-                        supplier_code = raw.get(article_code_column)
-                        if not supplier_code:
-                            return None
-
-                        supplier_code = str(
-                            supplier_code).upper().replace(" ", "").strip()
-
-                        if supplier_code not in article_code_map:
-                            logger.warning(
-                                "Unmapped article code %s for supplier %s",
-                                supplier_code,
-                                supplier_format.id
-                            )
-
-                        return article_code_map.get(supplier_code)
-
-                    article_code = resolve_article_code(raw)
-
-                    if not article_code:
-                        rows_skipped += 1
-                        continue
-
-                    if not truck_number or amount in ("", None) or not date_from:
-                        rows_skipped += 1
-                        continue
-
-                    truck_number = normalize_reg_number(str(truck_number))
-                    tz = timezone.get_current_timezone()
-                    normalized_date_from = normalize_excel_datetime(
-                        date_from, tz)
-
-                    if isinstance(normalized_date_from, str):
-                        normalized_date_from = parse_datetime(
-                            normalized_date_from)
-
-                    if normalized_date_from and is_naive(normalized_date_from):
-                        normalized_date_from = make_aware(normalized_date_from)
-
-                    normalized_date_to = normalize_excel_datetime(
-                        date_from, tz)
-
-                    if isinstance(normalized_date_to, str):
-                        normalized_date_to = parse_datetime(normalized_date_to)
-
-                    if normalized_date_to and is_naive(normalized_date_to):
-                        normalized_date_to = make_aware(normalized_date_to)
-
-                    if not normalized_date_from:
-                        rows_skipped += 1
-                        continue
-
-                    key = (truck_number, normalized_date_from.date(),  article_code)
-
-                    if key not in aggregated:
-                        aggregated[key] = {
-                            "truck_number": truck_number,
-                            "date_from": normalized_date_from,
-                            "date_to": normalized_date_to,
-                            "amount": float(amount),
-                            "rows": [raw],
-                            "supplier_row_ids": {str(supplier_row_id)} if supplier_row_id else set(),
-                            "country_code": country_code,
-                            "currency": currency,
-                            "article_code": article_code,
-                        }
-                    else:
-                        aggregated[key]["amount"] += float(amount)
-                        aggregated[key]["rows"].append(raw)
-                        if supplier_row_id:
-                            aggregated[key]["supplier_row_ids"].add(
-                                str(supplier_row_id))
-
-                for key, data in aggregated.items():
-
-                    if data["supplier_row_ids"] and ImportRow.objects.filter(
-                        supplier_row_id__in=data["supplier_row_ids"],
-                        batch__company=batch.company,
-                    ).exists():
-                        rows_skipped += 1
-                        continue
-
-                    ImportRow.objects.create(
-                        batch=batch,
-                        source_file=filename,
-                        row_number=0,
-                        supplier_row_id=",".join(
-                            sorted(data["supplier_row_ids"]))[:100],
-                        raw_data={
-                            "_aggregated_rows": data["rows"],
-                            "_normalized": {
-                                "article_code": data["article_code"],
-                                "cost_type": cost_type,
-                                "truck_number": data["truck_number"],
-                                "date_from": (
-                                    data["date_from"].isoformat()
-                                    if data["date_from"] else None
-                                ),
-                                "date_to": (
-                                    data["date_to"].isoformat()
-                                    if data["date_to"] else None
-                                ),
-                                "amount": data["amount"],
-                                "currency_code": (
-                                    data["currency"] or supplier_format.currency
-                                ).strip().upper(),
-                                "country_label": (
-                                    data["country_code"] or supplier_format.country
-                                ).strip().upper(),
-                            },
-                        },
-                        status=ImportRow.STATUS_IMPORTED,
+            # ---- load file, chunk by chunk ----
+            started = time.monotonic()
+            for row_offset, df in _iter_import_chunks(path, checkpoint["row_offset"]):
+                _add_timing(timings, "read", started)
+
+                file_rows, file_skipped, aggregated = _aggregate_import_frame(
+                    df, supplier_format, tz, timings)
+
+                # ---- store, committed with the checkpoint ----
+                started = time.monotonic()
+                with transaction.atomic():
+                    raw_rows_name = None
+                    if supplier_format.offload_raw_rows:
+                        raw_rows_name = raw_rows_storage_name(batch, checkpoint["chunk"])
+
+                    imported, skipped = _store_import_chunk(
+                        batch,
+                        supplier_format,
+                        filename,
+                        aggregated,
+                        aggregate_ids,
+                        raw_rows_name,
                     )
 
-                    rows_imported += 1
+                    checkpoint["row_offset"] = row_offset
+                    checkpoint["chunk"] += 1
+                    checkpoint["rows_total"] += file_rows
+                    checkpoint["rows_imported"] += imported
+                    checkpoint["rows_skipped"] += file_skipped + skipped
+
+                    batch.checkpoint = checkpoint
+                    batch.save(update_fields=["checkpoint"])
+                _add_timing(timings, "store", started)
+
+                started = time.monotonic()
 
         # ---- success ----
         batch.status = ImportBatch.STATUS_DONE
         batch.finished_at = timezone.now()
         batch.totals = {
-            "rows_total": rows_total,
-            "rows_imported": rows_imported,
-            "rows_skipped": rows_skipped,
+            "rows_total": checkpoint["rows_total"],
+            "rows_imported": checkpoint["rows_imported"],
+            "rows_skipped": checkpoint["rows_skipped"],
+            "timings": timings,
         }
         batch.save()
 
-        match_import_rows_to_trips.delay(batch.id)
+    except IMPORT_RETRY_EXCEPTIONS as exc:
+        # drop the broken connection, the next query reconnects
+        close_old_connections()
+
+        if self.request.retries >= self.max_retries:
+            _fail_import_batch(batch, exc, timings, file_paths)
+            raise
+
+        # ---- keep the files, the retry resumes from the checkpoint ----
+        batch.totals = {"error": str(exc), "retries": self.request.retries + 1, "timings": timings}
+        batch.save(update_fields=["totals"])
+        raise self.retry(exc=exc)
 
     except Exception as exc:
-        batch.status = ImportBatch.STATUS_FAILED
-        batch.finished_at = timezone.now()
-        batch.totals = {"error": str(exc)}
-        batch.save(update_fields=["status", "finished_at", "totals"])
+        _fail_import_batch(batch, exc, timings, file_paths)
         raise
 
-    finally:
-        # ---- cleanup temp files ----
-        for path in file_paths:
-            try:
-                os.remove(path)
-            except FileNotFoundError:
-                pass
-            except Exception as e:
-                print(f"Could not delete temp file {path}: {e}")
+    # ---- cleanup temp files ----
+    _remove_temp_files(file_paths)
+
+    match_import_rows_to_trips.delay(batch.id)
+
+
+def _fail_import_batch(batch, exc, timings, file_paths):
+    """
+    Terminal failure: nothing resumes the batch any more, so drop the temp
+    files and match the rows committed before the error.
+    """
+    batch.status = ImportBatch.STATUS_FAILED
+    batch.finished_at = timezone.now()
+    batch.totals = {"error": str(exc), "timings": timings}
+    batch.save(update_fields=["status", "finished_at", "totals"])
+
+    _remove_temp_files(file_paths)
+
+    if batch.checkpoint.get("rows_imported"):
+        match_import_rows_to_trips.delay(batch.id)
 
 
 @shared_task(bind=True)
@@ -378,34 +925,12 @@ def match_import_rows_to_trips(self, batch_id):
         .select_related("batch")
     )
 
-    matched = skipped = errors = 0
-
-    for row in rows:
-
-        try:
-            result, trip = _match_row_to_trip(row)
-
-            if result == "unmatched":
-                row.status = ImportRow.STATUS_UNMATCHED
-                row.save(update_fields=["status"])
-                skipped += 1
-                continue
-
-            row.matched_trip_id = trip.id
-            row.status = ImportRow.STATUS_MATCHED
-            row.save(update_fields=["matched_trip_id", "status"])
-            matched += 1
-
-        except Exception as exc:
-            row.status = ImportRow.STATUS_ERROR
-            row.error_message = str(exc)
-            row.save(update_fields=["status", "error_message"])
-            errors += 1
+    counts = match_import_rows(rows.iterator(chunk_size=MATCH_CHUNK_SIZE))
 
     batch.totals.update({
-        "matched": matched,
-        "unmatched": skipped,
-        "match_errors": errors,
+        "matched": counts["matched"],
+        "unmatched": counts["unmatched"],
+        "match_errors": counts["errors"],
     })
     batch.save(update_fields=["totals"])
 
@@ -419,42 +944,14 @@ def match_unmatched_import_rows(self, company_id=None):
 
     qs = qs.select_related("batch")
 
-    touched_batches = set()
-    matched = skipped = errors = 0
-
-    for row in qs:
-        try:
-            # 🔒 isolate EACH ROW
-            with transaction.atomic():
-                result, trip = _match_row_to_trip(row)
-
-                if result != "matched":
-                    skipped += 1
-                    continue
-
-                row.matched_trip_id = trip.id
-                row.status = ImportRow.STATUS_MATCHED
-                row.error_message = ''
-                row.save(update_fields=[
-                         "matched_trip_id", "status", "error_message"])
-
-                matched += 1
-                touched_batches.add(row.batch_id)
-
-        except Exception as exc:
-            # ✅ safe OUTSIDE atomic
-            row.status = ImportRow.STATUS_ERROR
-            row.error_message = str(exc)
-            row.save(update_fields=["status", "error_message"])
-
-            errors += 1
-            touched_batches.add(row.batch_id)
+    counts = match_import_rows(qs.iterator(chunk_size=MATCH_CHUNK_SIZE))
 
     print(
-        f"[MATCH_UNMATCHED] matched={matched}, skipped={skipped}, errors={errors}"
+        f"[MATCH_UNMATCHED] matched={counts['matched']}, "
+        f"skipped={counts['unmatched']}, errors={counts['errors']}"
     )
 
-    for batch_id in touched_batches:
+    for batch_id in counts["batch_ids"]:
         recompute_batch_totals(ImportBatch.objects.get(id=batch_id))
 
 
@@ -484,49 +981,16 @@ def match_unmatched_import_rows_all_companies(
         if limit_per_company:
             qs = qs[:limit_per_company]
 
-        matched = skipped = errors = 0
-        touched_batches = set()
-
-        for row in qs.iterator(chunk_size=500):
-            try:
-                # 🔒 isolate each row
-                with transaction.atomic():
-                    result, trip = _match_row_to_trip(row)
-
-                    if result != "matched":
-                        skipped += 1
-                        continue
-
-                    row.matched_trip_id = trip.id
-                    row.status = ImportRow.STATUS_MATCHED
-                    row.error_message = ""  # ✅ NOT NULL SAFE
-                    row.save(
-                        update_fields=[
-                            "matched_trip_id",
-                            "status",
-                            "error_message",
-                        ]
-                    )
-
-                    matched += 1
-                    touched_batches.add(row.batch_id)
-
-            except Exception as exc:
-                row.status = ImportRow.STATUS_ERROR
-                row.error_message = str(exc)
-                row.save(update_fields=["status", "error_message"])
-
-                errors += 1
-                touched_batches.add(row.batch_id)
+        counts = match_import_rows(qs.iterator(chunk_size=MATCH_CHUNK_SIZE))
 
         print(
             f"[MATCHING] Company {company.id}: "
-            f"matched={matched}, skipped={skipped}, errors={errors}, "
-            f"days_back={days_back}"
+            f"matched={counts['matched']}, skipped={counts['unmatched']}, "
+            f"errors={counts['errors']}, days_back={days_back}"
         )
 
         # 🔁 recompute ONLY affected batches
-        for batch_id in touched_batches:
+        for batch_id in counts["batch_ids"]:
             recompute_batch_totals(
                 ImportBatch.objects.get(id=batch_id)
             )
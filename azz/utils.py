@@ -1,4 +1,9 @@
+import gzip
+import json
+
 import pandas as pd
+from django.core.files.base import ContentFile
+from django.core.files.storage import default_storage
 from django.db.models import Q
 from datetime import datetime, date
 
@@ -15,6 +20,82 @@ def json_safe(value):
     return value
 
 
+def _isoformat_date(value):
+    if isinstance(value, (pd.Timestamp, datetime, date)):
+        return value.isoformat()
+    return value
+
+
+def json_safe_frame(df):
+    """
+    json_safe applied column by column: object columns with native Python
+    values, missing values as None and dates as ISO strings.
+    """
+    frame = df.astype(object).where(df.notna(), None)
+
+    for column in frame.columns:
+        if df[column].dtype == object or df[column].dtype.kind == "M":
+            # dtype=object: inference would turn None back into NaN
+            frame[column] = pd.Series(
+                [_isoformat_date(value) for value in frame[column]],
+                index=frame.index,
+                dtype=object,
+            )
+
+    return frame
+
+
+def frame_column(frame, column):
+    """ frame[column], or a column of None when the file does not have it (like raw.get) """
+    if column in frame.columns:
+        return frame[column]
+    return pd.Series([None] * len(frame), index=frame.index, dtype=object)
+
+
+RAW_ROWS_STORAGE_DIR = "import_raw_rows"
+
+
+def raw_rows_storage_name(batch, chunk):
+    return f"{RAW_ROWS_STORAGE_DIR}/{batch.uf}/{chunk:06d}.jsonl.gz"
+
+
+def write_raw_rows(name, entries):
+    """
+    Store the source rows of a chunk's ImportRows as gzip JSON lines:
+    {"import_row_id": ..., "rows": [...]} per ImportRow.
+    A file left by an interrupted run of the same chunk is replaced.
+    """
+    content = gzip.compress(
+        "".join(
+            json.dumps({"import_row_id": import_row_id, "rows": rows}) + "\n"
+            for import_row_id, rows in entries
+        ).encode("utf-8")
+    )
+
+    if default_storage.exists(name):
+        default_storage.delete(name)
+
+    return default_storage.save(name, ContentFile(content))
+
+
+def aggregated_rows(import_row):
+    """
+    Source rows of an ImportRow, kept inline in raw_data or in the side
+    files written by write_raw_rows.
+    """
+    rows = list(import_row.raw_data.get("_aggregated_rows", []))
+
+    for name in import_row.raw_data.get("_aggregated_rows_files", []):
+        with default_storage.open(name, "rb") as f:
+            with gzip.open(f, "rt", encoding="utf-8") as lines:
+                for line in lines:
+                    entry = json.loads(line)
+                    if entry["import_row_id"] == import_row.id:
+                        rows.extend(entry["rows"])
+
+    return rows
+
+
 def resolve_country(code_or_name: str) -> Country:
     value = (code_or_name or "").strip().upper()
 
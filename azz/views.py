@@ -394,12 +394,18 @@ class TankRefillDetailView(RetrieveUpdateDestroyAPIView):
                 .get(id=instance.tank_id)
             )
 
+            instance = TankRefill.objects.select_for_update().get(pk=instance.pk)
+
             # simulate new values
             old_qty = instance.actual_quantity_l
             new_qty = serializer.validated_data.get(
                 "actual_quantity_l", old_qty
             )
 
+            if new_qty < instance.consumed_l():
+                raise ValidationError(
+                    "Cannot reduce refill: fuel already used")
+
             current_stock = tank.get_current_fuel_stock(using_actual=True)
             delta = new_qty - old_qty
 
@@ -410,15 +416,16 @@ class TankRefillDetailView(RetrieveUpdateDestroyAPIView):
 
     def perform_destroy(self, instance):
         with transaction.atomic():
-            tank = (
+            (
                 FuelTank.objects
                 .select_for_update()
                 .get(id=instance.tank_id)
             )
+            # fuelings lock the refills they consume from
+            instance = TankRefill.objects.select_for_update().get(pk=instance.pk)
 
-            current_stock = tank.get_current_fuel_stock(using_actual=True)
-
-            if instance.actual_quantity_l > current_stock:
+            # the refill's consumptions would be cascade-deleted with it
+            if instance.refill_consumptions.exists():
                 raise ValidationError(
                     "Cannot delete refill: fuel already used")
 
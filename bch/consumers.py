@@ -6,11 +6,13 @@ from bch.mixins.calendar import CalendarEventMixin
 from bch.mixins.contact import ContactMixin
 from bch.mixins.issue_document import IssueDocumentMixin
 from bch.mixins.item_for_item_cost import ItemForItemCostMixin
+from bch.mixins.fleet_position import FleetPositionMixin
 from bch.mixins.fuel_tank import FuelTankMixin
 from bch.mixins.load import LoadMixin
 from bch.mixins.trip import TripMixin
 from bch.mixins.trip_stop import TripStopMixin
 from bch.mixins.trip_stop_message import TripStopMessageMixin
+from bch.mixins.wms_billing_run import WmsBillingRunMixin
 
 
 class AppConsumer(
@@ -23,6 +25,8 @@ class AppConsumer(
     CalendarEventMixin,
     TripStopMixin,
     TripStopMessageMixin,
+    WmsBillingRunMixin,
+    FleetPositionMixin,
     GenericAsyncAPIConsumer,
 ):
     permission_classes = [IsAuthenticated]
@@ -0,0 +1,24 @@
+import logging
+from djangochannelsrestframework.decorators import action
+
+from bch.utils import get_user_company_async
+
+logger = logging.getLogger(__name__)
+
+
+class FleetPositionMixin:
+
+    @action(detail=False)
+    async def subscribe_fleet_positions(self, **kwargs):
+        logger.info("WS Subscribed to fleet positions")
+
+        company = await get_user_company_async(self.scope["user"])
+        if company is None:
+            return
+
+        # own group: the other company_{id} subscriptions do not get the positions
+        await self.channel_layer.group_add(f"fleet_{company.id}", self.channel_name)
+
+    async def forward_fleet_positions(self, event):
+        # {"type": "fleet_positions", "data": [{driver_id, lat, lng, speed, heading, updated_at}]}
+        await self.send_json(event["payload"])
@@ -0,0 +1,20 @@
+import logging
+from djangochannelsrestframework.decorators import action
+
+from bch.utils import get_user_company_async
+
+logger = logging.getLogger(__name__)
+
+
+class WmsBillingRunMixin:
+
+    @action(detail=False)
+    async def subscribe_wms_billing_runs(self, **kwargs):
+        logger.info("WS Subscribed to WMS billing run progress")
+
+        company = await get_user_company_async(self.scope["user"])
+
+        await self.channel_layer.group_add(f"company_{company.id}", self.channel_name)
+
+    async def forward_wms_billing_run(self, event):
+        await self.send_json(event["payload"])
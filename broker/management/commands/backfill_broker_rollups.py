@@ -0,0 +1,29 @@
+from django.core.management.base import BaseCommand, CommandError
+from django.utils.dateparse import parse_date
+
+from broker.rollups import backfill_broker_rollups
+
+
+class Command(BaseCommand):
+    help = "Rebuild the broker daily rollups from the jobs and job lines"
+
+    def add_arguments(self, parser):
+        parser.add_argument("--company", type=int, action="append", help="Company id (repeatable)")
+        parser.add_argument("--date-from", type=str, help="YYYY-MM-DD")
+        parser.add_argument("--date-to", type=str, help="YYYY-MM-DD")
+
+    def handle(self, *args, **options):
+        dates = {}
+        for option in ("date_from", "date_to"):
+            value = options[option]
+            dates[option] = parse_date(value) if value else None
+
+            if value and dates[option] is None:
+                raise CommandError(f"Invalid {option}: {value}")
+
+        result = backfill_broker_rollups(options["company"], **dates)
+
+        for company_id, rows in result.items():
+            self.stdout.write(f"Company {company_id}: {rows} rollup rows")
+
+        self.stdout.write(self.style.SUCCESS("Broker rollups rebuilt"))
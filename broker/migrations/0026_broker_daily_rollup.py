@@ -0,0 +1,107 @@
+# Generated by Django 5.2.10 on 2026-10-17 12:50
+
+import django.db.models.deletion
+from django.conf import settings
+from django.db import migrations, models
+from django.db.models import Count, DecimalField, ExpressionWrapper, F, Sum
+from django.db.models.functions import TruncDate
+
+BATCH_SIZE = 1000
+
+
+def backfill_daily_rollups(apps, schema_editor):
+    """
+    Snapshot of broker.rollups.backfill_broker_rollups: daily line totals and
+    job counts per company, point, customer, employee (and service type).
+    """
+    BrokerDailyRollup = apps.get_model('broker', 'BrokerDailyRollup')
+    Job = apps.get_model('broker', 'Job')
+    JobLine = apps.get_model('broker', 'JobLine')
+
+    company_ids = Job.objects.values_list('company_id', flat=True).distinct().order_by('company_id')
+
+    for company_id in company_ids:
+        line_rows = (
+            JobLine.objects
+            .filter(job__company_id=company_id)
+            .annotate(day=TruncDate('job__created_at'))
+            .values('day', 'job__point_id', 'job__customer_id', 'job__assigned_to_id', 'service_type_id')
+            .annotate(
+                revenue=Sum(ExpressionWrapper(
+                    F('quantity') * F('unit_price_net'),
+                    output_field=DecimalField(max_digits=18, decimal_places=2),
+                )),
+                lines=Count('id'),
+                unit_price_total=Sum('unit_price_net'),
+            )
+            .order_by()
+        )
+        job_rows = (
+            Job.objects
+            .filter(company_id=company_id)
+            .annotate(day=TruncDate('created_at'))
+            .values('day', 'point_id', 'customer_id', 'assigned_to_id')
+            .annotate(jobs=Count('id'))
+            .order_by()
+        )
+
+        rollups = [
+            BrokerDailyRollup(
+                company_id=company_id,
+                date=row['day'],
+                point_id=row['job__point_id'],
+                customer_id=row['job__customer_id'],
+                employee_id=row['job__assigned_to_id'],
+                service_type_id=row['service_type_id'],
+                revenue=row['revenue'],
+                lines=row['lines'],
+                unit_price_total=row['unit_price_total'],
+            )
+            for row in line_rows
+        ]
+        rollups += [
+            BrokerDailyRollup(
+                company_id=company_id,
+                date=row['day'],
+                point_id=row['point_id'],
+                customer_id=row['customer_id'],
+                employee_id=row['assigned_to_id'],
+                jobs=row['jobs'],
+            )
+            for row in job_rows
+        ]
+
+        BrokerDailyRollup.objects.bulk_create(rollups, batch_size=BATCH_SIZE)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('app', '0039_companysettings_broker_invoice_start_number'),
+        ('att', '0074_remove_contact_invoice_reference_date_and_more'),
+        ('broker', '0025_alter_job_status'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='BrokerDailyRollup',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('date', models.DateField()),
+                ('revenue', models.DecimalField(decimal_places=2, default=0, max_digits=18)),
+                ('jobs', models.PositiveIntegerField(default=0)),
+                ('lines', models.PositiveIntegerField(default=0)),
+                ('unit_price_total', models.DecimalField(decimal_places=2, default=0, max_digits=18)),
+                ('company', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='company_broker_daily_rollups', to='app.company')),
+                ('customer', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='customer_broker_daily_rollups', to='att.contact')),
+                ('employee', models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.SET_NULL, related_name='employee_broker_daily_rollups', to=settings.AUTH_USER_MODEL)),
+                ('point', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='point_broker_daily_rollups', to='broker.pointofservice')),
+                ('service_type', models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.CASCADE, related_name='service_type_broker_daily_rollups', to='broker.servicetype')),
+            ],
+            options={
+                'indexes': [models.Index(fields=['company', 'date'], name='broker_brok_company_5d0101_idx')],
+            },
+        ),
+        migrations.RunPython(backfill_daily_rollups, migrations.RunPython.noop),
+    ]
@@ -472,6 +472,38 @@ class JobLine(models.Model):
         return self.total_net + self.total_vat
     
 
+class BrokerDailyRollup(models.Model):
+    """
+    Broker report totals per company, day (Job.created_at, local date),
+    point, customer, employee and service type; maintained by broker.rollups.
+    Rows with a service type hold the job lines' totals; rows without one
+    hold the job count.
+    """
+    company = models.ForeignKey(
+        "app.Company", on_delete=models.CASCADE, related_name="company_broker_daily_rollups")
+    date = models.DateField()
+
+    point = models.ForeignKey(
+        PointOfService, on_delete=models.CASCADE, related_name="point_broker_daily_rollups")
+    customer = models.ForeignKey(
+        "att.Contact", on_delete=models.CASCADE, related_name="customer_broker_daily_rollups")
+    employee = models.ForeignKey(
+        User, on_delete=models.SET_NULL, null=True, blank=True, related_name="employee_broker_daily_rollups")
+    service_type = models.ForeignKey(
+        ServiceType, on_delete=models.CASCADE, null=True, blank=True, related_name="service_type_broker_daily_rollups")
+
+    revenue = models.DecimalField(max_digits=18, decimal_places=2, default=0)
+    jobs = models.PositiveIntegerField(default=0)
+    lines = models.PositiveIntegerField(default=0)
+    # sum of the lines' unit_price_net: average = unit_price_total / lines
+    unit_price_total = models.DecimalField(max_digits=18, decimal_places=2, default=0)
+
+    class Meta:
+        indexes = [
+            models.Index(fields=["company", "date"]),
+        ]
+
+
 ###### START BROKER COMPENSATION ######
 class BrokerBaseSalary(models.Model):
     uf = models.CharField(max_length=36, default=hex_uuid, unique=True, db_index=True)
@@ -0,0 +1,119 @@
+from django.db import connection, transaction
+from django.db.models import Count, DecimalField, ExpressionWrapper, F, Sum
+from django.db.models.functions import TruncDate
+
+from broker.models import BrokerDailyRollup, Job, JobLine
+
+# BrokerDailyRollup: the broker reports read these daily totals instead of
+# aggregating JobLine / Job on every request.
+#
+# broker.signals refreshes the (company, day) of a job when the job or one of
+# its lines is saved or deleted; writes that bypass signals (bulk_create,
+# queryset.update()) are caught up with the backfill_broker_rollups command.
+
+ROLLUP_BATCH_SIZE = 1000
+
+
+def _line_rows(company_id, date_from, date_to):
+    lines = JobLine.objects.filter(job__company_id=company_id)
+    if date_from:
+        lines = lines.filter(job__created_at__date__gte=date_from)
+    if date_to:
+        lines = lines.filter(job__created_at__date__lte=date_to)
+
+    return (
+        lines
+        .annotate(day=TruncDate('job__created_at'))
+        .values('day', 'job__point_id', 'job__customer_id', 'job__assigned_to_id', 'service_type_id')
+        .annotate(
+            revenue=Sum(ExpressionWrapper(
+                F('quantity') * F('unit_price_net'),
+                output_field=DecimalField(max_digits=18, decimal_places=2),
+            )),
+            lines=Count('id'),
+            unit_price_total=Sum('unit_price_net'),
+        )
+        .order_by()
+    )
+
+
+def _job_rows(company_id, date_from, date_to):
+    jobs = Job.objects.filter(company_id=company_id)
+    if date_from:
+        jobs = jobs.filter(created_at__date__gte=date_from)
+    if date_to:
+        jobs = jobs.filter(created_at__date__lte=date_to)
+
+    return (
+        jobs
+        .annotate(day=TruncDate('created_at'))
+        .values('day', 'point_id', 'customer_id', 'assigned_to_id')
+        .annotate(jobs=Count('id'))
+        .order_by()
+    )
+
+
+def _lock_company_rollups(company_id):
+    """
+    Serialize the refreshes of a company until the transaction ends: two
+    concurrent delete + insert of the same days would both insert their rows.
+    """
+    with connection.cursor() as cursor:
+        cursor.execute('SELECT pg_advisory_xact_lock(hashtext(%s))', [f'broker_rollups:{company_id}'])
+
+
+def refresh_broker_rollups(company_id, date_from=None, date_to=None):
+    """
+    Rebuild the rollups of a company for the days in [date_from, date_to]
+    (open-ended when None).
+    """
+    stale = BrokerDailyRollup.objects.filter(company_id=company_id)
+    if date_from:
+        stale = stale.filter(date__gte=date_from)
+    if date_to:
+        stale = stale.filter(date__lte=date_to)
+
+    with transaction.atomic():
+        # totals read after the lock include the refresh that held it
+        _lock_company_rollups(company_id)
+
+        rollups = [
+            BrokerDailyRollup(
+                company_id=company_id,
+                date=row['day'],
+                point_id=row['job__point_id'],
+                customer_id=row['job__customer_id'],
+                employee_id=row['job__assigned_to_id'],
+                service_type_id=row['service_type_id'],
+                revenue=row['revenue'],
+                lines=row['lines'],
+                unit_price_total=row['unit_price_total'],
+            )
+            for row in _line_rows(company_id, date_from, date_to)
+        ]
+        rollups += [
+            BrokerDailyRollup(
+                company_id=company_id,
+                date=row['day'],
+                point_id=row['point_id'],
+                customer_id=row['customer_id'],
+                employee_id=row['assigned_to_id'],
+                jobs=row['jobs'],
+            )
+            for row in _job_rows(company_id, date_from, date_to)
+        ]
+
+        stale.delete()
+        BrokerDailyRollup.objects.bulk_create(rollups, batch_size=ROLLUP_BATCH_SIZE)
+
+    return len(rollups)
+
+
+def backfill_broker_rollups(company_ids=None, date_from=None, date_to=None):
+    if company_ids is None:
+        company_ids = Job.objects.values_list('company_id', flat=True).distinct().order_by('company_id')
+
+    return {
+        company_id: refresh_broker_rollups(company_id, date_from, date_to)
+        for company_id in company_ids
+    }
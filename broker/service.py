@@ -1,71 +1,85 @@
+from collections import defaultdict
 from decimal import Decimal
-from django.db.models import Q, Case, When, Value, IntegerField
+from django.db.models import Q
 
 from broker.models import BrokerCommission, BrokerCommissionType
 
 
-def resolve_commission(user, company, job_line, job_date):
+def commission_amount(rule_type, rule_value, total_net, vat_percent):
+    if rule_type == BrokerCommissionType.INCL_VAT:
+        revenue = total_net
+    else:
+        vat_multiplier = Decimal("1") + (vat_percent / Decimal("100"))
+        revenue = total_net / vat_multiplier
+
+    return (revenue * rule_value / Decimal("100")).quantize(Decimal("0.01"))
+
+
+class CommissionResolver:
     '''
+    Commission rules of a broker valid in [date_from, date_to], loaded with
+    one query and indexed by (customer_id, service_type_id); newest rule
+    first within each key.
+
     Priority:
         1. customer + service_type
         2. customer only
         3. service_type only
         4. global
+    then latest valid_from, then latest id.
     '''
-    rule = (
-        BrokerCommission.objects
-        .filter(
-            user=user,
-            company=company,
-            valid_from__lte=job_date,
-        )
-        .filter(
-            Q(valid_to__isnull=True) | Q(valid_to__gte=job_date)
-        )
-        .filter(
-            Q(service_type=job_line.service_type) | Q(service_type__isnull=True)
-        )
-        .filter(
-            Q(customer=job_line.job.customer) | Q(customer__isnull=True)
-        )
-        .annotate(
-            priority=Case(
-                When(
-                    customer=job_line.job.customer,
-                    service_type=job_line.service_type,
-                    then=Value(4),
-                ),
-                When(
-                    customer=job_line.job.customer,
-                    service_type__isnull=True,
-                    then=Value(3),
-                ),
-                When(
-                    customer__isnull=True,
-                    service_type=job_line.service_type,
-                    then=Value(2),
-                ),
-                When(
-                    customer__isnull=True,
-                    service_type__isnull=True,
-                    then=Value(1),
-                ),
-                default=Value(0),
-                output_field=IntegerField(),
+
+    def __init__(self, user, company, date_from, date_to):
+        rules = (
+            BrokerCommission.objects
+            .filter(
+                user=user,
+                company=company,
+                valid_from__lte=date_to,
+            )
+            .filter(
+                Q(valid_to__isnull=True) | Q(valid_to__gte=date_from)
             )
+            .order_by("-valid_from", "-id")
+            .values("customer_id", "service_type_id", "type", "value", "valid_from", "valid_to")
         )
-        .order_by("-priority", "-valid_from", "-id")
-        .first()
-    )
 
-    if not rule:
-        return Decimal("0")
+        self.rules = defaultdict(list)
+        for rule in rules:
+            self.rules[(rule["customer_id"], rule["service_type_id"])].append(rule)
 
-    if rule.type == BrokerCommissionType.INCL_VAT:
-        revenue = job_line.total_net
-    else:
-        vat_multiplier = Decimal("1") + (job_line.vat_percent / Decimal("100"))
-        revenue = job_line.total_net / vat_multiplier
+    def rule_for(self, customer_id, service_type_id, job_date):
+        for key in (
+            (customer_id, service_type_id),
+            (customer_id, None),
+            (None, service_type_id),
+            (None, None),
+        ):
+            for rule in self.rules.get(key, ()):
+                if rule["valid_from"] <= job_date and (rule["valid_to"] is None or rule["valid_to"] >= job_date):
+                    return rule
+
+        return None
+
+    def commission(self, customer_id, service_type_id, job_date, total_net, vat_percent):
+        rule = self.rule_for(customer_id, service_type_id, job_date)
+
+        if not rule:
+            return Decimal("0")
+
+        return commission_amount(rule["type"], rule["value"], total_net, vat_percent)
 
-    commission = (revenue * rule.value / Decimal("100")).quantize(Decimal("0.01"))
-    return commission
\ No newline at end of file
+
+def resolve_commission(user, company, job_line, job_date):
+    '''
+    Commission of one job line (see CommissionResolver for the priority).
+    '''
+    resolver = CommissionResolver(user, company, job_date, job_date)
+
+    return resolver.commission(
+        job_line.job.customer_id,
+        job_line.service_type_id,
+        job_date,
+        job_line.total_net,
+        job_line.vat_percent,
+    )
@@ -0,0 +1,85 @@
+import threading
+
+from django.db import transaction
+from django.db.models.signals import post_delete, post_init, post_save
+from django.dispatch import receiver
+from django.utils import timezone
+
+from broker.models import Job, JobLine
+from broker.rollups import refresh_broker_rollups
+
+import logging
+logger = logging.getLogger(__name__)
+
+
+### BROKER DAILY ROLLUPS (broker.rollups) ###
+
+# Job fields the rollup is grouped by, as loaded, to skip saves that do not change them
+TRACKED_ROLLUP_FIELDS = ('point_id', 'customer_id', 'assigned_to_id')
+
+
+# (company, day) pairs changed by the current transaction of this thread
+_pending = threading.local()
+
+
+def _pending_days():
+    if not hasattr(_pending, 'days'):
+        _pending.days = set()
+    return _pending.days
+
+
+def _refresh_pending_days():
+    """
+    on_commit callback: refresh each (company, day) changed in the transaction
+    once, however many jobs / lines were saved. The first callback of a commit
+    takes the whole set, the others find it empty. Days left by a rolled back
+    transaction are refreshed with the next commit, which is harmless.
+    """
+    days = _pending_days()
+    _pending.days = set()
+
+    for company_id, day in sorted(days):
+        refresh_broker_rollups(company_id, day, day)
+
+
+def _refresh_on_commit(company_id, created_at):
+    if not company_id or not created_at:
+        return
+
+    _pending_days().add((company_id, timezone.localdate(created_at)))
+    transaction.on_commit(_refresh_pending_days)
+
+
+def remember_rollup_fields(sender, instance, **kwargs):
+    instance._rollup_initial = tuple(instance.__dict__.get(field) for field in TRACKED_ROLLUP_FIELDS)
+
+
+@receiver(post_save, sender=Job)
+def refresh_broker_rollups_on_job_save(sender, instance, created, raw=False, **kwargs):
+    if raw:
+        return
+
+    current = tuple(getattr(instance, field) for field in TRACKED_ROLLUP_FIELDS)
+    if created or getattr(instance, '_rollup_initial', None) != current:
+        _refresh_on_commit(instance.company_id, instance.created_at)
+        instance._rollup_initial = current
+
+
+@receiver(post_delete, sender=Job)
+def refresh_broker_rollups_on_job_delete(sender, instance, **kwargs):
+    _refresh_on_commit(instance.company_id, instance.created_at)
+
+
+def refresh_broker_rollups_on_line_change(sender, instance, raw=False, **kwargs):
+    if raw:
+        return
+
+    # a line deleted with its job: the job's post_delete refreshes the day
+    job = Job.objects.filter(pk=instance.job_id).values('company_id', 'created_at').first()
+    if job:
+        _refresh_on_commit(job['company_id'], job['created_at'])
+
+
+post_init.connect(remember_rollup_fields, sender=Job)
+post_save.connect(refresh_broker_rollups_on_line_change, sender=JobLine)
+post_delete.connect(refresh_broker_rollups_on_line_change, sender=JobLine)
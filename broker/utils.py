@@ -3,78 +3,97 @@ from django.db import transaction
 from django.core.exceptions import ValidationError
 
 from broker.models import BrokerBaseSalary, BrokerInvoice, JobLine
-from broker.service import resolve_commission
-
-
-def build_broker_settlement_report(company, broker, start, end):        
-
-        job_lines = (
-            JobLine.objects
-            .select_related(
-                "job",
-                "job__customer",
-                "service_type"
-            )
-            .filter(
-                job__company=company,
-                job__assigned_to=broker,
-                job__created_at__date__range=[start, end]
-            )
+from broker.service import CommissionResolver
+
+
+def build_broker_settlement_report(company, broker, start, end):
+    job_lines = list(
+        JobLine.objects
+        .filter(
+            job__company=company,
+            job__assigned_to=broker,
+            job__created_at__date__range=[start, end]
+        )
+        .values(
+            "uf",
+            "quantity",
+            "unit_price_net",
+            "vat_percent",
+            "service_type_id",
+            "job__uf",
+            "job__created_at",
+            "job__customer_id",
+            "job__customer__company_name",
+            "service_type__name",
+        )
+    )
+
+    for line in job_lines:
+        line["date"] = line["job__created_at"].date()
+
+    resolver = None
+    if job_lines:
+        # rules of the window actually covered by the lines
+        resolver = CommissionResolver(
+            broker,
+            company,
+            min(line["date"] for line in job_lines),
+            max(line["date"] for line in job_lines),
         )
 
-        rows = []
-        total_revenue = 0
-        total_commission = 0
-
-        for line in job_lines:
-
-            revenue = line.total_net
-
-            commission = resolve_commission(
-                broker,
-                company,
-                line,
-                line.job.created_at.date()
-            )
-
-            total_revenue += revenue
-            total_commission += commission
-
-            rows.append({
-                "job_uf": line.job.uf,
-                "uf": line.uf,                
-                "date": line.job.created_at.date(),
-                "customer": line.job.customer.company_name,
-                "service": line.service_type.name,
-                "quantity": line.quantity,
-                "revenue": revenue,
-                "commission": commission
-            })
-
-        salary = (
-            BrokerBaseSalary.objects
-            .filter(
-                user=broker,
-                company=company,
-                valid_from__lte=end
-            )
-            .order_by("-valid_from")
-            .first()
+    rows = []
+    total_revenue = 0
+    total_commission = 0
+
+    for line in job_lines:
+        revenue = line["quantity"] * line["unit_price_net"]
+
+        commission = resolver.commission(
+            line["job__customer_id"],
+            line["service_type_id"],
+            line["date"],
+            revenue,
+            line["vat_percent"],
+        )
+
+        total_revenue += revenue
+        total_commission += commission
+
+        rows.append({
+            "job_uf": line["job__uf"],
+            "uf": line["uf"],
+            "date": line["date"],
+            "customer": line["job__customer__company_name"],
+            "service": line["service_type__name"],
+            "quantity": line["quantity"],
+            "revenue": revenue,
+            "commission": commission
+        })
+
+    salary = (
+        BrokerBaseSalary.objects
+        .filter(
+            user=broker,
+            company=company,
+            valid_from__lte=end
         )
+        .order_by("-valid_from")
+        .first()
+    )
 
-        base_salary = salary.amount if salary else 0
+    base_salary = salary.amount if salary else 0
 
-        report = {
-            "summary": {
-                "base_salary": base_salary,
-                "commission_total": total_commission,
-                "total_income": base_salary + total_commission,
-                "revenue_total": total_revenue
-            },
-            "rows": rows
-        }
+    report = {
+        "summary": {
+            "base_salary": base_salary,
+            "commission_total": total_commission,
+            "total_income": base_salary + total_commission,
+            "revenue_total": total_revenue
+        },
+        "rows": rows
+    }
 
-        return report
+    return report
 
 
 NUMBERING_RE = re.compile(r"^(?P<prefix>.*?)(?P<number>\d+)$")
@@ -3,8 +3,7 @@ from decimal import Decimal
 from datetime import timedelta, datetime
 from django.utils import timezone
 from django.contrib.auth import get_user_model
-from django.db.models import Sum, F, Count, DecimalField, ExpressionWrapper, Q, Value, Avg
-from django.db.models.functions import Coalesce
+from django.db.models import Sum, Count, Q
 from django.shortcuts import get_object_or_404
 from datetime import date
 from dateutil.relativedelta import relativedelta
@@ -28,7 +27,7 @@ from abb.utils import get_user_company
 from att.models import Contact
 from broker.helpers import get_user_role_in_point
 from broker.mixins import CompanyScopedMixin, JobVisibilityQuerysetMixin
-from broker.models import BrokerBaseSalary, BrokerCommissionType, BrokerSettlement, CustomerServicePrice, CustomerServiceTierPrice, Job, JobLine, PointMembership, PointOfService, Role, ServiceType, ServiceTypeTier
+from broker.models import BrokerBaseSalary, BrokerDailyRollup, BrokerCommissionType, BrokerSettlement, CustomerServicePrice, CustomerServiceTierPrice, Job, PointMembership, PointOfService, Role, ServiceType, ServiceTypeTier
 
 from broker.permissions import BrokerDeletePermission, IsAdminOrManager, JobAccessPermission
 from broker.serializers import (BrokerEmployeePerformanceSerializer, BrokerInvoiceCreateSerializer, BrokerInvoiceReadSerializer, BrokerStaffCompensationSerializer, BrokerStaffDetailsSerializer, 
@@ -494,6 +493,18 @@ class CustomerServicePriceListCreateView(CompanyScopedMixin, ListCreateAPIView):
 
 
 ###### START BROKER REPORTS ######
+def _period_totals(periods, today, **fields):
+    """
+    Sum(field) of the rollup rows of each period (days back from today), one
+    filtered aggregate per period and field: {f"{name}_{days}": Sum(...)}.
+    """
+    return {
+        f"{name}_{days}": Sum(field, filter=Q(date__gte=today - timedelta(days=days)))
+        for days in periods
+        for name, field in fields.items()
+    }
+
+
 class BrokerReportsOverviewAPIView(APIView):
     permission_classes = [IsAuthenticated]
 
@@ -503,15 +514,16 @@ class BrokerReportsOverviewAPIView(APIView):
         company = get_user_company(request.user)
         today = timezone.now().date()
 
-        line_total = ExpressionWrapper(
-            F("quantity") * F("unit_price_net"),
-            output_field=DecimalField(max_digits=18, decimal_places=2),
-        )
-
-        revenue_annotation = Coalesce(
-            Sum(line_total),
-            Value(0),
-            output_field=DecimalField(max_digits=18, decimal_places=2),
+        # one query: totals per (point, customer) and period, from the daily rollups
+        rows = list(
+            BrokerDailyRollup.objects
+            .filter(
+                company=company,
+                date__gte=today - timedelta(days=max(self.PERIODS)),
+            )
+            .values("point", "point__name", "customer", "customer__company_name")
+            .annotate(**_period_totals(self.PERIODS, today, revenue="revenue", lines="lines", jobs="jobs"))
+            .order_by()
         )
 
         result = {
@@ -521,84 +533,54 @@ class BrokerReportsOverviewAPIView(APIView):
         }
 
         for days in self.PERIODS:
-            start_date = today - timedelta(days=days)
-
-            # -------------------------------
-            # TOP CUSTOMERS
-            # -------------------------------
-            top_customers_qs = (
-                JobLine.objects
-                .filter(
-                    job__company=company,
-                    job__created_at__date__gte=start_date,
-                )
-                .values(
-                    "job__customer",
-                    "job__customer__company_name",
-                )
-                .annotate(total_revenue=revenue_annotation)
-                .order_by("-total_revenue")[:10]
-            )
-
-            result["top_customers"][days] = [
-                {
-                    "customer_id": item["job__customer"],
-                    "name": item["job__customer__company_name"],
-                    "revenue": item["total_revenue"],
-                }
-                for item in top_customers_qs
-            ]
-
-            # -------------------------------
-            # REVENUE BY POINT
-            # -------------------------------
-            revenue_by_point_qs = (
-                JobLine.objects
-                .filter(
-                    job__company=company,
-                    job__created_at__date__gte=start_date,
-                )
-                .values(
-                    "job__point",
-                    "job__point__name",
-                )
-                .annotate(total_revenue=revenue_annotation)
-                .order_by("-total_revenue")
-            )
+            customers = {}
+            points = {}
+
+            for row in rows:
+                revenue = row[f"revenue_{days}"] or 0
+                lines = row[f"lines_{days}"] or 0
+                jobs = row[f"jobs_{days}"] or 0
+
+                point = points.setdefault(row["point"], {
+                    "point_id": row["point"],
+                    "point_name": row["point__name"],
+                    "revenue": 0,
+                    "lines": 0,
+                    "total_jobs": 0,
+                })
+                point["revenue"] += revenue
+                point["lines"] += lines
+                point["total_jobs"] += jobs
+
+                if lines:
+                    customer = customers.setdefault(row["customer"], {
+                        "customer_id": row["customer"],
+                        "name": row["customer__company_name"],
+                        "revenue": 0,
+                    })
+                    customer["revenue"] += revenue
+
+            result["top_customers"][days] = sorted(
+                customers.values(), key=lambda item: item["revenue"], reverse=True)[:10]
 
             result["revenue_by_point"][days] = [
                 {
-                    "point_id": item["job__point"],
-                    "point_name": item["job__point__name"],
-                    "revenue": item["total_revenue"],
+                    "point_id": point["point_id"],
+                    "point_name": point["point_name"],
+                    "revenue": point["revenue"],
                 }
-                for item in revenue_by_point_qs
+                for point in sorted(points.values(), key=lambda item: item["revenue"], reverse=True)
+                if point["lines"]
             ]
 
-            # -------------------------------
-            # JOBS BY POINT
-            # -------------------------------
-            jobs_by_point_qs = (
-                Job.objects
-                .filter(
-                    company=company,
-                    created_at__date__gte=start_date,
-                )
-                .values(
-                    "point",
-                    "point__name",
-                )
-                .annotate(total_jobs=Count("id"))
-                .order_by("-total_jobs")
-            )
-
             result["jobs_by_point"][days] = [
                 {
-                    "point_id": item["point"],
-                    "point_name": item["point__name"],
-                    "total_jobs": item["total_jobs"],
+                    "point_id": point["point_id"],
+                    "point_name": point["point_name"],
+                    "total_jobs": point["total_jobs"],
                 }
-                for item in jobs_by_point_qs
+                for point in sorted(points.values(), key=lambda item: item["total_jobs"], reverse=True)
+                if point["total_jobs"]
             ]
 
         return Response(result)
@@ -607,58 +589,39 @@ class BrokerReportsOverviewAPIView(APIView):
 class BrokerEmployeePerformanceAPIView(APIView):
     permission_classes = [IsAuthenticated]
 
-    def get_employee_stats(self, company, days):
-        start_date = timezone.now() - timedelta(days=days)
+    PERIODS = [30, 90, 180]
 
-        line_total = ExpressionWrapper(
-            F("quantity") * F("unit_price_net"),
-            output_field=DecimalField(max_digits=18, decimal_places=2),
-        )
+    def get(self, request):
 
-        revenue_annotation = Coalesce(
-            Sum(line_total),
-            Value(0),
-            output_field=DecimalField(max_digits=18, decimal_places=2),
-        )
+        company = get_user_company(request.user)
+        today = timezone.now().date()
 
-        qs = (
-            JobLine.objects
+        rows = list(
+            BrokerDailyRollup.objects
             .filter(
-                job__company=company,
-                job__created_at__gte=start_date,
-                job__assigned_to__isnull=False,
+                company=company,
+                employee__isnull=False,
+                date__gte=today - timedelta(days=max(self.PERIODS)),
             )
-            .values(
-                "job__assigned_to",
-                "job__assigned_to__first_name",
-                "job__assigned_to__last_name",
-            )
-            .annotate(
-                revenue=revenue_annotation,
-                jobs=Count("job", distinct=True),
-            )
-            .order_by("-revenue")
+            .values("employee", "employee__first_name", "employee__last_name")
+            .annotate(**_period_totals(self.PERIODS, today, revenue="revenue", jobs="jobs"))
+            .order_by()
         )
 
-        return [
-            {
-                "employee_id": row["job__assigned_to"],
-                "name": f"{row['job__assigned_to__first_name']} {row['job__assigned_to__last_name']}",
-                "jobs": row["jobs"],
-                "revenue": row["revenue"],
-            }
-            for row in qs
-        ]
-
-    def get(self, request):
+        data = {}
 
-        company = get_user_company(request.user) 
-
-        data = {
-            "days_30": self.get_employee_stats(company, 30),
-            "days_90": self.get_employee_stats(company, 90),
-            "days_180": self.get_employee_stats(company, 180),
-        }
+        for days in self.PERIODS:
+            stats = [
+                {
+                    "employee_id": row["employee"],
+                    "name": f"{row['employee__first_name']} {row['employee__last_name']}",
+                    "jobs": row[f"jobs_{days}"] or 0,
+                    "revenue": row[f"revenue_{days}"] or 0,
+                }
+                for row in rows
+                if row[f"jobs_{days}"]
+            ]
+            data[f"days_{days}"] = sorted(stats, key=lambda item: item["revenue"], reverse=True)
 
         serializer = BrokerEmployeePerformanceSerializer(data)
         return Response(serializer.data)
@@ -674,14 +637,18 @@ class BrokerServicePriceTrendsAPIView(APIView):
         start = (end - relativedelta(months=5))  # last 6 months including current month start
 
         qs = (
-            JobLine.objects
+            BrokerDailyRollup.objects
             .filter(
-                job__company=company,
-                job__created_at__date__gte=start,
+                company=company,
+                date__gte=start,
+                service_type__isnull=False,
             )
-            .annotate(month=TruncMonth("job__created_at"))
+            .annotate(month=TruncMonth("date"))
             .values("month", "service_type_id", "service_type__name")
-            .annotate(avg_price=Avg("unit_price_net"))
+            .annotate(
+                unit_price_total=Sum("unit_price_total"),
+                lines=Sum("lines"),
+            )
             .order_by("month")
         )
 
@@ -698,7 +665,7 @@ class BrokerServicePriceTrendsAPIView(APIView):
         # series map
         series_map = {}  # (service_type_id) -> {name, data[6]}
         for row in qs:
-            month_key = row["month"].date().replace(day=1).strftime("%Y-%m")
+            month_key = row["month"].strftime("%Y-%m")
             idx = month_index.get(month_key)
             if idx is None:
                 continue
@@ -711,7 +678,8 @@ class BrokerServicePriceTrendsAPIView(APIView):
                     "data": [None] * 6,
                 }
 
-            series_map[st_id]["data"][idx] = float(row["avg_price"] or 0)
+            avg_price = row["unit_price_total"] / row["lines"] if row["lines"] else 0
+            series_map[st_id]["data"][idx] = float(avg_price)
 
         return Response({
             "months": months,
@@ -30,6 +30,7 @@ from abb.permissions import AssignedUserManagerOrReadOnlyIfLocked, AssignedUserO
 from abb.utils import get_user_company, is_valid_queryparam
 from app.utils import is_user_member_group
 from axx.models import Ctr, Exp, Inv, Load, LoadInv, Tor
+from axx.search import normalize_search_text
 from axx.service import LoadDocumentService, issue_invoice
 from ayy.models import CMR, Comment, Entry, ImageUpload, ItemInv
 
@@ -56,7 +57,8 @@ class LoadListView(ListAPIView):
 
         try:
             user_company = get_user_company(self.request.user)
-            queryset = Load.objects.filter(company__id=user_company.id)
+            queryset = Load.objects.filter(
+                company__id=user_company.id).defer('search_document')
 
             queryset = queryset.select_related(
                 'assigned_user',
@@ -137,29 +139,9 @@ class LoadListView(ListAPIView):
 
             if text_query is not None:
                 # print('2020', text_query)
+                # same fields as before, denormalized into Load.search_document (axx.search)
                 queryset = queryset.filter(
-                    Q(sn__icontains=text_query) |
-                    Q(hb__icontains=text_query) |
-                    Q(mb__icontains=text_query) |
-                    Q(booking_number__icontains=text_query) |
-                    Q(customer_ref__icontains=text_query) |
-                    Q(customer_notes__icontains=text_query) |
-                    Q(load_address__icontains=text_query) |
-                    Q(unload_address__icontains=text_query) |
-                    Q(trip__rn__icontains=text_query) |
-                    Q(bill_to__company_name__icontains=text_query) |
-                    Q(carrier__company_name__icontains=text_query) |
-                    Q(carrier__alias_company_name__icontains=text_query) |
-                    Q(vehicle_tractor__reg_number__icontains=text_query) |
-                    Q(vehicle_trailer__reg_number__icontains=text_query) |
-                    Q(load_tors__tn__icontains=text_query) |
-                    Q(load_tors__vehicle_tractor__reg_number__icontains=text_query) |
-                    Q(load_tors__vehicle_trailer__reg_number__icontains=text_query) |
-                    Q(load_ctrs__cn__icontains=text_query) |
-                    Q(load_invs__qn__icontains=text_query) |
-                    Q(load_invs__vn__icontains=text_query) |
-                    Q(load_exps__xn__icontains=text_query)
-                )
+                    search_document__contains=normalize_search_text(text_query))
 
             button_index = self.request.query_params.get(
                 'buttonIndex', None)
@@ -1,7 +1,7 @@
 from django.contrib import admin
 from leaflet.admin import LeafletGeoAdmin
 
-from driver.models import DriverLocation, DriverTrackPoint, TripStop
+from driver.models import DriverLocation, DriverTrackArchive, DriverTrackPoint, TripStop
 
 
 @admin.register(DriverLocation)
@@ -16,6 +16,12 @@ class DriverTrackPointAdmin(LeafletGeoAdmin):
                     )
 
 
+@admin.register(DriverTrackArchive)
+class DriverTrackArchiveAdmin(LeafletGeoAdmin):
+    list_display = ('id', 'driver', 'trip', 'started_at', 'ended_at', 'points_count',
+                    )
+
+
 @admin.register(TripStop)
 class TripStopAdmin(LeafletGeoAdmin):
     list_display = ('id', 'trip', 'is_visible_to_driver', 'is_completed', 'type', 'status',
@@ -0,0 +1,137 @@
+import logging
+
+from asgiref.sync import async_to_sync
+from channels.layers import get_channel_layer
+from django.core.cache import cache
+
+from app.models import Company
+
+from . import telemetry
+from .models import DriverLocation
+
+logger = logging.getLogger(__name__)
+
+# Live fleet positions for the dispatch screens.
+#
+# The screens load fleet_snapshot() once (DispatcherLocationsView), then
+# subscribe on the websocket (bch.mixins.fleet_position) and receive
+# "fleet_positions" deltas: push_fleet_positions() runs every few seconds and
+# sends, per fleet_{company_id} group, the latest position of each driver that
+# moved since the previous run. Pings in between are coalesced by the
+# changed-driver set of driver.telemetry, so a driver is pushed at most once
+# per run.
+
+FLEET_SNAPSHOT_TTL = 5
+
+
+def _snapshot_key(company_id):
+    return f"fleet:snapshot:{company_id}"
+
+
+def _serialize_position(driver_id, location):
+    return {
+        "driver_id": driver_id,
+        "lat": location["lat"],
+        "lng": location["lng"],
+        "speed": location["speed"],
+        "heading": location["heading"],
+        "updated_at": location["updated_at"].isoformat(),
+    }
+
+
+def fleet_snapshot(company):
+    """
+    Position of every driver of the company, cached FLEET_SNAPSHOT_TTL seconds
+    (every dispatcher of the company shares the same read).
+    """
+    key = _snapshot_key(company.id)
+
+    try:
+        data = cache.get(key)
+    except Exception as e:
+        logger.error(f'EDR711 fleet snapshot cache get {key}. Error: {e}')
+        data = None
+
+    if data is not None:
+        return data
+
+    locations = list(
+        DriverLocation.objects
+        .filter(driver__company=company)
+        .select_related("driver")
+    )
+    latest = telemetry.latest_locations(obj.driver_id for obj in locations)
+
+    data = [
+        {
+            "driver_id": obj.driver_id,
+            "name": obj.driver.get_full_name(),
+            **telemetry.location_payload(obj, latest.get(obj.driver_id)),
+        }
+        for obj in locations
+    ]
+
+    try:
+        cache.set(key, data, FLEET_SNAPSHOT_TTL)
+    except Exception as e:
+        logger.error(f'EDR712 fleet snapshot cache set {key}. Error: {e}')
+
+    return data
+
+
+def _driver_companies(driver_ids):
+    """
+    {driver_id: company_id}, the first company of each driver (as
+    abb.tenant.resolve_user_company).
+    """
+    companies = {}
+
+    rows = (
+        Company.user.through.objects
+        .filter(user_id__in=driver_ids)
+        .order_by("company_id")
+        .values_list("user_id", "company_id")
+    )
+    for driver_id, company_id in rows:
+        companies.setdefault(driver_id, company_id)
+
+    return companies
+
+
+def push_fleet_positions():
+    """
+    Send the positions changed since the previous run to the company groups,
+    one message per company.
+    """
+    driver_ids = telemetry.pop_changed_drivers()
+    if not driver_ids:
+        return {"drivers": 0, "companies": 0}
+
+    latest = telemetry.latest_locations(driver_ids)
+    companies = _driver_companies(list(latest))
+
+    by_company = {}
+    for driver_id, location in latest.items():
+        company_id = companies.get(driver_id)
+        if company_id:
+            by_company.setdefault(company_id, []).append(
+                _serialize_position(driver_id, location))
+
+    channel_layer = get_channel_layer()
+
+    for company_id, positions in by_company.items():
+        try:
+            async_to_sync(channel_layer.group_send)(
+                f"fleet_{company_id}",
+                {
+                    "type": "forward_fleet_positions",
+                    "payload": {
+                        "type": "fleet_positions",
+                        "data": positions,
+                    },
+                },
+            )
+        except Exception as e:
+            logger.error(f'EDR713 fleet positions company {company_id}. Error: {e}')
+
+    return {"drivers": len(latest), "companies": len(by_company)}
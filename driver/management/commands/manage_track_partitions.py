@@ -0,0 +1,34 @@
+from django.core.management.base import BaseCommand
+
+from driver.partitions import PARTITIONS_AHEAD, RETENTION_MONTHS, maintain_partitions
+
+
+class Command(BaseCommand):
+    help = "Create the next monthly partitions of the driver track points and compact the expired ones"
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "--retention-months", type=int, default=RETENTION_MONTHS,
+            help="Months of raw track points kept before compaction",
+        )
+        parser.add_argument(
+            "--months-ahead", type=int, default=PARTITIONS_AHEAD,
+            help="Monthly partitions created ahead of the current month",
+        )
+        parser.add_argument("--dry-run", action="store_true", help="Only list the partitions")
+
+    def handle(self, *args, **options):
+        result = maintain_partitions(
+            retention_months=options["retention_months"],
+            months_ahead=options["months_ahead"],
+            dry_run=options["dry_run"],
+        )
+
+        for name in result["created"]:
+            self.stdout.write(f"Create {name}")
+        for name in result["compacted"]:
+            self.stdout.write(f"Compact {name}")
+
+        self.stdout.write(self.style.SUCCESS(
+            f"Track point partitions maintained, {result['archived_lines']} lines archived"
+        ))
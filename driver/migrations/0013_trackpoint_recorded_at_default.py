@@ -0,0 +1,19 @@
+# Generated by Django 5.2.10 on 2026-10-17 12:42
+
+import django.utils.timezone
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('driver', '0012_tripstop_km'),
+    ]
+
+    operations = [
+        migrations.AlterField(
+            model_name='drivertrackpoint',
+            name='recorded_at',
+            field=models.DateTimeField(default=django.utils.timezone.now),
+        ),
+    ]
@@ -0,0 +1,130 @@
+# Generated by Django 5.2.10 on 2026-10-17 12:45
+
+from datetime import datetime, timezone as dt_timezone
+
+import django.contrib.gis.db.models.fields
+import django.db.models.deletion
+from django.conf import settings
+from django.db import migrations, models
+from django.utils import timezone
+
+# as driver.partitions when this migration was written
+PARTITIONS_AHEAD = 2
+
+
+def month_start(value):
+    return datetime(value.year, value.month, 1, tzinfo=dt_timezone.utc)
+
+
+def add_months(month, count):
+    index = month.year * 12 + month.month - 1 + count
+    return datetime(index // 12, index % 12 + 1, 1, tzinfo=dt_timezone.utc)
+
+
+def partition_track_points(apps, schema_editor):
+    """
+    Rebuild driver_drivertrackpoint as a table partitioned by month on
+    recorded_at: a partition per month from the oldest point to
+    PARTITIONS_AHEAD months ahead, plus a default partition.
+    The primary key becomes (id, recorded_at), as Postgres requires.
+    """
+    if schema_editor.connection.vendor != "postgresql":
+        return
+
+    DriverTrackPoint = apps.get_model("driver", "DriverTrackPoint")
+    User = apps.get_model(settings.AUTH_USER_MODEL)
+
+    table = DriverTrackPoint._meta.db_table
+    legacy = f"{table}_unpartitioned"
+    sequence = f"{table}_seq"
+
+    with schema_editor.connection.cursor() as cursor:
+        cursor.execute(f"ALTER TABLE {table} RENAME TO {legacy}")
+        cursor.execute(f"SELECT MIN(recorded_at) FROM {legacy}")
+        oldest = cursor.fetchone()[0]
+
+        cursor.execute(f"CREATE SEQUENCE {sequence}")
+        cursor.execute(f"""
+            CREATE TABLE {table} (
+                id bigint NOT NULL DEFAULT nextval('{sequence}'),
+                point geometry(Point, 4326) NOT NULL,
+                speed double precision NULL,
+                heading double precision NULL,
+                recorded_at timestamp with time zone NOT NULL,
+                driver_id bigint NOT NULL
+            ) PARTITION BY RANGE (recorded_at)
+        """)
+        cursor.execute(f"ALTER SEQUENCE {sequence} OWNED BY {table}.id")
+        cursor.execute(f"CREATE TABLE {table}_default PARTITION OF {table} DEFAULT")
+
+        current = month_start(timezone.now())
+        month = month_start(oldest) if oldest else current
+        while month <= add_months(current, PARTITIONS_AHEAD):
+            end = add_months(month, 1)
+            cursor.execute(
+                f"CREATE TABLE {table}_p{month:%Y%m} PARTITION OF {table} "
+                f"FOR VALUES FROM ('{month.isoformat()}') TO ('{end.isoformat()}')"
+            )
+            month = end
+
+        cursor.execute(f"""
+            INSERT INTO {table} (id, point, speed, heading, recorded_at, driver_id)
+            SELECT id, point, speed, heading, recorded_at, driver_id FROM {legacy}
+        """)
+        cursor.execute(f"SELECT setval('{sequence}', COALESCE((SELECT MAX(id) FROM {table}), 0) + 1, false)")
+
+        # the legacy table holds the constraint / index names: drop it first
+        cursor.execute(f"DROP TABLE {legacy}")
+
+        cursor.execute(f"ALTER TABLE {table} ADD PRIMARY KEY (id, recorded_at)")
+        cursor.execute(
+            f"ALTER TABLE {table} ADD FOREIGN KEY (driver_id) "
+            f"REFERENCES {User._meta.db_table} (id) DEFERRABLE INITIALLY DEFERRED"
+        )
+        cursor.execute(f"CREATE INDEX driver_driv_point_5b9195_idx ON {table} USING GIST (point)")
+        cursor.execute(f"CREATE INDEX driver_driv_driver__1cc603_idx ON {table} (driver_id, recorded_at)")
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('axx', '0054_load_search_document'),
+        ('driver', '0013_trackpoint_recorded_at_default'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='DriverTrackArchive',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('started_at', models.DateTimeField()),
+                ('ended_at', models.DateTimeField()),
+                ('points_count', models.PositiveIntegerField()),
+                ('path', django.contrib.gis.db.models.fields.LineStringField(srid=4326)),
+                ('created_at', models.DateTimeField(auto_now_add=True)),
+                ('driver', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='driver_track_archives', to=settings.AUTH_USER_MODEL)),
+                ('trip', models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.SET_NULL, related_name='trip_track_archives', to='axx.trip')),
+            ],
+            options={
+                'indexes': [models.Index(fields=['driver', 'started_at'], name='driver_driv_driver__eb07e5_idx')],
+            },
+        ),
+        migrations.SeparateDatabaseAndState(
+            state_operations=[
+                migrations.AlterField(
+                    model_name='drivertrackpoint',
+                    name='driver',
+                    field=models.ForeignKey(db_index=False, on_delete=django.db.models.deletion.CASCADE, to=settings.AUTH_USER_MODEL),
+                ),
+                migrations.AlterField(
+                    model_name='drivertrackpoint',
+                    name='point',
+                    field=django.contrib.gis.db.models.fields.PointField(spatial_index=False, srid=4326),
+                ),
+            ],
+            database_operations=[
+                migrations.RunPython(partition_track_points),
+            ],
+        ),
+    ]
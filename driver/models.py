@@ -169,14 +169,21 @@ class DriverLocation(models.Model):
 
 
 class DriverTrackPoint(models.Model):
-    driver = models.ForeignKey(User, on_delete=models.CASCADE)
+    """
+    Partitioned by month on recorded_at (see driver.partitions); the primary
+    key in the database is (id, recorded_at).
+    """
+    # driver_id is served by the (driver, recorded_at) index
+    driver = models.ForeignKey(User, on_delete=models.CASCADE, db_index=False)
 
-    point = gis_models.PointField()
+    # GiST index declared in Meta
+    point = gis_models.PointField(spatial_index=False)
 
     speed = models.FloatField(null=True, blank=True)
     heading = models.FloatField(null=True, blank=True)
 
-    recorded_at = models.DateTimeField(auto_now_add=True)
+    # device time of the point (points recorded offline are uploaded later)
+    recorded_at = models.DateTimeField(default=timezone.now)
 
     class Meta:
         indexes = [
@@ -187,3 +194,30 @@ class DriverTrackPoint(models.Model):
 
     def __str__(self):
         return f"{self.driver} @ {self.recorded_at}"
+
+
+class DriverTrackArchive(models.Model):
+    """
+    Track points of a trip (of a driver's day outside trips) compacted into
+    a simplified line when their month partition leaves the retention.
+    """
+    driver = models.ForeignKey(
+        User, on_delete=models.CASCADE, related_name="driver_track_archives")
+    trip = models.ForeignKey(
+        Trip, on_delete=models.SET_NULL, null=True, blank=True, related_name="trip_track_archives")
+
+    started_at = models.DateTimeField()
+    ended_at = models.DateTimeField()
+    points_count = models.PositiveIntegerField()
+
+    path = gis_models.LineStringField()
+
+    created_at = models.DateTimeField(auto_now_add=True)
+
+    class Meta:
+        indexes = [
+            models.Index(fields=["driver", "started_at"]),
+        ]
+
+    def __str__(self):
+        return f"{self.driver} {self.started_at} → {self.ended_at}"
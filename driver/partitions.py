@@ -0,0 +1,213 @@
+import logging
+import re
+from datetime import datetime, timezone as dt_timezone
+
+from django.db import connection, transaction
+from django.utils import timezone
+
+from axx.models import Trip, TripDriver
+
+from .models import DriverTrackArchive, DriverTrackPoint
+
+logger = logging.getLogger(__name__)
+
+# DriverTrackPoint is a Postgres table partitioned by month on recorded_at
+# (migration 0014): <table>_pYYYYMM partitions plus <table>_default for points
+# outside them. Route queries filter on recorded_at, so Postgres only scans the
+# partitions of the requested range.
+#
+# maintain_partitions() (command manage_track_partitions, task
+# maintain_track_partitions_task) creates the partitions of the next months
+# and compacts the months older than the retention into DriverTrackArchive:
+# one simplified line per driver and trip (per driver and day outside trips),
+# then drops the partition.
+
+TRACK_POINT_TABLE = DriverTrackPoint._meta.db_table
+DEFAULT_PARTITION = f"{TRACK_POINT_TABLE}_default"
+
+PARTITIONS_AHEAD = 2
+RETENTION_MONTHS = 6
+
+# ST_SimplifyPreserveTopology tolerance of the archived lines, degrees (~10 m)
+ARCHIVE_TOLERANCE = 0.0001
+
+_PARTITION_RE = re.compile(rf"^{TRACK_POINT_TABLE}_p(\d{{4}})(\d{{2}})$")
+
+
+def month_start(value):
+    return datetime(value.year, value.month, 1, tzinfo=dt_timezone.utc)
+
+
+def add_months(month, count):
+    index = month.year * 12 + month.month - 1 + count
+    return datetime(index // 12, index % 12 + 1, 1, tzinfo=dt_timezone.utc)
+
+
+def partition_name(month):
+    return f"{TRACK_POINT_TABLE}_p{month:%Y%m}"
+
+
+def existing_partitions(cursor):
+    """
+    {month: partition name} of the monthly partitions.
+    """
+    cursor.execute(
+        """
+        SELECT child.relname
+        FROM pg_inherits
+        JOIN pg_class parent ON parent.oid = pg_inherits.inhparent
+        JOIN pg_class child ON child.oid = pg_inherits.inhrelid
+        WHERE parent.relname = %s
+        """,
+        [TRACK_POINT_TABLE],
+    )
+
+    partitions = {}
+    for (name,) in cursor.fetchall():
+        match = _PARTITION_RE.match(name)
+        if match:
+            month = datetime(int(match[1]), int(match[2]), 1, tzinfo=dt_timezone.utc)
+            partitions[month] = name
+
+    return partitions
+
+
+def create_month_partition(cursor, month):
+    """
+    Create the partition of a month. Points of that month already stored in
+    the default partition are moved into it (Postgres refuses the partition
+    otherwise).
+    """
+    start, end = month.isoformat(), add_months(month, 1).isoformat()
+
+    cursor.execute(
+        f"CREATE TEMP TABLE track_points_moved AS "
+        f"SELECT * FROM {DEFAULT_PARTITION} "
+        f"WHERE recorded_at >= '{start}' AND recorded_at < '{end}'"
+    )
+    cursor.execute(
+        f"DELETE FROM {DEFAULT_PARTITION} "
+        f"WHERE recorded_at >= '{start}' AND recorded_at < '{end}'"
+    )
+    cursor.execute(
+        f"CREATE TABLE {partition_name(month)} PARTITION OF {TRACK_POINT_TABLE} "
+        f"FOR VALUES FROM ('{start}') TO ('{end}')"
+    )
+    cursor.execute(f"INSERT INTO {TRACK_POINT_TABLE} SELECT * FROM track_points_moved")
+    cursor.execute("DROP TABLE track_points_moved")
+
+
+def _archive_sql(source, condition):
+    """
+    INSERT of the simplified lines of the points of `source` matching
+    `condition`: grouped by driver and trip (the first trip of the driver
+    running at the point's time), by driver and day outside trips.
+    """
+    trip_table = Trip._meta.db_table
+    trip_driver_table = TripDriver._meta.db_table
+    trip_column = TripDriver._meta.get_field("trip").column
+    driver_column = TripDriver._meta.get_field("driver").column
+
+    return f"""
+        INSERT INTO {DriverTrackArchive._meta.db_table}
+            (driver_id, trip_id, started_at, ended_at, points_count, path, created_at)
+        SELECT
+            point.driver_id,
+            trip.id,
+            MIN(point.recorded_at),
+            MAX(point.recorded_at),
+            COUNT(*),
+            ST_SimplifyPreserveTopology(
+                ST_MakeLine(point.point ORDER BY point.recorded_at), %s),
+            NOW()
+        FROM {source} point
+        LEFT JOIN LATERAL (
+            SELECT t.id
+            FROM {trip_table} t
+            JOIN {trip_driver_table} td ON td.{trip_column} = t.id
+            WHERE td.{driver_column} = point.driver_id
+              AND t.date_order <= point.recorded_at
+              AND (t.date_end IS NULL OR t.date_end >= point.recorded_at)
+            ORDER BY t.date_order
+            LIMIT 1
+        ) trip ON TRUE
+        WHERE {condition}
+        GROUP BY
+            point.driver_id,
+            trip.id,
+            CASE WHEN trip.id IS NULL THEN DATE_TRUNC('day', point.recorded_at) END
+        HAVING COUNT(*) > 1
+    """
+
+
+def compact_partition(cursor, name):
+    """
+    Archive the points of a monthly partition, then drop it.
+    """
+    cursor.execute(_archive_sql(name, "TRUE"), [ARCHIVE_TOLERANCE])
+    archived = cursor.rowcount
+
+    cursor.execute(f"ALTER TABLE {TRACK_POINT_TABLE} DETACH PARTITION {name}")
+    cursor.execute(f"DROP TABLE {name}")
+
+    return archived
+
+
+def compact_default_partition(cursor, cutoff):
+    """
+    Archive and delete the points of the default partition older than the
+    cutoff (late uploads of months already compacted).
+    """
+    condition = f"point.recorded_at < '{cutoff.isoformat()}'"
+
+    cursor.execute(_archive_sql(DEFAULT_PARTITION, condition), [ARCHIVE_TOLERANCE])
+    archived = cursor.rowcount
+
+    cursor.execute(
+        f"DELETE FROM {DEFAULT_PARTITION} WHERE recorded_at < '{cutoff.isoformat()}'")
+
+    return archived
+
+
+def maintain_partitions(*, retention_months=RETENTION_MONTHS, months_ahead=PARTITIONS_AHEAD, dry_run=False):
+    """
+    Create the partitions of the current and next `months_ahead` months;
+    compact and drop the partitions that ended more than `retention_months`
+    months ago. Each partition is handled in its own transaction.
+    """
+    current = month_start(timezone.now())
+    cutoff = add_months(current, -retention_months)
+
+    with connection.cursor() as cursor:
+        partitions = existing_partitions(cursor)
+
+    created = [
+        add_months(current, offset)
+        for offset in range(months_ahead + 1)
+        if add_months(current, offset) not in partitions
+    ]
+    expired = sorted(month for month in partitions if add_months(month, 1) <= cutoff)
+
+    result = {
+        "created": [partition_name(month) for month in created],
+        "compacted": [partitions[month] for month in expired],
+        "archived_lines": 0,
+    }
+
+    if dry_run:
+        return result
+
+    for month in created:
+        with transaction.atomic(), connection.cursor() as cursor:
+            create_month_partition(cursor, month)
+
+    for month in expired:
+        with transaction.atomic(), connection.cursor() as cursor:
+            result["archived_lines"] += compact_partition(cursor, partitions[month])
+
+    with transaction.atomic(), connection.cursor() as cursor:
+        result["archived_lines"] += compact_default_partition(cursor, cutoff)
+
+    logger.info(f'Track point partitions: {result}')
+
+    return result
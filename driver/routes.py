@@ -0,0 +1,172 @@
+import numpy as np
+from django.db.models import F, FloatField, Func, Value
+from django.db.models.functions import Extract, Floor
+
+from .models import DriverTrackArchive, DriverTrackPoint
+
+ROUTE_CHUNK_SIZE = 5000
+
+# Douglas-Peucker tolerance for a zoom level: ~1 screen pixel, in degrees
+# (a 256 px web-mercator tile spans 360 / 2**zoom degrees of longitude)
+SIMPLIFY_PIXELS = 1
+MAX_ZOOM = 22
+
+MIN_BUCKET_SECONDS = 1
+
+POLYLINE_PRECISION = 5
+
+ROUTE_FIELDS = ("lat", "lng", "speed", "heading", "recorded_at")
+
+
+def route_points(driver_id, date_from, date_to, *, bucket_seconds=None):
+    """
+    Track points of the driver in the range, ordered by recorded_at, as
+    (lat, lng, speed, heading, recorded_at) tuples read with a server-side
+    cursor (no model instances, no geometry objects).
+
+    bucket_seconds keeps only the first point of every time bucket, in the
+    database (DISTINCT ON the bucket number).
+    """
+    qs = (
+        DriverTrackPoint.objects
+        .filter(driver_id=driver_id, recorded_at__range=[date_from, date_to])
+        .annotate(
+            lat=Func(F("point"), function="ST_Y", output_field=FloatField()),
+            lng=Func(F("point"), function="ST_X", output_field=FloatField()),
+        )
+    )
+
+    if bucket_seconds:
+        qs = (
+            qs
+            .annotate(bucket=Floor(
+                Extract("recorded_at", "epoch") / Value(bucket_seconds)))
+            .order_by("bucket", "recorded_at")
+            .distinct("bucket")
+        )
+        # DISTINCT ON needs the bucket selected
+        rows = qs.values_list(*ROUTE_FIELDS, "bucket").iterator(chunk_size=ROUTE_CHUNK_SIZE)
+        return (row[:len(ROUTE_FIELDS)] for row in rows)
+
+    return (
+        qs.order_by("recorded_at")
+        .values_list(*ROUTE_FIELDS)
+        .iterator(chunk_size=ROUTE_CHUNK_SIZE)
+    )
+
+
+def archived_route_points(driver_id, date_from, date_to):
+    """
+    Points of the archived (compacted, see driver.partitions) tracks of the
+    driver overlapping the range, as route rows. Only the first and last
+    point of an archived line carry a time (its start / end).
+    """
+    archives = (
+        DriverTrackArchive.objects
+        .filter(driver_id=driver_id, started_at__lte=date_to, ended_at__gte=date_from)
+        .order_by("started_at")
+        .values_list("path", "started_at", "ended_at")
+    )
+
+    for path, started_at, ended_at in archives:
+        last = len(path.coords) - 1
+
+        for index, (lng, lat) in enumerate(path.coords):
+            recorded_at = started_at if index == 0 else ended_at if index == last else None
+            yield lat, lng, None, None, recorded_at
+
+
+def full_route_points(driver_id, date_from, date_to, *, bucket_seconds=None):
+    """
+    Archived points followed by the raw points: archives only hold months
+    whose raw points were dropped, so they always come first.
+    """
+    yield from archived_route_points(driver_id, date_from, date_to)
+    yield from route_points(driver_id, date_from, date_to, bucket_seconds=bucket_seconds)
+
+
+def zoom_tolerance(zoom):
+    return SIMPLIFY_PIXELS * 360 / (256 * 2 ** zoom)
+
+
+def simplify_indices(coords, tolerance):
+    """
+    Douglas-Peucker on an (n, 2) array: indices of the points to keep
+    (first and last always kept). Iterative, distances computed per segment
+    with NumPy.
+    """
+    n = len(coords)
+    if n < 3:
+        return np.arange(n)
+
+    keep = np.zeros(n, dtype=bool)
+    keep[0] = keep[-1] = True
+
+    stack = [(0, n - 1)]
+
+    while stack:
+        start, end = stack.pop()
+        if end - start < 2:
+            continue
+
+        segment = coords[end] - coords[start]
+        points = coords[start + 1:end] - coords[start]
+        length = np.hypot(*segment)
+
+        if length == 0:
+            distances = np.hypot(points[:, 0], points[:, 1])
+        else:
+            # perpendicular distance to the start-end line
+            distances = np.abs(segment[0] * points[:, 1] - segment[1] * points[:, 0]) / length
+
+        farthest = int(np.argmax(distances))
+
+        if distances[farthest] > tolerance:
+            index = start + 1 + farthest
+            keep[index] = True
+            stack.append((start, index))
+            stack.append((index, end))
+
+    return np.flatnonzero(keep)
+
+
+def simplify_route(rows, tolerance):
+    rows = list(rows)
+    if not rows:
+        return rows
+
+    coords = np.array([(lng, lat) for lat, lng, *_rest in rows], dtype=float)
+
+    return [rows[index] for index in simplify_indices(coords, tolerance)]
+
+
+def _encode_value(value):
+    value = ~(value << 1) if value < 0 else value << 1
+
+    chunks = []
+    while value >= 0x20:
+        chunks.append(chr((0x20 | (value & 0x1f)) + 63))
+        value >>= 5
+    chunks.append(chr(value + 63))
+
+    return "".join(chunks)
+
+
+def encode_polyline(rows, precision=POLYLINE_PRECISION):
+    """
+    Encoded polyline (Google format, lat/lng) of the route rows.
+    """
+    factor = 10 ** precision
+    previous_lat = previous_lng = 0
+    encoded = []
+
+    for lat, lng, *_rest in rows:
+        lat = int(round(lat * factor))
+        lng = int(round(lng * factor))
+
+        encoded.append(_encode_value(lat - previous_lat))
+        encoded.append(_encode_value(lng - previous_lng))
+
+        previous_lat, previous_lng = lat, lng
+
+    return "".join(encoded)
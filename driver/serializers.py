@@ -7,6 +7,7 @@ from app.models import TypeCost
 from att.models import Vehicle
 from axx.models import Load, LoadEvidence, Trip
 from ayy.models import ItemCost, ItemForItemCost
+from driver.telemetry import location_payload
 from driver.utils import format_site
 from .models import DriverLocation, TripStop, TripStopMessage
 
@@ -46,6 +47,9 @@ class ActiveTripSerializer(serializers.ModelSerializer):
     def get_drivers(self, obj):
         result = []
 
+        # latest positions from the telemetry buffer (see driver.telemetry)
+        latest_locations = self.context.get('latest_locations', {})
+
         for driver in obj.drivers.all():
 
             loc = getattr(driver, 'driver_location', None)
@@ -54,13 +58,7 @@ class ActiveTripSerializer(serializers.ModelSerializer):
                 'id': driver.id,
                 'name': driver.get_full_name(),
                 'uf': driver.uf,
-                'location': {
-                    'lat': loc.lat,
-                    'lng': loc.lng,
-                    'speed': loc.speed,
-                    'heading': loc.heading,
-                    'updated_at': loc.updated_at,
-                } if loc else None
+                'location': location_payload(loc, latest_locations.get(driver.id)),
             })
 
         return result
@@ -2,6 +2,9 @@
 from axx.models import Trip
 from driver.models import TripStop
 from driver.serializers import TripStopSerializer
+from driver.fleet import push_fleet_positions
+from driver.partitions import maintain_partitions
+from driver.telemetry import flush_buffer
 from xumma.celery import app
 from asgiref.sync import async_to_sync
 from channels.layers import get_channel_layer
@@ -83,3 +86,30 @@ def broadcast_trip_stop_messages_read(self, company_id, trip_stop_uf):
 
     except Exception as exc:
         raise self.retry(exc=exc)
+
+
+@app.task(bind=True, queue="low_priority")
+def flush_driver_telemetry_task(self):
+    """
+    Periodic (django_celery_beat, every ~10 s): write the buffered GPS points
+    to DriverTrackPoint and checkpoint DriverLocation.
+    """
+    return flush_buffer()
+
+
+@app.task(bind=True)
+def push_fleet_positions_task(self):
+    """
+    Periodic (django_celery_beat, every ~3 s): send the changed driver
+    positions to the dispatchers subscribed on the websocket.
+    """
+    return push_fleet_positions()
+
+
+@app.task(bind=True, queue="low_priority")
+def maintain_track_partitions_task(self):
+    """
+    Periodic (django_celery_beat, daily): create the next monthly partitions
+    of DriverTrackPoint and compact the ones past the retention.
+    """
+    return maintain_partitions()
@@ -0,0 +1,372 @@
+import json
+import logging
+from datetime import datetime, timedelta, timezone as dt_timezone
+
+from django.contrib.auth import get_user_model
+from django.contrib.gis.geos import Point
+from django.db import DataError, IntegrityError, transaction
+from django.utils import timezone
+from django.utils.dateparse import parse_datetime
+from django_redis import get_redis_connection
+
+from .models import DriverLocation, DriverTrackPoint
+
+logger = logging.getLogger(__name__)
+
+User = get_user_model()
+
+# GPS telemetry ingest.
+#
+# Pings are not written to the database by the request: each accepted point is
+# appended to a Redis list that flush_driver_telemetry_task drains into
+# DriverTrackPoint with bulk_create. The latest position of every driver lives
+# in Redis; DriverLocation is only a checkpoint written by the flush.
+#
+# De-dup (one track point per driver every 5 seconds) is done in the buffer
+# with one SET NX key per driver and 5-second slot, so points recorded offline
+# and uploaded late, out of order or twice are handled the same way.
+
+TRACK_POINT_INTERVAL_SECONDS = 5
+SLOT_TTL_SECONDS = 60 * 60
+LATEST_TTL_SECONDS = 7 * 24 * 60 * 60
+
+FLUSH_BATCH_SIZE = 2000
+MAX_BATCH_POINTS = 1000
+
+BUFFER_KEY = "telemetry:buffer"
+# drivers whose latest position changed since the last fleet push (driver.fleet)
+CHANGED_KEY = "telemetry:changed"
+# buffered points that can never be written (deleted driver, rejected row)
+DEAD_LETTER_KEY = "telemetry:dead"
+
+# set the latest position only when the point is newer than the stored one,
+# and mark the driver changed
+_SET_LATEST_IF_NEWER = """
+local current = redis.call('HGET', KEYS[1], 'ts')
+if current and tonumber(current) >= tonumber(ARGV[1]) then
+    return 0
+end
+redis.call('HSET', KEYS[1], 'ts', ARGV[1], 'data', ARGV[2])
+redis.call('EXPIRE', KEYS[1], ARGV[3])
+redis.call('SADD', KEYS[2], ARGV[4])
+return 1
+"""
+
+
+def _latest_key(driver_id):
+    return f"telemetry:latest:{driver_id}"
+
+
+def _slot_key(driver_id, ts):
+    return f"telemetry:slot:{driver_id}:{int(ts // TRACK_POINT_INTERVAL_SECONDS)}"
+
+
+def _redis():
+    return get_redis_connection("default")
+
+
+def parse_point(data, *, received_at):
+    """
+    One ping: lat / lng required, speed / heading optional, recorded_at as an
+    ISO datetime (default: received_at, never later than it).
+    Raises ValueError.
+    """
+    lat = data.get("lat")
+    lng = data.get("lng")
+
+    if lat is None or lng is None:
+        raise ValueError("lat and lng required")
+
+    recorded_at = received_at
+    if data.get("recorded_at"):
+        recorded_at = parse_datetime(str(data["recorded_at"]))
+        if recorded_at is None:
+            raise ValueError(f"Invalid recorded_at: {data['recorded_at']}")
+        if timezone.is_naive(recorded_at):
+            recorded_at = timezone.make_aware(recorded_at)
+        recorded_at = min(recorded_at, received_at)
+
+    def optional_float(value):
+        return None if value in (None, "") else float(value)
+
+    try:
+        return {
+            "lat": float(lat),
+            "lng": float(lng),
+            "speed": optional_float(data.get("speed")),
+            "heading": optional_float(data.get("heading")),
+            "ts": recorded_at.timestamp(),
+        }
+    except (TypeError, ValueError):
+        raise ValueError("lat, lng, speed and heading must be numbers")
+
+
+def _point_datetime(ts):
+    return datetime.fromtimestamp(ts, tz=dt_timezone.utc)
+
+
+def _store_points_directly(driver_id, points):
+    """
+    Fallback when Redis is unavailable: the previous per-ping writes.
+    """
+    last_point = (
+        DriverTrackPoint.objects
+        .filter(driver_id=driver_id)
+        .order_by("-recorded_at")
+        .values_list("recorded_at", flat=True)
+        .first()
+    )
+
+    track_points = []
+    for point in sorted(points, key=lambda p: p["ts"]):
+        recorded_at = _point_datetime(point["ts"])
+        if not last_point or last_point <= recorded_at - timedelta(seconds=TRACK_POINT_INTERVAL_SECONDS):
+            track_points.append(_track_point(driver_id, point))
+            last_point = recorded_at
+
+    DriverTrackPoint.objects.bulk_create(track_points)
+
+    latest = max(points, key=lambda p: p["ts"])
+    _checkpoint_locations({driver_id: latest})
+
+    return len(track_points)
+
+
+def ingest_points(driver_id, points):
+    """
+    Buffer the points of one driver. Returns the number of points accepted
+    (the others fall in a 5-second slot that already has a point).
+    """
+    if not points:
+        return 0
+
+    try:
+        redis = _redis()
+
+        pipe = redis.pipeline(transaction=False)
+        for point in points:
+            pipe.set(_slot_key(driver_id, point["ts"]), 1,
+                     nx=True, ex=SLOT_TTL_SECONDS)
+        accepted = [point for point, is_new in zip(points, pipe.execute()) if is_new]
+
+        latest = max(points, key=lambda p: p["ts"])
+
+        pipe = redis.pipeline(transaction=False)
+        if accepted:
+            pipe.rpush(BUFFER_KEY, *(
+                json.dumps({"driver_id": driver_id, **point}) for point in accepted
+            ))
+        pipe.eval(
+            _SET_LATEST_IF_NEWER,
+            2,
+            _latest_key(driver_id),
+            CHANGED_KEY,
+            latest["ts"],
+            json.dumps(latest),
+            LATEST_TTL_SECONDS,
+            driver_id,
+        )
+        pipe.execute()
+
+        return len(accepted)
+
+    except Exception as e:
+        logger.error(f'EDR701 telemetry buffer driver {driver_id}. Error: {e}')
+        return _store_points_directly(driver_id, points)
+
+
+def _as_location(point):
+    return {
+        "lat": point["lat"],
+        "lng": point["lng"],
+        "speed": point["speed"],
+        "heading": point["heading"],
+        "updated_at": _point_datetime(point["ts"]),
+    }
+
+
+def latest_locations(driver_ids):
+    """
+    {driver_id: {lat, lng, speed, heading, updated_at}} from Redis, for the
+    drivers that have a buffered position; {} when Redis is unavailable.
+    """
+    driver_ids = list(driver_ids)
+    if not driver_ids:
+        return {}
+
+    try:
+        pipe = _redis().pipeline(transaction=False)
+        for driver_id in driver_ids:
+            pipe.hget(_latest_key(driver_id), "data")
+        values = pipe.execute()
+    except Exception as e:
+        logger.error(f'EDR702 telemetry latest locations. Error: {e}')
+        return {}
+
+    return {
+        driver_id: _as_location(json.loads(value))
+        for driver_id, value in zip(driver_ids, values)
+        if value
+    }
+
+
+def pop_changed_drivers():
+    """
+    Ids of the drivers whose latest position changed since the previous call.
+    """
+    pipe = _redis().pipeline(transaction=True)
+    pipe.smembers(CHANGED_KEY)
+    pipe.delete(CHANGED_KEY)
+    members, _deleted = pipe.execute()
+
+    return [int(member) for member in members]
+
+
+def location_payload(location, latest=None):
+    """
+    Position of a driver: the Redis one when newer than the DriverLocation
+    checkpoint. `location` may be None.
+    """
+    if latest and (location is None or latest["updated_at"] >= location.updated_at):
+        return latest
+
+    if location is None:
+        return None
+
+    return {
+        "lat": location.lat,
+        "lng": location.lng,
+        "speed": location.speed,
+        "heading": location.heading,
+        "updated_at": location.updated_at,
+    }
+
+
+def _track_point(driver_id, point):
+    return DriverTrackPoint(
+        driver_id=driver_id,
+        point=Point(point["lng"], point["lat"]),  # ← IMPORTANT ORDER
+        speed=point["speed"],
+        heading=point["heading"],
+        recorded_at=_point_datetime(point["ts"]),
+    )
+
+
+def _checkpoint_locations(latest_by_driver):
+    """
+    DriverLocation of each driver, from its latest point.
+    """
+    for driver_id, point in latest_by_driver.items():
+        DriverLocation.objects.update_or_create(
+            driver_id=driver_id,
+            defaults={
+                "lat": point["lat"],
+                "lng": point["lng"],
+                "speed": point["speed"],
+                "heading": point["heading"],
+            },
+        )
+
+
+def _pop_buffer(redis, count):
+    pipe = redis.pipeline(transaction=True)
+    pipe.lrange(BUFFER_KEY, 0, count - 1)
+    pipe.ltrim(BUFFER_KEY, count, -1)
+    entries, _trimmed = pipe.execute()
+    return entries
+
+
+def _dead_letter(redis, entries, reason):
+    if not entries:
+        return
+
+    redis.rpush(DEAD_LETTER_KEY, *entries)
+    logger.error(f'EDR703 telemetry flush dead-lettered {len(entries)} points. Error: {reason}')
+
+
+def _write_points(redis, entries, points):
+    """
+    Write one batch, row by row when the batch is rejected, so a bad point
+    goes to the dead-letter list instead of blocking the buffer.
+    Returns the points written.
+    """
+    try:
+        with transaction.atomic():
+            DriverTrackPoint.objects.bulk_create(
+                [_track_point(point["driver_id"], point) for point in points]
+            )
+        return points
+    except (IntegrityError, DataError):
+        pass
+
+    written = []
+    for entry, point in zip(entries, points):
+        try:
+            with transaction.atomic():
+                _track_point(point["driver_id"], point).save()
+        except (IntegrityError, DataError) as e:
+            _dead_letter(redis, [entry], e)
+        else:
+            written.append(point)
+
+    return written
+
+
+def flush_buffer(max_batches=50):
+    """
+    Drain the buffer into DriverTrackPoint (bulk_create, FLUSH_BATCH_SIZE per
+    batch) and checkpoint DriverLocation once per driver seen.
+    Points of deleted drivers, and points the database rejects, are moved to
+    DEAD_LETTER_KEY; a batch that cannot be written for any other reason
+    (database unavailable) is pushed back to the buffer.
+    """
+    redis = _redis()
+    written = 0
+    drivers = set()
+
+    for _batch in range(max_batches):
+        entries = _pop_buffer(redis, FLUSH_BATCH_SIZE)
+        if not entries:
+            break
+
+        points = [json.loads(entry) for entry in entries]
+
+        try:
+            existing = set(
+                User.objects
+                .filter(id__in={point["driver_id"] for point in points})
+                .values_list("id", flat=True)
+            )
+
+            batch = [(entry, point) for entry, point in zip(entries, points) if point["driver_id"] in existing]
+            _dead_letter(
+                redis,
+                [entry for entry, point in zip(entries, points) if point["driver_id"] not in existing],
+                "driver does not exist",
+            )
+
+            stored = _write_points(
+                redis,
+                [entry for entry, _point in batch],
+                [point for _entry, point in batch],
+            )
+        except Exception:
+            redis.lpush(BUFFER_KEY, *reversed(entries))
+            raise
+
+        written += len(stored)
+        drivers.update(point["driver_id"] for point in stored)
+
+    if drivers:
+        latest = latest_locations(drivers)
+        _checkpoint_locations({
+            driver_id: {
+                "lat": location["lat"],
+                "lng": location["lng"],
+                "speed": location["speed"],
+                "heading": location["heading"],
+            }
+            for driver_id, location in latest.items()
+        })
+
+    return {"written": written, "drivers": len(drivers)}
@@ -5,6 +5,7 @@ from .views import *
 
 urlpatterns = [
     path("driver/location/update/", DriverLocationUpdateView.as_view()),
+    path("driver/location/batch/", DriverLocationBatchView.as_view()),
     path('driver/route/', DriverRouteAPIView.as_view(), name='driver-route'),
 
     path("dispatcher/locations/", DispatcherLocationsView.as_view()),
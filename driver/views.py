@@ -1,10 +1,10 @@
 import logging
 from django.utils.timezone import now
 from django.utils.dateparse import parse_datetime
-from datetime import timedelta
-from django.contrib.gis.geos import Point, LineString
+from django.contrib.gis.geos import LineString
 from django.utils import timezone
 from django.db import transaction
+from django.contrib.auth import get_user_model
 from django.core.exceptions import ValidationError
 from django.http import FileResponse, Http404
 from django.shortcuts import get_object_or_404
@@ -30,77 +30,87 @@ from driver.serializers import (
     ActiveTripSerializer, DriverCompleteTripStopSerializer, DriverLoadCacheSerializer, DriverTripKmSerializer, DriverTripSerializer, DriverTripStopSerializer, DriverVehicleSerializer, ItemCostDriverSerializer, ItemForItemCostDriverSerializer, LoadEvidenceSerializer, TripStopAssignGpsSerializer, TripStopMessageSerializer, TripStopReorderSerializer, TripStopSerializer, TripStopVisibilitySerializer, TypeCostSerializer)
 from driver.tasks import broadcast_trip_stop_messages_read, broadcast_trip_stop_reorder, broadcast_trip_stop_visibility
 
-from .models import DriverLocation, DriverTrackPoint, TripStop, TripStopMessage
+from . import fleet, routes, telemetry
+from .models import DriverLocation, TripStop, TripStopMessage
 
 logger = logging.getLogger(__name__)
 
+User = get_user_model()
+
 
 class DriverLocationUpdateView(APIView):
     permission_classes = [IsAuthenticated]
 
     def post(self, request):
-        lat = request.data.get("lat")
-        lng = request.data.get("lng")
-
-        if lat is None or lng is None:
+        try:
+            point = telemetry.parse_point(request.data, received_at=now())
+        except ValueError as exc:
             return Response(
-                {"detail": "lat and lng required"},
+                {"detail": str(exc)},
                 status=status.HTTP_400_BAD_REQUEST
             )
 
-        speed = request.data.get("speed")
-        heading = request.data.get("heading")
+        # buffered in Redis, written by flush_driver_telemetry_task
+        telemetry.ingest_points(request.user.id, [point])
 
-        obj, _ = DriverLocation.objects.update_or_create(
-            driver=request.user,
-            defaults={
-                "lat": lat,
-                "lng": lng,
-                "speed": speed,
-                "heading": heading,
-            }
-        )
+        return Response(status=status.HTTP_200_OK)
 
-        # Store historical point
-        last_point = (
-            DriverTrackPoint.objects
-            .filter(driver=request.user)
-            .order_by("-recorded_at")
-            .first()
-        )
 
-        if not last_point or last_point.recorded_at < now() - timedelta(seconds=5):
+class DriverLocationBatchView(APIView):
+    """
+    Points recorded while offline: {"points": [{lat, lng, speed, heading, recorded_at}, ...]}
+    """
+    permission_classes = [IsAuthenticated]
+
+    def post(self, request):
+        points = request.data.get("points")
 
-            DriverTrackPoint.objects.create(
-                driver=request.user,
-                point=Point(float(lng), float(lat)),  # ← IMPORTANT ORDER
-                speed=speed,
-                heading=heading,
+        if not isinstance(points, list) or not points:
+            return Response(
+                {"detail": "points required"},
+                status=status.HTTP_400_BAD_REQUEST
             )
 
-        return Response(status=status.HTTP_200_OK)
+        if len(points) > telemetry.MAX_BATCH_POINTS:
+            return Response(
+                {"detail": f"At most {telemetry.MAX_BATCH_POINTS} points per request"},
+                status=status.HTTP_400_BAD_REQUEST
+            )
+
+        received_at = now()
+
+        try:
+            parsed = [
+                telemetry.parse_point(point, received_at=received_at)
+                for point in points
+            ]
+        except (AttributeError, ValueError) as exc:
+            return Response(
+                {"detail": str(exc)},
+                status=status.HTTP_400_BAD_REQUEST
+            )
+
+        accepted = telemetry.ingest_points(request.user.id, parsed)
+
+        return Response(
+            {"accepted": accepted, "duplicates": len(parsed) - accepted},
+            status=status.HTTP_200_OK
+        )
 
 
 class DispatcherLocationsView(APIView):
+    """
+    Initial load of the dispatch map; live updates come over the websocket
+    (subscribe_fleet_positions).
+    """
     permission_classes = [IsAuthenticated]
 
     def get(self, request):
-        qs = DriverLocation.objects.select_related("driver").all()
-
-        data = [
-            {
-                "driver_id": obj.driver.id,
-                "name": obj.driver.get_full_name(),
-                "lat": obj.lat,
-                "lng": obj.lng,
-                "speed": obj.speed,
-                "heading": obj.heading,
-                "updated_at": obj.updated_at,
-            }
-            for obj in qs
-        ]
+        user_company = get_user_company(request.user)
+        if user_company is None:
+            return Response([])
 
-        return Response(data)
+        return Response(fleet.fleet_snapshot(user_company))
 
 
 class ActiveTripsAPIView(APIView):
@@ -119,27 +129,43 @@ class ActiveTripsAPIView(APIView):
             .prefetch_related('drivers')
         )
 
-        serializer = ActiveTripSerializer(trips, many=True)
+        serializer = ActiveTripSerializer(
+            trips,
+            many=True,
+            context={
+                "latest_locations": telemetry.latest_locations(
+                    {driver.id for trip in trips for driver in trip.drivers.all()}
+                ),
+            },
+        )
         return Response(serializer.data)
 
 
 class DriverLocationAPIView(APIView):
     def get(self, request, driver_uf):
-        loc = DriverLocation.objects.filter(driver__uf=driver_uf).first()
+        driver_id = User.objects.filter(uf=driver_uf).values_list("id", flat=True).first()
+        if driver_id is None:
+            return Response({"detail": "Not found"}, status=404)
 
-        if not loc:
+        loc = DriverLocation.objects.filter(driver_id=driver_id).first()
+        payload = telemetry.location_payload(
+            loc, telemetry.latest_locations([driver_id]).get(driver_id))
+
+        if not payload:
             return Response({"detail": "Not found"}, status=404)
 
-        return Response({
-            "lat": loc.lat,
-            "lng": loc.lng,
-            "speed": loc.speed,
-            "heading": loc.heading,
-            "updated_at": loc.updated_at,
-        })
+        return Response(payload)
 
 
 class DriverRouteAPIView(APIView):
+    """
+    Track of a driver between `from` and `to`.
+
+    Optional:
+    - bucket: seconds, keep the first point of every time bucket
+    - zoom (0-22) or tolerance (degrees): Douglas-Peucker simplification
+    - output=polyline: {"polyline": <encoded polyline>, "points": n}
+    """
     permission_classes = [IsAuthenticated]
 
     def get(self, request):
@@ -150,20 +176,58 @@ class DriverRouteAPIView(APIView):
         if not driver_uf or not date_from or not date_to:
             return Response({"detail": "Missing params"}, status=400)
 
-        qs = DriverTrackPoint.objects.filter(
-            driver__uf=driver_uf,
-            recorded_at__range=[date_from, date_to]
-        ).order_by("recorded_at")
+        bucket = request.query_params.get("bucket")
+        zoom = request.query_params.get("zoom")
+        tolerance = request.query_params.get("tolerance")
+        output = request.query_params.get("output", "json")
+
+        try:
+            bucket = int(bucket) if bucket else None
+            if bucket is not None and bucket < routes.MIN_BUCKET_SECONDS:
+                raise ValueError("bucket must be a positive number of seconds")
+
+            if zoom:
+                zoom = int(zoom)
+                if not 0 <= zoom <= routes.MAX_ZOOM:
+                    raise ValueError(f"zoom must be between 0 and {routes.MAX_ZOOM}")
+                tolerance = routes.zoom_tolerance(zoom)
+            elif tolerance:
+                tolerance = float(tolerance)
+                if tolerance < 0:
+                    raise ValueError("tolerance must be >= 0")
+
+            if output not in ("json", "polyline"):
+                raise ValueError("output must be json or polyline")
+        except ValueError as exc:
+            return Response({"detail": str(exc)}, status=400)
+
+        driver_id = User.objects.filter(uf=driver_uf).values_list("id", flat=True).first()
+        if driver_id is None:
+            return Response([] if output == "json" else {"polyline": "", "points": 0})
+
+        # ranges past the retention are served from the archived lines
+        rows = routes.full_route_points(
+            driver_id, date_from, date_to, bucket_seconds=bucket)
+
+        if tolerance:
+            rows = routes.simplify_route(rows, tolerance)
+
+        if output == "polyline":
+            rows = list(rows)
+            return Response({
+                "polyline": routes.encode_polyline(rows),
+                "points": len(rows),
+            })
 
         data = [
             {
-                "lat": obj.point.y,
-                "lng": obj.point.x,
-                "speed": obj.speed,
-                "heading": obj.heading,
-                "recorded_at": obj.recorded_at,
+                "lat": lat,
+                "lng": lng,
+                "speed": speed,
+                "heading": heading,
+                "recorded_at": recorded_at,
             }
-            for obj in qs
+            for lat, lng, speed, heading, recorded_at in rows
         ]
 
         return Response(data)
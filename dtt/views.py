@@ -5,7 +5,7 @@ from django.shortcuts import get_object_or_404
 import logging
 import smtplib
 from datetime import datetime, timedelta
-from django.db import IntegrityError
+from django.db import IntegrityError, transaction
 from django.db.models.deletion import RestrictedError
 from django.db.models import QuerySet, Prefetch, Q, F
 from django.utils import timezone
@@ -25,8 +25,9 @@ from django.http import FileResponse, Http404
 from rest_framework.views import APIView
 from rest_framework.permissions import IsAuthenticated, AllowAny
 
-from abb.utils import assign_new_num, get_company_manager, get_user_company
-from app.models import SMTPSettings, UserSettings
+from abb.utils import get_company_manager, get_user_company
+from app.models import DocumentCounterType, SMTPSettings, UserSettings
+from app.numbering import next_document_number, observe_document_number
 from app.serializers import UserSettingsSerializer
 from att.models import BankAccount, ContactSite, ContractReferenceDate, Note, PaymentTerm, Person, Term
 from avv.models import DriverReportImage
@@ -1027,13 +1028,14 @@ def validate_or_generate_cmr(request, uf):
                 status=status.HTTP_400_BAD_REQUEST
             )
 
-        cmr.number = cmr_number
-        cmr.save(update_fields=["number"])
+        with transaction.atomic():
+            cmr.number = cmr_number
+            cmr.save(update_fields=["number"])
+            observe_document_number(company.id, DocumentCounterType.CMR, cmr_number)
         return Response({"cmr_number": cmr_number}, status=status.HTTP_200_OK)
 
     # Case 2: no number provided → generate next sequential number per company
-    cmr_qs = CMR.objects.filter(company=company)
-    num_new = assign_new_num(cmr_qs, "number")
+    num_new = next_document_number(company.id, DocumentCounterType.CMR)
 
     cmr.number = num_new
     cmr.save(update_fields=["number"])
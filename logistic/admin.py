@@ -1,7 +1,8 @@
 from django.contrib import admin
 
-from logistic.models import (WHBillingCharge, WHBillingInvoice, WHBillingInvoiceLine, WHBillingPeriod, WHContactTariffHandlingTierOverride, WHContactTariffOverride, WHInbound, WHInboundCharge,
-                              WHInboundLine, WHLocation, WHOutbound, WHOutboundLine, WHProduct, WHStock, WHStockLedger
+from logistic.models import (WHBillingCharge, WHBillingInvoice, WHDashboardDailyRevenue, WHDashboardOwnerStats, WHBillingInvoiceLine, WHBillingPeriod, WHBillingRun, WHContactTariffHandlingTierOverride, WHContactTariffOverride, WHInbound, WHInboundCharge,
+                              WHInboundLine, WHLocation, WHOutbound, WHOutboundLine, WHProduct, WHStock, WHStockLedger,
+                              WHStockLotSnapshot, WHStockSnapshot,
                               )
 
 
@@ -113,8 +114,33 @@ class WHInboundChargeAdmin(admin.ModelAdmin):
                     )
 
 
+@admin.register(WHStockSnapshot)
+class WHStockSnapshotAdmin(admin.ModelAdmin):
+    list_display = ('id', 'company', 'period', 'snapshot_at', 'ledger_rows', 'created_at',
+                    )
+
+
+@admin.register(WHStockLotSnapshot)
+class WHStockLotSnapshotAdmin(admin.ModelAdmin):
+    list_display = ('id', 'snapshot', 'owner', 'measure', 'pallet_type', 'started_at', 'remaining',
+                    )
 
 
+@admin.register(WHBillingRun)
+class WHBillingRunAdmin(admin.ModelAdmin):
+    list_display = ('id', 'company', 'period', 'status', 'total_contacts', 'processed_contacts',
+                    'created_count', 'created_at', 'started_at', 'finished_at',
+                    )
+
 
+@admin.register(WHDashboardDailyRevenue)
+class WHDashboardDailyRevenueAdmin(admin.ModelAdmin):
+    list_display = ('id', 'company', 'contact', 'day', 'total', 'updated_at',
+                    )
 
 
+@admin.register(WHDashboardOwnerStats)
+class WHDashboardOwnerStatsAdmin(admin.ModelAdmin):
+    list_display = ('id', 'company', 'owner', 'pallets', 'area_m2', 'volume_m3', 'quantity',
+                    'last_movement_at', 'updated_at',
+                    )
@@ -0,0 +1,53 @@
+# Generated by Django 5.2.10 on 2026-10-17 12:17
+
+import abb.utils
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('app', '0039_companysettings_broker_invoice_start_number'),
+        ('att', '0074_remove_contact_invoice_reference_date_and_more'),
+        ('logistic', '0034_whoutboundcharge'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='WHStockSnapshot',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('uf', models.CharField(db_index=True, default=abb.utils.hex_uuid, max_length=36, unique=True)),
+                ('snapshot_at', models.DateTimeField()),
+                ('ledger_rows', models.PositiveIntegerField(default=0)),
+                ('created_at', models.DateTimeField(auto_now_add=True)),
+                ('company', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='company_wh_stock_snapshots', to='app.company')),
+                ('period', models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.SET_NULL, related_name='period_stock_snapshots', to='logistic.whbillingperiod')),
+            ],
+        ),
+        migrations.CreateModel(
+            name='WHStockLotSnapshot',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('measure', models.CharField(choices=[('delta_pallets', 'Pallets'), ('delta_quantity', 'Quantity'), ('delta_area_m2', 'm2'), ('delta_volume_m3', 'm3')], max_length=20)),
+                ('pallet_type', models.CharField(blank=True, choices=[('euro', 'Euro 120x80'), ('iso2', 'ISO2 120x100'), ('block', 'Block 120x120')], max_length=20, null=True)),
+                ('started_at', models.DateTimeField()),
+                ('remaining', models.DecimalField(decimal_places=3, max_digits=18)),
+                ('owner', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='owner_wh_stock_lot_snapshots', to='att.contact')),
+                ('snapshot', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='snapshot_lots', to='logistic.whstocksnapshot')),
+            ],
+        ),
+        migrations.AddIndex(
+            model_name='whstocksnapshot',
+            index=models.Index(fields=['company', '-snapshot_at'], name='logistic_wh_company_e51f45_idx'),
+        ),
+        migrations.AddConstraint(
+            model_name='whstocksnapshot',
+            constraint=models.UniqueConstraint(fields=('company', 'snapshot_at'), name='uniq_stock_snapshot_company_at'),
+        ),
+        migrations.AddIndex(
+            model_name='whstocklotsnapshot',
+            index=models.Index(fields=['snapshot', 'owner'], name='logistic_wh_snapsho_b83ac0_idx'),
+        ),
+    ]
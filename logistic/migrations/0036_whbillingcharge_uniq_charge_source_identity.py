@@ -0,0 +1,55 @@
+# Generated by Django 5.2.10 on 2026-10-17 12:18
+
+from django.db import migrations, models
+from django.db.models import Count
+
+
+def delete_duplicate_uninvoiced_charges(apps, schema_editor):
+    """
+    NULL pallet_type rows were never unique; keep one row per source identity
+    (invoiced rows first, then the newest) before the constraint is added.
+    """
+    WHBillingCharge = apps.get_model("logistic", "WHBillingCharge")
+    identity = [
+        "company_id", "contact_id", "billing_period_id", "charge_type",
+        "source_model", "source_uf", "unit_type", "pallet_type",
+    ]
+
+    duplicates = (
+        WHBillingCharge.objects
+        .filter(pallet_type__isnull=True)
+        .values(*identity)
+        .annotate(rows=Count("id"))
+        .filter(rows__gt=1)
+    )
+
+    for group in duplicates:
+        group.pop("rows")
+        ids = list(
+            WHBillingCharge.objects
+            .filter(**group)
+            .order_by("-invoiced", "-id")
+            .values_list("id", flat=True)
+        )
+        WHBillingCharge.objects.filter(id__in=ids[1:], invoiced=False).delete()
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('app', '0039_companysettings_broker_invoice_start_number'),
+        ('att', '0074_remove_contact_invoice_reference_date_and_more'),
+        ('logistic', '0035_whstocksnapshot_whstocklotsnapshot'),
+    ]
+
+    operations = [
+        migrations.RunPython(delete_duplicate_uninvoiced_charges, migrations.RunPython.noop),
+        migrations.RemoveConstraint(
+            model_name='whbillingcharge',
+            name='uniq_charge_company_contact_period_source_type_unit_pallet',
+        ),
+        migrations.AddConstraint(
+            model_name='whbillingcharge',
+            constraint=models.UniqueConstraint(fields=('company', 'contact', 'billing_period', 'charge_type', 'source_model', 'source_uf', 'unit_type', 'pallet_type'), name='uniq_charge_source_identity', nulls_distinct=False),
+        ),
+    ]
@@ -0,0 +1,55 @@
+# Generated by Django 5.2.10 on 2026-10-17 12:22
+
+from django.db import migrations, models
+from django.db.models import Count, Q
+
+
+def merge_duplicate_stock_rows(apps, schema_editor):
+    """
+    Rows with NULL owner / pallet_type were never unique; fold duplicates
+    into the oldest row before the constraint is added.
+    """
+    WHStock = apps.get_model("logistic", "WHStock")
+    identity = ["company_id", "owner_id", "product_id", "location_id", "pallet_type"]
+    measures = ["quantity", "pallets", "area_m2", "volume_m3"]
+
+    duplicates = (
+        WHStock.objects
+        .filter(Q(owner__isnull=True) | Q(pallet_type__isnull=True))
+        .values(*identity)
+        .annotate(rows=Count("id"))
+        .filter(rows__gt=1)
+    )
+
+    for group in duplicates:
+        group.pop("rows")
+        rows = list(WHStock.objects.filter(**group).order_by("id"))
+        keep = rows[0]
+
+        for row in rows[1:]:
+            for measure in measures:
+                setattr(keep, measure, getattr(keep, measure) + getattr(row, measure))
+
+        keep.save(update_fields=measures)
+        WHStock.objects.filter(id__in=[row.id for row in rows[1:]]).delete()
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('app', '0039_companysettings_broker_invoice_start_number'),
+        ('att', '0074_remove_contact_invoice_reference_date_and_more'),
+        ('logistic', '0037_whbillingrun'),
+    ]
+
+    operations = [
+        migrations.RunPython(merge_duplicate_stock_rows, migrations.RunPython.noop),
+        migrations.RemoveConstraint(
+            model_name='whstock',
+            name='uniq_stock_company_owner_product_location_pallet_type',
+        ),
+        migrations.AddConstraint(
+            model_name='whstock',
+            constraint=models.UniqueConstraint(fields=('company', 'owner', 'product', 'location', 'pallet_type'), name='uniq_stock_row_identity', nulls_distinct=False),
+        ),
+    ]
@@ -0,0 +1,29 @@
+# Generated by Django 5.2.10 on 2026-10-17 12:25
+
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('app', '0039_companysettings_broker_invoice_start_number'),
+        ('att', '0074_remove_contact_invoice_reference_date_and_more'),
+        ('logistic', '0038_whstock_uniq_stock_row_identity'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='whstockledger',
+            index=models.Index(fields=['company', 'created_at', 'id'], name='logistic_wh_company_cb13d6_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='whstockledger',
+            index=models.Index(fields=['company', 'owner', 'created_at'], name='logistic_wh_company_be95b1_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='whstockledger',
+            index=models.Index(fields=['company', 'location', 'created_at'], name='logistic_wh_company_026290_idx'),
+        ),
+    ]
@@ -0,0 +1,117 @@
+# Generated by Django 5.2.10 on 2026-10-17 12:27
+
+from decimal import Decimal
+from zoneinfo import ZoneInfo
+
+import abb.utils
+import django.db.models.deletion
+from django.db import migrations, models
+from django.db.models import Max, Sum
+from django.db.models.functions import TruncDate
+
+
+def backfill_dashboard_aggregates(apps, schema_editor):
+    WHBillingCharge = apps.get_model("logistic", "WHBillingCharge")
+    WHStock = apps.get_model("logistic", "WHStock")
+    WHStockLedger = apps.get_model("logistic", "WHStockLedger")
+    WHDashboardDailyRevenue = apps.get_model("logistic", "WHDashboardDailyRevenue")
+    WHDashboardOwnerStats = apps.get_model("logistic", "WHDashboardOwnerStats")
+
+    revenue = (
+        WHBillingCharge.objects
+        .annotate(day=TruncDate("created_at", tzinfo=ZoneInfo("Europe/Chisinau")))
+        .values("company_id", "contact_id", "day")
+        .annotate(value=Sum("total"))
+        .order_by()
+    )
+
+    WHDashboardDailyRevenue.objects.bulk_create(
+        [
+            WHDashboardDailyRevenue(
+                company_id=row["company_id"],
+                contact_id=row["contact_id"],
+                day=row["day"],
+                total=row["value"] or Decimal("0"),
+            )
+            for row in revenue.iterator()
+        ],
+        batch_size=1000,
+    )
+
+    measures = ("pallets", "area_m2", "volume_m3", "quantity")
+    stats = {}
+
+    for row in (
+        WHStock.objects
+        .filter(owner__isnull=False)
+        .values("company_id", "owner_id")
+        .annotate(**{measure: Sum(measure) for measure in measures})
+        .order_by()
+    ):
+        stats[(row["company_id"], row["owner_id"])] = WHDashboardOwnerStats(
+            company_id=row["company_id"],
+            owner_id=row["owner_id"],
+            **{measure: row[measure] or Decimal("0") for measure in measures},
+        )
+
+    for company_id, owner_id, last_movement_at in (
+        WHStockLedger.objects
+        .values("company_id", "owner_id")
+        .annotate(last=Max("created_at"))
+        .values_list("company_id", "owner_id", "last")
+        .order_by()
+    ):
+        stats.setdefault(
+            (company_id, owner_id),
+            WHDashboardOwnerStats(company_id=company_id, owner_id=owner_id),
+        ).last_movement_at = last_movement_at
+
+    WHDashboardOwnerStats.objects.bulk_create(stats.values(), batch_size=1000)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('app', '0039_companysettings_broker_invoice_start_number'),
+        ('att', '0074_remove_contact_invoice_reference_date_and_more'),
+        ('logistic', '0039_whstockledger_movement_indexes'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='WHDashboardDailyRevenue',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('uf', models.CharField(db_index=True, default=abb.utils.hex_uuid, max_length=36, unique=True)),
+                ('day', models.DateField()),
+                ('total', models.DecimalField(decimal_places=4, default=0, max_digits=18)),
+                ('updated_at', models.DateTimeField(auto_now=True)),
+                ('company', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='company_wh_dashboard_revenue', to='app.company')),
+                ('contact', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='contact_wh_dashboard_revenue', to='att.contact')),
+            ],
+            options={
+                'indexes': [models.Index(fields=['company', 'day'], name='logistic_wh_company_dc3606_idx')],
+                'constraints': [models.UniqueConstraint(fields=('company', 'contact', 'day'), name='uniq_dashboard_revenue_contact_day')],
+            },
+        ),
+        migrations.CreateModel(
+            name='WHDashboardOwnerStats',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('uf', models.CharField(db_index=True, default=abb.utils.hex_uuid, max_length=36, unique=True)),
+                ('pallets', models.DecimalField(decimal_places=3, default=0, max_digits=18)),
+                ('area_m2', models.DecimalField(decimal_places=3, default=0, max_digits=18)),
+                ('volume_m3', models.DecimalField(decimal_places=3, default=0, max_digits=18)),
+                ('quantity', models.DecimalField(decimal_places=3, default=0, max_digits=18)),
+                ('last_movement_at', models.DateTimeField(blank=True, null=True)),
+                ('updated_at', models.DateTimeField(auto_now=True)),
+                ('company', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='company_wh_dashboard_owner_stats', to='app.company')),
+                ('owner', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='owner_wh_dashboard_stats', to='att.contact')),
+            ],
+            options={
+                'indexes': [models.Index(fields=['company', '-pallets'], name='logistic_wh_company_835e48_idx'), models.Index(fields=['company', 'last_movement_at'], name='logistic_wh_company_f88bad_idx')],
+                'constraints': [models.UniqueConstraint(fields=('company', 'owner'), name='uniq_dashboard_owner_stats')],
+            },
+        ),
+        migrations.RunPython(backfill_dashboard_aggregates, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,47 @@
+# Generated by Django 5.2.10 on 2026-10-17 13:26
+
+from django.conf import settings
+from django.db import migrations, models
+from django.utils import timezone
+
+
+def fail_duplicate_active_runs(apps, schema_editor):
+    """
+    Keep the newest pending / running run of each period, fail the others.
+    """
+    WHBillingRun = apps.get_model('logistic', 'WHBillingRun')
+
+    seen = set()
+    duplicate_ids = []
+
+    for run_id, company_id, period_id in (
+        WHBillingRun.objects
+        .filter(status__in=['pending', 'running'])
+        .order_by('-created_at', '-id')
+        .values_list('id', 'company_id', 'period_id')
+    ):
+        if (company_id, period_id) in seen:
+            duplicate_ids.append(run_id)
+        seen.add((company_id, period_id))
+
+    WHBillingRun.objects.filter(id__in=duplicate_ids).update(
+        status='failed',
+        finished_at=timezone.now(),
+    )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('app', '0041_document_counter'),
+        ('logistic', '0040_wms_dashboard_aggregates'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.RunPython(fail_duplicate_active_runs, migrations.RunPython.noop),
+        migrations.AddConstraint(
+            model_name='whbillingrun',
+            constraint=models.UniqueConstraint(condition=models.Q(('status__in', ['pending', 'running'])), fields=('company', 'period'), name='unique_active_billing_run_per_period'),
+        ),
+    ]
@@ -138,7 +138,9 @@ class WHStock(models.Model):
         constraints = [
             models.UniqueConstraint(
                     fields=["company", "owner", "product", "location", "pallet_type"],
-                    name="uniq_stock_company_owner_product_location_pallet_type"
+                    # stock posting inserts rows with ON CONFLICT DO NOTHING, NULLs must collide
+                    nulls_distinct=False,
+                    name="uniq_stock_row_identity"
                 ),
             models.CheckConstraint(
                     condition=(
@@ -237,6 +239,76 @@ class WHStockLedger(models.Model):
             models.Index(fields=["company", "product", "created_at"]),
             models.Index(fields=["company", "source_type", "source_uf"]),
             models.Index(fields=["company", "product", "location"]),
+            # movements list / export: keyset on (created_at, id) per filter
+            models.Index(fields=["company", "created_at", "id"]),
+            models.Index(fields=["company", "owner", "created_at"]),
+            models.Index(fields=["company", "location", "created_at"]),
+        ]
+
+
+class WHStockSnapshot(models.Model):
+    """
+    Open FIFO lots of the company ledger at snapshot_at.
+    Ledger rows with created_at < snapshot_at are folded into the lots,
+    storage billing replays only the rows after it.
+    """
+    uf = models.CharField(max_length=36, default=hex_uuid, db_index=True, unique=True)
+    company = models.ForeignKey("app.Company", on_delete=models.CASCADE, related_name="company_wh_stock_snapshots")
+
+    period = models.ForeignKey(
+        "WHBillingPeriod", on_delete=models.SET_NULL,
+        null=True, blank=True, related_name="period_stock_snapshots"
+    )
+
+    snapshot_at = models.DateTimeField()
+    ledger_rows = models.PositiveIntegerField(default=0)  # rows replayed to build it
+
+    created_at = models.DateTimeField(auto_now_add=True)
+
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(
+                fields=["company", "snapshot_at"],
+                name="uniq_stock_snapshot_company_at",
+            )
+        ]
+        indexes = [
+            models.Index(fields=["company", "-snapshot_at"]),
+        ]
+
+    def __str__(self):
+        return f"{self.company_id}@{self.snapshot_at}"
+
+
+class WHStockLotSnapshot(models.Model):
+    """
+    One open FIFO lot of a snapshot.
+    measure is the ledger delta field; pallet lots are kept per pallet_type,
+    quantity / m2 / m3 lots span all pallet types of the owner.
+    """
+    class Measure(models.TextChoices):
+        PALLETS = "delta_pallets", "Pallets"
+        QUANTITY = "delta_quantity", "Quantity"
+        AREA_M2 = "delta_area_m2", "m2"
+        VOLUME_M3 = "delta_volume_m3", "m3"
+
+    snapshot = models.ForeignKey("WHStockSnapshot", on_delete=models.CASCADE, related_name="snapshot_lots")
+    owner = models.ForeignKey("att.Contact", on_delete=models.CASCADE, related_name="owner_wh_stock_lot_snapshots")
+
+    measure = models.CharField(max_length=20, choices=Measure.choices)
+    pallet_type = models.CharField(
+        max_length=20,
+        choices=WHPalletType.choices,
+        null=True,
+        blank=True
+    )
+
+    started_at = models.DateTimeField()
+    remaining = models.DecimalField(max_digits=18, decimal_places=3)
+
+    class Meta:
+        indexes = [
+            models.Index(fields=["snapshot", "owner"]),
         ]
 
 
@@ -748,6 +820,59 @@ class WHBillingPeriod(models.Model):
         ]
 
 
+class WHBillingRun(models.Model):
+    """
+    One asynchronous charge generation for a billing period (see logistic.tasks).
+    """
+    class Status(models.TextChoices):
+        PENDING = "pending", "Pending"
+        RUNNING = "running", "Running"
+        COMPLETED = "completed", "Completed"
+        FAILED = "failed", "Failed"
+
+    uf = models.CharField(max_length=36, default=hex_uuid, db_index=True, unique=True)
+    company = models.ForeignKey("app.Company", on_delete=models.CASCADE, related_name="company_wh_billing_runs")
+    period = models.ForeignKey("WHBillingPeriod", on_delete=models.CASCADE, related_name="period_billing_runs")
+
+    contact_ids = models.JSONField(null=True, blank=True)  # None = all contacts
+    status = models.CharField(max_length=20, choices=Status.choices, default=Status.PENDING)
+    task_id = models.CharField(max_length=255, null=True, blank=True)
+
+    total_contacts = models.PositiveIntegerField(default=0)
+    processed_contacts = models.PositiveIntegerField(default=0)
+    created_count = models.PositiveIntegerField(default=0)
+
+    stage_timings = models.JSONField(default=dict, blank=True)  # stage -> seconds
+    errors = models.JSONField(default=list, blank=True)
+
+    created_by = models.ForeignKey(
+        User, on_delete=models.SET_NULL,
+        null=True, blank=True, related_name="created_by_wh_billing_runs"
+    )
+    created_at = models.DateTimeField(auto_now_add=True)
+    started_at = models.DateTimeField(null=True, blank=True)
+    finished_at = models.DateTimeField(null=True, blank=True)
+
+    class Meta:
+        indexes = [
+            models.Index(fields=["company", "period"]),
+            models.Index(fields=["company", "status"]),
+        ]
+        constraints = [
+            models.UniqueConstraint(
+                fields=["company", "period"],
+                condition=Q(status__in=["pending", "running"]),
+                name="unique_active_billing_run_per_period",
+            ),
+        ]
+
+    @property
+    def progress(self):
+        if not self.total_contacts:
+            return 100 if self.status == self.Status.COMPLETED else 0
+        return int(self.processed_contacts * 100 / self.total_contacts)
+
+
 class WHBillingCharge(models.Model):
 
     class Type(models.TextChoices):
@@ -829,7 +954,9 @@ class WHBillingCharge(models.Model):
                         "unit_type",
                         "pallet_type",
                     ],
-                    name="uniq_charge_company_contact_period_source_type_unit_pallet",
+                    # NULL pallet_type must collide too, the billing engine upserts on it
+                    nulls_distinct=False,
+                    name="uniq_charge_source_identity",
                 )
         ]
         indexes = [
@@ -900,4 +1027,64 @@ class WHBillingInvoiceLine(models.Model):
             models.Index(fields=["invoice"])
         ]
 
-###### END WH BILLING ######
\ No newline at end of file
+###### END WH BILLING ######
+
+
+###### WH DASHBOARD AGGREGATES ######
+
+class WHDashboardDailyRevenue(models.Model):
+    """
+    Sum of WHBillingCharge.total per contact and day (Europe/Chisinau),
+    rebuilt for the affected contacts whenever charges are regenerated.
+    """
+    uf = models.CharField(max_length=36, default=hex_uuid, db_index=True, unique=True)
+    company = models.ForeignKey("app.Company", on_delete=models.CASCADE, related_name="company_wh_dashboard_revenue")
+    contact = models.ForeignKey("att.Contact", on_delete=models.CASCADE, related_name="contact_wh_dashboard_revenue")
+
+    day = models.DateField()
+    total = models.DecimalField(max_digits=18, decimal_places=4, default=0)
+
+    updated_at = models.DateTimeField(auto_now=True)
+
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(
+                fields=["company", "contact", "day"],
+                name="uniq_dashboard_revenue_contact_day",
+            )
+        ]
+        indexes = [
+            models.Index(fields=["company", "day"]),
+        ]
+
+
+class WHDashboardOwnerStats(models.Model):
+    """
+    Current stock totals and last ledger movement per owner,
+    kept in step with WHStock by post_stock_movements.
+    """
+    uf = models.CharField(max_length=36, default=hex_uuid, db_index=True, unique=True)
+    company = models.ForeignKey("app.Company", on_delete=models.CASCADE, related_name="company_wh_dashboard_owner_stats")
+    owner = models.ForeignKey("att.Contact", on_delete=models.CASCADE, related_name="owner_wh_dashboard_stats")
+
+    pallets = models.DecimalField(max_digits=18, decimal_places=3, default=0)
+    area_m2 = models.DecimalField(max_digits=18, decimal_places=3, default=0)
+    volume_m3 = models.DecimalField(max_digits=18, decimal_places=3, default=0)
+    quantity = models.DecimalField(max_digits=18, decimal_places=3, default=0)
+
+    last_movement_at = models.DateTimeField(null=True, blank=True)
+    updated_at = models.DateTimeField(auto_now=True)
+
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(
+                fields=["company", "owner"],
+                name="uniq_dashboard_owner_stats",
+            )
+        ]
+        indexes = [
+            models.Index(fields=["company", "-pallets"]),
+            models.Index(fields=["company", "last_movement_at"]),
+        ]
+
+###### END WH DASHBOARD AGGREGATES ######
@@ -2,7 +2,7 @@ from django.db.models import Sum
 from rest_framework import serializers
 
 from abb.utils import get_user_company
-from logistic.models import WHBillingCharge, WHBillingInvoice, WHBillingInvoiceLine, WHBillingPeriod
+from logistic.models import WHBillingCharge, WHBillingInvoice, WHBillingInvoiceLine, WHBillingPeriod, WHBillingRun
 
 
 class WHBillingPeriodSerializer(serializers.ModelSerializer):
@@ -127,6 +127,29 @@ class WHBillingInvoiceSerializer(serializers.ModelSerializer):
         ]
 
 
+class WHBillingRunSerializer(serializers.ModelSerializer):
+    period_uf = serializers.CharField(source="period.uf", read_only=True)
+    progress = serializers.IntegerField(read_only=True)
+
+    class Meta:
+        model = WHBillingRun
+        fields = [
+            "uf",
+            "period_uf",
+            "status",
+            "progress",
+            "total_contacts",
+            "processed_contacts",
+            "created_count",
+            "stage_timings",
+            "errors",
+            "created_at",
+            "started_at",
+            "finished_at",
+        ]
+        read_only_fields = fields
+
+
 class WHIssueBillingDocumentsSerializer(serializers.Serializer):
     period = serializers.CharField()
     contacts = serializers.ListField(
@@ -1,6 +1,7 @@
 from decimal import Decimal
+from itertools import groupby
+from operator import attrgetter
 from django.db import transaction
-from django.db.models import Sum
 from django.utils.translation import gettext as _
 
 from logistic.models import (
@@ -9,19 +10,50 @@ from logistic.models import (
     WHBillingInvoiceLine,
     WHInboundCharge,
 )
+from logistic.services.wms_billing_engine import BULK_BATCH_SIZE
 
 
-def _charge_description(charge, period):
-    period_start = period.start_date.strftime("%d-%m-%Y") if period and period.start_date else ""
-    period_end = period.end_date.strftime("%d-%m-%Y") if period and period.end_date else ""
+def _inbound_charges_by_uf(charges):
+    """
+    WHInboundCharge rows referenced by inbound_charge billing charges, keyed by uf.
+    """
+    ufs = {
+        charge.source_uf
+        for charge in charges
+        if charge.source_model == "inbound_charge"
+    }
 
-    if charge.source_model == "inbound_charge":
-        inbound_charge = (
+    if not ufs:
+        return {}
+
+    return {
+        inbound_charge.uf: inbound_charge
+        for inbound_charge in (
             WHInboundCharge.objects
-            .filter(uf=charge.source_uf)
+            .filter(uf__in=ufs)
             .select_related("inbound")
-            .first()
         )
+    }
+
+
+def _charge_description(charge, period, inbound_charges=None):
+    """
+    inbound_charges: optional {uf: WHInboundCharge} from _inbound_charges_by_uf,
+    otherwise the referenced inbound charge is queried.
+    """
+    period_start = period.start_date.strftime("%d-%m-%Y") if period and period.start_date else ""
+    period_end = period.end_date.strftime("%d-%m-%Y") if period and period.end_date else ""
+
+    if charge.source_model == "inbound_charge":
+        if inbound_charges is not None:
+            inbound_charge = inbound_charges.get(charge.source_uf)
+        else:
+            inbound_charge = (
+                WHInboundCharge.objects
+                .filter(uf=charge.source_uf)
+                .select_related("inbound")
+                .first()
+            )
 
         if inbound_charge:
             parts = [inbound_charge.label or charge.charge_type]
@@ -64,72 +96,80 @@ def issue_billing_documents_for_period(*, company, period, contact_ids=None):
     - creates WHBillingInvoice + WHBillingInvoiceLine
     - marks charges as invoiced=True
 
+    All uninvoiced charges are read once and grouped by contact in memory;
+    invoices, lines and line<->charge links are bulk created.
+
     Later you can rename these models to Bill/BillLine.
     """
 
-    period_start = period.start_date.strftime("%d-%m-%Y") if period and period.start_date else ""
-    period_end = period.end_date.strftime("%d-%m-%Y") if period and period.end_date else ""
-
     charges = WHBillingCharge.objects.filter(
         company=company,
         billing_period=period,
         invoiced=False,
-    ).select_related("contact", "product", "location")
+    ).select_related("product", "location").order_by("contact_id", "id")
 
     if contact_ids:
         charges = charges.filter(contact_id__in=contact_ids)
 
-    contact_id_list = list(
-        charges.values_list("contact_id", flat=True).distinct()
-    )
-
-    created_documents = []
+    charges = list(charges)
 
-    for contact_id in contact_id_list:
-        contact_charges = charges.filter(contact_id=contact_id)
+    if not charges:
+        return []
 
-        if not contact_charges.exists():
-            continue
+    inbound_charges = _inbound_charges_by_uf(charges)
 
-        total = (
-            contact_charges.aggregate(total_sum=Sum("total"))["total_sum"]
-            or Decimal("0")
-        ).quantize(Decimal("0.01"))
+    grouped = [
+        (contact_id, list(contact_charges))
+        for contact_id, contact_charges in groupby(charges, key=attrgetter("contact_id"))
+    ]
 
-        first_charge = contact_charges.first()
-
-        document = WHBillingInvoice.objects.create(
+    documents = WHBillingInvoice.objects.bulk_create([
+        WHBillingInvoice(
             company=company,
             contact_id=contact_id,
             period=period,
-            total_amount=total,
+            total_amount=sum(
+                (charge.total for charge in contact_charges),
+                Decimal("0"),
+            ).quantize(Decimal("0.01")),
             status="draft",
         )
+        for contact_id, contact_charges in grouped
+    ])
 
-        for charge in contact_charges:
-            description_parts = [f"{charge.charge_type}"]
+    lines = []
+    line_charges = []
 
-            if charge.product_id and charge.product:
-                description_parts.append(f"{_('period')}: {charge.product.name}")
+    for document, (_contact_id, contact_charges) in zip(documents, grouped):
+        for charge in contact_charges:
+            lines.append(
+                WHBillingInvoiceLine(
+                    invoice=document,
+                    charge_type=charge.charge_type,
+                    description=_charge_description(charge, period, inbound_charges),
+                    quantity=charge.quantity,
+                    unit_price=charge.unit_price,
+                    total=charge.total,
+                )
+            )
+            line_charges.append(charge)
 
-            if charge.location_id and charge.location:
-                description_parts.append(f"{_('location')}: {charge.location.code}")
+    lines = WHBillingInvoiceLine.objects.bulk_create(lines, batch_size=BULK_BATCH_SIZE)
 
-            description_parts.append(
-                f"{_('period')}: {period_start} → {period_end}"
-            )
+    LineCharge = WHBillingInvoiceLine.charges.through
+    LineCharge.objects.bulk_create(
+        [
+            LineCharge(whbillinginvoiceline_id=line.pk, whbillingcharge_id=charge.pk)
+            for line, charge in zip(lines, line_charges)
+        ],
+        batch_size=BULK_BATCH_SIZE,
+    )
 
-            line = WHBillingInvoiceLine.objects.create(
-                invoice=document,
-                charge_type=charge.charge_type,
-                description=_charge_description(charge, period),
-                quantity=charge.quantity,
-                unit_price=charge.unit_price,
-                total=charge.total,
-            )
-            line.charges.add(charge)
+    charge_ids = [charge.pk for charge in charges]
 
-        contact_charges.update(invoiced=True)
-        created_documents.append(document)
+    for start in range(0, len(charge_ids), BULK_BATCH_SIZE):
+        WHBillingCharge.objects.filter(
+            pk__in=charge_ids[start:start + BULK_BATCH_SIZE]
+        ).update(invoiced=True)
 
-    return created_documents
\ No newline at end of file
+    return documents
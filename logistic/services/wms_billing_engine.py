@@ -1,7 +1,10 @@
+from collections import defaultdict, deque
 from decimal import Decimal
 from datetime import timedelta
+from itertools import groupby
 from math import ceil
-from django.db.models import F, Q
+from operator import itemgetter
+from django.db.models import F, Prefetch, Q
 from django.db import transaction
 from django.utils import timezone
 
@@ -15,14 +18,22 @@ from logistic.models import (
     WHOutboundLine,
     WHPalletType,
     WHStockLedger,
+    WHStockLotSnapshot,
+    WHStockSnapshot,
     WHStorageBillingMode,
     WHTariff,
     WHContactTariffOverride,
+    WHContactTariffHandlingTierOverride,
+    WHTariffHandlingTier,
     WHTierCalculationMode,
 )
+from logistic.services.wms_dashboard import refresh_contact_revenue, revenue_days_from
 
 SECONDS_PER_DAY = Decimal("86400")
 
+LEDGER_CHUNK_SIZE = 5000
+BULK_BATCH_SIZE = 1000
+
 MEASURE_FIELD_MAP = {
     WHStorageBillingMode.PALLET: "delta_pallets",
     WHStorageBillingMode.UNIT: "delta_quantity",
@@ -30,6 +41,35 @@ MEASURE_FIELD_MAP = {
     WHStorageBillingMode.M3: "delta_volume_m3",
 }
 
+# position of each measure in the storage ledger values_list rows
+LEDGER_FIELD_INDEX = {
+    "delta_pallets": 3,
+    "delta_quantity": 4,
+    "delta_area_m2": 5,
+    "delta_volume_m3": 6,
+}
+
+STORAGE_CHARGES = {"charge_type": WHBillingCharge.Type.STORAGE}
+HANDLING_CHARGES = {
+    "charge_type__in": [
+        WHBillingCharge.Type.HANDLING_LOADING,
+        WHBillingCharge.Type.HANDLING_UNLOADING,
+    ],
+}
+INBOUND_EXTRA_CHARGES = {"source_model": "inbound_charge"}
+
+# source identity of a charge, matches uniq_charge_source_identity
+CHARGE_UNIQUE_FIELDS = [
+    "company",
+    "contact",
+    "billing_period",
+    "charge_type",
+    "source_model",
+    "source_uf",
+    "unit_type",
+    "pallet_type",
+]
+
 UNIT_TYPE_MAP = {
     WHStorageBillingMode.PALLET: "pallet_day",
     WHStorageBillingMode.UNIT: "unit_day",
@@ -38,61 +78,157 @@ UNIT_TYPE_MAP = {
 }
 
 
-def _resolve_tariff(company, contact, period):
-    default = (
-        WHTariff.objects
-        .filter(company=company, is_active=True)
-        .order_by("-created_at")
-        .first()
-    )
+class BillingTariffResolver:
+    """
+    Tariff lookups for one billing run (company + period).
 
-    if not default:
-        raise ValueError("No active warehouse tariff found")
+    The active default tariff, every override overlapping the period and all
+    their handling tiers are loaded once on first use; storage and handling
+    resolutions are memoized per contact / (contact, fee_type, unit).
+    Pass one instance to every generator of the run.
+    """
 
-    override = (
-        WHContactTariffOverride.objects
-        .filter(
-            company=company,
-            contact=contact,
-            is_active=True,
-            period_start__lte=period.end_date,
+    def __init__(self, company, period, contact_ids=None):
+        self.company = company
+        self.period = period
+        self.contact_ids = contact_ids
+        self._loaded = False
+        self._default = None
+        self._default_tiers = {}
+        self._overrides = {}
+        self._override_tiers = {}
+        self._storage = {}
+        self._handling = {}
+
+    def _load(self):
+        if self._loaded:
+            return
+
+        self._default = (
+            WHTariff.objects
+            .filter(company=self.company, is_active=True)
+            .order_by("-created_at")
+            .prefetch_related(
+                Prefetch(
+                    "handling_tiers",
+                    queryset=WHTariffHandlingTier.objects.order_by("min_quantity", "order"),
+                )
+            )
+            .first()
         )
-        .filter(
-            Q(period_end__isnull=True) | Q(period_end__gte=period.start_date)
+
+        if not self._default:
+            raise ValueError("No active warehouse tariff found")
+
+        for tier in self._default.handling_tiers.all():
+            self._default_tiers.setdefault((tier.fee_type, tier.unit), []).append(tier)
+
+        overrides = (
+            WHContactTariffOverride.objects
+            .filter(
+                company=self.company,
+                is_active=True,
+                period_start__lte=self.period.end_date,
+            )
+            .filter(
+                Q(period_end__isnull=True) | Q(period_end__gte=self.period.start_date)
+            )
+            .order_by("contact_id", "-period_start", "-created_at")
+            .prefetch_related(
+                Prefetch(
+                    "handling_tier_overrides",
+                    queryset=WHContactTariffHandlingTierOverride.objects.order_by(
+                        "min_quantity", "order"
+                    ),
+                )
+            )
         )
-        .order_by("-period_start", "-created_at")
-        .first()
-    )
 
-    storage_mode = (
-        override.storage_mode
-        if override and override.storage_mode
-        else default.storage_mode
-    )
+        if self.contact_ids:
+            overrides = overrides.filter(contact_id__in=self.contact_ids)
 
-    def pick_price(field):
-        if override and getattr(override, field) is not None:
-            return getattr(override, field)
-        return getattr(default, field)
-
-    prices = {
-        WHStorageBillingMode.UNIT: Decimal(pick_price("storage_per_unit_per_day") or 0),
-        WHStorageBillingMode.M2: Decimal(pick_price("storage_per_m2_per_day") or 0),
-        WHStorageBillingMode.M3: Decimal(pick_price("storage_per_m3_per_day") or 0),
-        WHStorageBillingMode.PALLET: {
-            WHPalletType.EURO: Decimal(pick_price("storage_per_euro_pallet_per_day") or 0),
-            WHPalletType.ISO2: Decimal(pick_price("storage_per_iso2_pallet_per_day") or 0),
-            WHPalletType.BLOCK: Decimal(pick_price("storage_per_block_pallet_per_day") or 0),
-        },
-    }
+        for override in overrides:
+            # first one per contact wins, same as .order_by(...).first()
+            if override.contact_id in self._overrides:
+                continue
+
+            self._overrides[override.contact_id] = override
+
+            for tier in override.handling_tier_overrides.all():
+                self._override_tiers.setdefault(
+                    (override.contact_id, tier.fee_type, tier.unit), []
+                ).append(tier)
+
+        self._loaded = True
+
+    def storage(self, contact_id):
+        """
+        (storage_mode, prices, min_days) for the contact.
+        """
+        if contact_id in self._storage:
+            return self._storage[contact_id]
+
+        self._load()
+        default = self._default
+        override = self._overrides.get(contact_id)
+
+        storage_mode = (
+            override.storage_mode
+            if override and override.storage_mode
+            else default.storage_mode
+        )
 
-    min_days = (
-        override.storage_min_days
-        if override and override.storage_min_days is not None
-        else default.storage_min_days
-    ) or 1
+        def pick_price(field):
+            if override and getattr(override, field) is not None:
+                return getattr(override, field)
+            return getattr(default, field)
+
+        prices = {
+            WHStorageBillingMode.UNIT: Decimal(pick_price("storage_per_unit_per_day") or 0),
+            WHStorageBillingMode.M2: Decimal(pick_price("storage_per_m2_per_day") or 0),
+            WHStorageBillingMode.M3: Decimal(pick_price("storage_per_m3_per_day") or 0),
+            WHStorageBillingMode.PALLET: {
+                WHPalletType.EURO: Decimal(pick_price("storage_per_euro_pallet_per_day") or 0),
+                WHPalletType.ISO2: Decimal(pick_price("storage_per_iso2_pallet_per_day") or 0),
+                WHPalletType.BLOCK: Decimal(pick_price("storage_per_block_pallet_per_day") or 0),
+            },
+        }
+
+        min_days = (
+            override.storage_min_days
+            if override and override.storage_min_days is not None
+            else default.storage_min_days
+        ) or 1
+
+        resolved = (storage_mode, prices, int(min_days))
+        self._storage[contact_id] = resolved
+        return resolved
+
+    def handling(self, contact_id, fee_type, unit):
+        """
+        (tier_mode, tiers) for the contact. Override tiers for (fee_type, unit)
+        replace the default tariff tiers entirely when present.
+        """
+        key = (contact_id, fee_type, unit)
+
+        if key in self._handling:
+            return self._handling[key]
+
+        self._load()
+        default = self._default
+        override = self._overrides.get(contact_id)
+
+        tier_mode = (
+            override.handling_tier_mode
+            if override and override.handling_tier_mode
+            else default.handling_tier_mode
+        )
+
+        tiers = self._override_tiers.get(key) or self._default_tiers.get((fee_type, unit), [])
 
-    return storage_mode, prices, int(min_days)
+        resolved = (tier_mode, tiers)
+        self._handling[key] = resolved
+        return resolved
 
 
 def _period_bounds(period):
@@ -113,64 +249,6 @@ def _days_between(start, end):
     return ceil(seconds / SECONDS_PER_DAY)
 
 
-def _get_tariff_context(company, contact, period):
-    default = (
-        WHTariff.objects
-        .filter(company=company, is_active=True)
-        .order_by("-created_at")
-        .first()
-    )
-
-    if not default:
-        raise ValueError("No active warehouse tariff found")
-
-    override = (
-        WHContactTariffOverride.objects
-        .filter(
-            company=company,
-            contact=contact,
-            is_active=True,
-            period_start__lte=period.end_date,
-        )
-        .filter(
-            Q(period_end__isnull=True) | Q(period_end__gte=period.start_date)
-        )
-        .order_by("-period_start", "-created_at")
-        .first()
-    )
-
-    return default, override
-
-
-def _resolve_handling_config(company, contact, period, fee_type, unit):
-    default, override = _get_tariff_context(company, contact, period)
-
-    tier_mode = (
-        override.handling_tier_mode
-        if override and override.handling_tier_mode
-        else default.handling_tier_mode
-    )
-
-    override_tiers_qs = None
-    if override:
-        override_tiers_qs = override.handling_tier_overrides.filter(
-            fee_type=fee_type,
-            unit=unit,
-        ).order_by("min_quantity", "order")
-
-    if override_tiers_qs and override_tiers_qs.exists():
-        tiers = list(override_tiers_qs)
-    else:
-        tiers = list(
-            default.handling_tiers.filter(
-                fee_type=fee_type,
-                unit=unit,
-            ).order_by("min_quantity", "order")
-        )
-
-    return tier_mode, tiers
-
-
 def _tier_matches(quantity, tier):
     if quantity < tier.min_quantity:
         return False
@@ -215,136 +293,256 @@ def _calculate_handling_total(quantity, tiers, tier_mode):
     return total.quantize(Decimal("0.0001"))
 
 
-def _calculate_billed_total(rows, measure_field, start_dt, cutoff, min_days):
+class _FifoLots:
     """
-    FIFO lot billing.
+    FIFO lot state for one billing dimension (owner, or owner + pallet_type).
 
-    rows must already be filtered to the exact billing dimension:
-    - owner only for unit/m2/m3
-    - owner + pallet_type for pallet mode
+    Rows must be fed in (created_at, id) order. Movements before the period
+    only build/consume lots, movements inside the period are billed when a
+    lot is consumed, and close() bills whatever is still open at cutoff.
     """
-    lots = []
 
-    before_period = rows.filter(created_at__lt=start_dt)
+    def __init__(self, start_dt, min_days):
+        self.start_dt = start_dt
+        self.min_days = min_days
+        self.lots = deque()
+        self.billed_total = Decimal("0")
 
-    for row in before_period:
-        delta = Decimal(getattr(row, measure_field) or 0)
+    def feed(self, created_at, delta):
+        delta = Decimal(delta or 0)
 
         if delta > 0:
-            lots.append({
-                "qty": delta,
+            self.lots.append({
                 "remaining": delta,
-                "start": row.created_at,
+                "started_at": created_at,
+                # lots carried into the period are billed from period start
+                "bill_start": max(created_at, self.start_dt),
             })
-        elif delta < 0:
-            to_remove = abs(delta)
+            return
 
-            for lot in lots:
-                if lot["remaining"] <= 0:
-                    continue
+        if delta == 0:
+            return
 
-                consume = min(lot["remaining"], to_remove)
-                lot["remaining"] -= consume
-                to_remove -= consume
+        to_remove = abs(delta)
+        in_period = created_at >= self.start_dt
 
-                if to_remove <= 0:
-                    break
+        while self.lots and to_remove > 0:
+            lot = self.lots[0]
+            consume = min(lot["remaining"], to_remove)
 
-    for lot in lots:
-        if lot["remaining"] > 0 and lot["start"] < start_dt:
-            lot["bill_start"] = start_dt
-        else:
-            lot["bill_start"] = lot["start"]
+            if in_period:
+                days = max(_days_between(lot["bill_start"], created_at), self.min_days)
+                self.billed_total += consume * Decimal(days)
 
-    in_period = rows.filter(created_at__gte=start_dt)
+            lot["remaining"] -= consume
+            to_remove -= consume
 
-    billed_total = Decimal("0")
+            if lot["remaining"] <= 0:
+                self.lots.popleft()
 
-    for row in in_period:
-        if row.created_at >= cutoff:
-            break
+    def close(self, cutoff):
+        billed_total = self.billed_total
 
-        delta = Decimal(getattr(row, measure_field) or 0)
+        for lot in self.lots:
+            days = max(_days_between(lot["bill_start"], cutoff), self.min_days)
+            billed_total += lot["remaining"] * Decimal(days)
 
-        if delta > 0:
-            lots.append({
-                "qty": delta,
-                "remaining": delta,
-                "start": row.created_at,
-                "bill_start": row.created_at,
-            })
+        return billed_total.quantize(Decimal("0.001"))
 
-        elif delta < 0:
-            to_remove = abs(delta)
 
-            for lot in lots:
-                if lot["remaining"] <= 0:
-                    continue
+def _storage_dimensions(storage_mode, prices, start_dt, min_days):
+    """
+    Billing dimensions for one owner: (pallet_type, measure_field, price, fifo).
+    pallet_type is None when the dimension covers all rows of the owner.
+    """
+    if storage_mode == WHStorageBillingMode.PALLET:
+        pallet_prices = prices.get(WHStorageBillingMode.PALLET, {})
+        dimensions = []
+
+        for pallet_type in (
+            WHPalletType.EURO,
+            WHPalletType.ISO2,
+            WHPalletType.BLOCK,
+        ):
+            price = Decimal(pallet_prices.get(pallet_type) or 0)
+            if price <= 0:
+                continue
 
-                consume = min(lot["remaining"], to_remove)
+            dimensions.append(
+                (pallet_type, "delta_pallets", price, _FifoLots(start_dt, min_days))
+            )
 
-                days = _days_between(lot["bill_start"], row.created_at)
-                days = max(days, min_days)
+        return dimensions
 
-                billed_total += Decimal(consume) * Decimal(days)
+    measure_field = MEASURE_FIELD_MAP.get(storage_mode)
+    price = Decimal(prices.get(storage_mode) or 0)
 
-                lot["remaining"] -= consume
-                to_remove -= consume
+    if not measure_field or price <= 0:
+        return []
 
-                if to_remove <= 0:
-                    break
+    return [(None, measure_field, price, _FifoLots(start_dt, min_days))]
 
-    for lot in lots:
-        if lot["remaining"] <= 0:
-            continue
 
-        days = _days_between(lot["bill_start"], cutoff)
-        days = max(days, min_days)
+def _clear_uninvoiced_charges(*, company, period, contact_ids, charge_filter, locked_message):
+    """
+    Refuse to regenerate when any matching charge is invoiced, otherwise delete
+    the matching uninvoiced charges.
+    """
+    qs = WHBillingCharge.objects.filter(
+        company=company,
+        billing_period=period,
+        **charge_filter,
+    )
 
-        billed_total += Decimal(lot["remaining"]) * Decimal(days)
+    if contact_ids:
+        qs = qs.filter(contact_id__in=contact_ids)
 
-    return billed_total.quantize(Decimal("0.001"))
+    if qs.filter(invoiced=True).exists():
+        raise ValueError(locked_message)
 
+    qs.filter(invoiced=False).delete()
+
+
+CHARGE_LOCKS = (
+    (STORAGE_CHARGES, "Cannot regenerate storage charges because some storage charges are already billed."),
+    (HANDLING_CHARGES, "Cannot regenerate handling charges because some handling charges are already billed."),
+    (INBOUND_EXTRA_CHARGES, "Cannot regenerate inbound extra charges because some charges are already billed."),
+)
 
-@transaction.atomic
-def regenerate_storage_billing_for_period(*, company, period, contact_ids=None):
-    locked_qs = WHBillingCharge.objects.filter(
-        company=company,
-        billing_period=period,
-        charge_type=WHBillingCharge.Type.STORAGE,
-        invoiced=True,
-    )
+
+def check_billing_charges_unlocked(*, company, period, contact_ids=None):
+    """
+    Lock checks of clear_all_billing_charges_for_period, without deleting.
+    """
+    qs = WHBillingCharge.objects.filter(company=company, billing_period=period, invoiced=True)
 
     if contact_ids:
-        locked_qs = locked_qs.filter(contact_id__in=contact_ids)
+        qs = qs.filter(contact_id__in=contact_ids)
 
-    if locked_qs.exists():
-        raise ValueError(
-            "Cannot regenerate storage charges because some storage charges are already billed."
+    for charge_filter, locked_message in CHARGE_LOCKS:
+        if qs.filter(**charge_filter).exists():
+            raise ValueError(locked_message)
+
+
+@transaction.atomic
+def clear_all_billing_charges_for_period(*, company, period, contact_ids=None):
+    """
+    Lock checks and cleanup of regenerate_all_billing_charges_for_period,
+    for callers that run the generators separately (see wms_billing_runs).
+    """
+    for charge_filter, locked_message in CHARGE_LOCKS:
+        _clear_uninvoiced_charges(
+            company=company,
+            period=period,
+            contact_ids=contact_ids,
+            charge_filter=charge_filter,
+            locked_message=locked_message,
         )
 
-    qs = WHBillingCharge.objects.filter(
-        company=company,
-        billing_period=period,
-        charge_type=WHBillingCharge.Type.STORAGE,
-        invoiced=False,
+
+def _billing_charge(**fields):
+    """
+    Unsaved WHBillingCharge for bulk writes; bulk_create skips save(),
+    which normally computes total.
+    """
+    charge = WHBillingCharge(pallet_type=None, invoiced=False, **fields)
+    charge.total = charge.quantity * charge.unit_price
+    return charge
+
+
+def _upsert_billing_charges(charges, *, update_fields):
+    """
+    Insert charges, or update the existing row with the same source identity
+    (CHARGE_UNIQUE_FIELDS). Returns the uf of every stored row, in input order.
+    """
+    if not charges:
+        return []
+
+    WHBillingCharge.objects.bulk_create(
+        charges,
+        batch_size=BULK_BATCH_SIZE,
+        update_conflicts=True,
+        unique_fields=CHARGE_UNIQUE_FIELDS,
+        update_fields=update_fields,
     )
 
-    if contact_ids:
-        qs = qs.filter(contact_id__in=contact_ids)
+    # conflicting rows keep their original uf, read back what was stored
+    uf_by_id = {}
+    ids = [charge.pk for charge in charges]
+
+    for start in range(0, len(ids), BULK_BATCH_SIZE):
+        uf_by_id.update(
+            WHBillingCharge.objects
+            .filter(pk__in=ids[start:start + BULK_BATCH_SIZE])
+            .values_list("id", "uf")
+        )
+
+    return [uf_by_id[charge.pk] for charge in charges]
 
-    qs.delete()
+
+@transaction.atomic
+def regenerate_storage_billing_for_period(*, company, period, contact_ids=None, tariffs=None):
+    _clear_uninvoiced_charges(
+        company=company,
+        period=period,
+        contact_ids=contact_ids,
+        charge_filter=STORAGE_CHARGES,
+        locked_message="Cannot regenerate storage charges because some storage charges are already billed.",
+    )
 
     return generate_storage_billing_for_period(
         company=company,
         period=period,
         contact_ids=contact_ids,
+        tariffs=tariffs,
+    )
+
+
+def _latest_stock_snapshot(company, at):
+    return (
+        WHStockSnapshot.objects
+        .filter(company=company, snapshot_at__lte=at)
+        .order_by("-snapshot_at")
+        .first()
     )
 
 
+def _snapshot_lots_by_owner(snapshot, contact_ids=None):
+    """
+    {owner_id: [(measure, pallet_type, started_at, remaining), ...]} in FIFO order.
+    """
+    lots = defaultdict(list)
+
+    if not snapshot:
+        return lots
+
+    qs = WHStockLotSnapshot.objects.filter(snapshot=snapshot)
+
+    if contact_ids:
+        qs = qs.filter(owner_id__in=contact_ids)
+
+    for owner_id, measure, pallet_type, started_at, remaining in (
+        qs.order_by("owner_id", "id")
+        .values_list("owner_id", "measure", "pallet_type", "started_at", "remaining")
+        .iterator(chunk_size=LEDGER_CHUNK_SIZE)
+    ):
+        lots[owner_id].append((measure, pallet_type, started_at, remaining))
+
+    return lots
+
+
 @transaction.atomic
-def generate_storage_billing_for_period(*, company, period, contact_ids=None):
+def generate_storage_billing_for_period(*, company, period, contact_ids=None, tariffs=None):
     """
+    Storage charges for every owner in one pass over the company ledger.
+
+    The ledger is streamed once ordered by (owner, created_at, id). Each owner
+    gets one FIFO state per billing dimension (one per priced pallet type in
+    pallet mode), so per-dimension row order is the same as filtering the
+    ledger by owner / pallet_type and replaying it on its own.
+
+    When a WHStockSnapshot exists at or before the period start, the FIFO
+    state is seeded from its lots and only later ledger rows are replayed.
     """
 
     now = timezone.now()
@@ -354,167 +552,135 @@ def generate_storage_billing_for_period(*, company, period, contact_ids=None):
     if cutoff <= start_dt:
         return []
 
+    tariffs = tariffs or BillingTariffResolver(company, period, contact_ids)
+
+    snapshot = _latest_stock_snapshot(company, start_dt)
+    seed_lots = _snapshot_lots_by_owner(snapshot, contact_ids)
+
     ledger = (
         WHStockLedger.objects
         .filter(company=company, created_at__lt=cutoff)
-        .order_by("created_at", "id")
+        .order_by("owner_id", "created_at", "id")
+        .values_list(
+            "owner_id",
+            "pallet_type",
+            "created_at",
+            "delta_pallets",
+            "delta_quantity",
+            "delta_area_m2",
+            "delta_volume_m3",
+        )
     )
 
+    if snapshot:
+        ledger = ledger.filter(created_at__gte=snapshot.snapshot_at)
+
     if contact_ids:
         ledger = ledger.filter(owner_id__in=contact_ids)
 
-    owner_ids = ledger.values_list("owner_id", flat=True).distinct()
-
-    created = []
+    owner_ids = []
+    charges = []
 
-    for owner_id in owner_ids:
-        owner_ledger = ledger.filter(owner_id=owner_id)
-
-        first_row = owner_ledger.first()
-        if not first_row:
-            continue
-
-        contact = first_row.owner
-        storage_mode, prices, min_days = _resolve_tariff(company, contact, period)
-        measure_field = MEASURE_FIELD_MAP.get(storage_mode)
+    def bill_owner(owner_id, owner_rows):
+        storage_mode, prices, min_days = tariffs.storage(owner_id)
         unit_type = UNIT_TYPE_MAP.get(storage_mode)
 
-        if not measure_field:
-            continue
+        if not MEASURE_FIELD_MAP.get(storage_mode):
+            return
 
-        # remove previously generated, not yet invoiced storage charges
-        WHBillingCharge.objects.filter(
-            company=company,
-            contact_id=owner_id,
-            billing_period=period,
-            charge_type=WHBillingCharge.Type.STORAGE,
-            source_model="storage_period",
-            source_uf=period.uf,
-            invoiced=False,
-        ).delete()
+        owner_ids.append(owner_id)
 
-        if storage_mode == WHStorageBillingMode.PALLET:
-            pallet_prices = prices.get(WHStorageBillingMode.PALLET, {})
+        dimensions = _storage_dimensions(storage_mode, prices, start_dt, min_days)
+        if not dimensions:
+            return
 
-            for pallet_type in (
-                WHPalletType.EURO,
-                WHPalletType.ISO2,
-                WHPalletType.BLOCK,
-            ):
-                price = Decimal(pallet_prices.get(pallet_type) or 0)
-                if price <= 0:
-                    continue
+        for measure, lot_pallet_type, started_at, remaining in seed_lots.pop(owner_id, ()):
+            for pallet_type, measure_field, _price, fifo in dimensions:
+                if measure == measure_field and lot_pallet_type == pallet_type:
+                    fifo.feed(started_at, remaining)
 
-                typed_ledger = owner_ledger.filter(pallet_type=pallet_type)
+        for row in owner_rows:
+            for pallet_type, measure_field, _price, fifo in dimensions:
+                if pallet_type is not None and row[1] != pallet_type:
+                    continue
+                fifo.feed(row[2], row[LEDGER_FIELD_INDEX[measure_field]])
 
-                billed_total = _calculate_billed_total(
-                    rows=typed_ledger,
-                    measure_field="delta_pallets",
-                    start_dt=start_dt,
-                    cutoff=cutoff,
-                    min_days=min_days,
-                )
+        for pallet_type, _measure_field, price, fifo in dimensions:
+            billed_total = fifo.close(cutoff)
 
-                if billed_total <= 0:
-                    continue
+            if billed_total <= 0:
+                continue
 
-                charge = WHBillingCharge.objects.create(
+            charges.append(
+                WHBillingCharge(
                     company=company,
                     contact_id=owner_id,
                     billing_period=period,
                     charge_type=WHBillingCharge.Type.STORAGE,
                     quantity=billed_total,
                     unit_price=price,
+                    # bulk_create skips save(), which normally sets total
+                    total=billed_total * price,
                     unit_type=unit_type,
                     pallet_type=pallet_type,
                     source_model="storage_period",
                     source_uf=period.uf,
                 )
-                created.append(charge.uf)
-
-        else:
-            price = Decimal(prices.get(storage_mode) or 0)
-            if price <= 0:
-                continue
-
-            billed_total = _calculate_billed_total(
-                rows=owner_ledger,
-                measure_field=measure_field,
-                start_dt=start_dt,
-                cutoff=cutoff,
-                min_days=min_days,
             )
 
-            if billed_total <= 0:
-                continue
+    rows = ledger.iterator(chunk_size=LEDGER_CHUNK_SIZE)
 
-            charge = WHBillingCharge.objects.create(
-                company=company,
-                contact_id=owner_id,
-                billing_period=period,
-                charge_type=WHBillingCharge.Type.STORAGE,
-                quantity=billed_total,
-                unit_price=price,
-                unit_type=unit_type,
-                source_model="storage_period",
-                source_uf=period.uf,
-            )
-            created.append(charge.uf)
+    for owner_id, owner_rows in groupby(rows, key=itemgetter(0)):
+        bill_owner(owner_id, owner_rows)
 
-    return created
+    # owners with stock carried in from the snapshot but no movements since
+    for owner_id in list(seed_lots):
+        bill_owner(owner_id, ())
 
+    # remove previously generated, not yet invoiced storage charges
+    if owner_ids:
+        WHBillingCharge.objects.filter(
+            company=company,
+            contact_id__in=owner_ids,
+            billing_period=period,
+            charge_type=WHBillingCharge.Type.STORAGE,
+            source_model="storage_period",
+            source_uf=period.uf,
+            invoiced=False,
+        ).delete()
 
-@transaction.atomic
-def regenerate_handling_billing_for_period(*, company, period, contact_ids=None):
-    locked_qs = WHBillingCharge.objects.filter(
-        company=company,
-        billing_period=period,
-        charge_type__in=[
-            WHBillingCharge.Type.HANDLING_LOADING,
-            WHBillingCharge.Type.HANDLING_UNLOADING,
-        ],
-        invoiced=True,
-    )
+    WHBillingCharge.objects.bulk_create(charges, batch_size=BULK_BATCH_SIZE)
 
-    if contact_ids:
-        locked_qs = locked_qs.filter(contact_id__in=contact_ids)
+    return [charge.uf for charge in charges]
 
-    if locked_qs.exists():
-        raise ValueError(
-            "Cannot regenerate handling charges because some handling charges are already billed."
-        )
 
-    qs = WHBillingCharge.objects.filter(
+@transaction.atomic
+def regenerate_handling_billing_for_period(*, company, period, contact_ids=None, tariffs=None):
+    _clear_uninvoiced_charges(
         company=company,
-        billing_period=period,
-        charge_type__in=[
-            WHBillingCharge.Type.HANDLING_LOADING,
-            WHBillingCharge.Type.HANDLING_UNLOADING,
-        ],
-        invoiced=False,
+        period=period,
+        contact_ids=contact_ids,
+        charge_filter=HANDLING_CHARGES,
+        locked_message="Cannot regenerate handling charges because some handling charges are already billed.",
     )
 
-    if contact_ids:
-        qs = qs.filter(contact_id__in=contact_ids)
-
-    qs.delete()
-
     return generate_handling_billing_for_period(
         company=company,
         period=period,
         contact_ids=contact_ids,
+        tariffs=tariffs,
     )
 
 
 @transaction.atomic
-def generate_handling_billing_for_period(*, company, period, contact_ids=None):
+def generate_handling_billing_for_period(*, company, period, contact_ids=None, tariffs=None):
     start_dt, end_dt = _period_bounds(period)
-    created = []
+    tariffs = tariffs or BillingTariffResolver(company, period, contact_ids)
+    charges = []
 
     # INBOUND => UNLOADING
     inbound_lines = (
         WHInboundLine.objects
-        .select_related("inbound", "product", "location")
         .filter(
             inbound__company=company,
             inbound__status="received",
@@ -527,57 +693,9 @@ def generate_handling_billing_for_period(*, company, period, contact_ids=None):
     if contact_ids:
         inbound_lines = inbound_lines.filter(inbound__owner_id__in=contact_ids)
 
-    for line in inbound_lines:
-        contact = line.inbound.owner
-
-        for unit, qty in (
-            (WHHandlingUnit.PALLET, line.pallets),
-            (WHHandlingUnit.M3, line.volume_m3),
-        ):
-            qty = Decimal(qty or 0)
-            if qty <= 0:
-                continue
-
-            tier_mode, tiers = _resolve_handling_config(
-                company=company,
-                contact=contact,
-                period=period,
-                fee_type=WHHandlingFeeType.UNLOADING,
-                unit=unit,
-            )
-
-            if not tiers:
-                continue
-
-            total = _calculate_handling_total(qty, tiers, tier_mode)
-            if total <= 0:
-                continue
-
-            unit_price = (total / qty).quantize(Decimal("0.0001"))
-
-            charge, _ = WHBillingCharge.objects.update_or_create(
-                company=company,
-                contact=contact,
-                billing_period=period,
-                charge_type=WHBillingCharge.Type.HANDLING_UNLOADING,
-                source_model="inbound_line_handling",
-                source_uf=line.uf,
-                unit_type=unit,
-                pallet_type=None,
-                defaults={
-                    "quantity": qty,
-                    "unit_price": unit_price,
-                    "product": line.product,
-                    "location": line.location,
-                    "invoiced": False,
-                },
-            )
-            created.append(charge.uf)
-
     # OUTBOUND => LOADING
     outbound_lines = (
         WHOutboundLine.objects
-        .select_related("outbound", "product", "location")
         .filter(
             outbound__company=company,
             outbound__status="shipped",
@@ -590,75 +708,94 @@ def generate_handling_billing_for_period(*, company, period, contact_ids=None):
     if contact_ids:
         outbound_lines = outbound_lines.filter(outbound__owner_id__in=contact_ids)
 
-    for line in outbound_lines:
-        contact = line.outbound.owner
-
-        for unit, qty in (
-            (WHHandlingUnit.PALLET, line.pallets),
-            (WHHandlingUnit.M3, line.volume_m3),
-        ):
-            qty = Decimal(qty or 0)
-            if qty <= 0:
-                continue
+    for lines, owner_field, fee_type, charge_type, source_model in (
+        (
+            inbound_lines,
+            "inbound__owner_id",
+            WHHandlingFeeType.UNLOADING,
+            WHBillingCharge.Type.HANDLING_UNLOADING,
+            "inbound_line_handling",
+        ),
+        (
+            outbound_lines,
+            "outbound__owner_id",
+            WHHandlingFeeType.LOADING,
+            WHBillingCharge.Type.HANDLING_LOADING,
+            "outbound_line_handling",
+        ),
+    ):
+        rows = lines.values_list(
+            "uf", owner_field, "product_id", "location_id", "pallets", "volume_m3"
+        )
 
-            tier_mode, tiers = _resolve_handling_config(
-                company=company,
-                contact=contact,
-                period=period,
-                fee_type=WHHandlingFeeType.LOADING,
-                unit=unit,
-            )
+        for line_uf, contact_id, product_id, location_id, pallets, volume_m3 in rows:
+            for unit, qty in (
+                (WHHandlingUnit.PALLET, pallets),
+                (WHHandlingUnit.M3, volume_m3),
+            ):
+                qty = Decimal(qty or 0)
+                if qty <= 0:
+                    continue
 
-            if not tiers:
-                continue
+                tier_mode, tiers = tariffs.handling(contact_id, fee_type, unit)
 
-            total = _calculate_handling_total(qty, tiers, tier_mode)
-            if total <= 0:
-                continue
+                if not tiers:
+                    continue
 
-            unit_price = (total / qty).quantize(Decimal("0.0001"))
+                total = _calculate_handling_total(qty, tiers, tier_mode)
+                if total <= 0:
+                    continue
 
-            charge, _ = WHBillingCharge.objects.update_or_create(
-                company=company,
-                contact=contact,
-                billing_period=period,
-                charge_type=WHBillingCharge.Type.HANDLING_LOADING,
-                source_model="outbound_line_handling",
-                source_uf=line.uf,
-                unit_type=unit,
-                pallet_type=None,
-                defaults={
-                    "quantity": qty,
-                    "unit_price": unit_price,
-                    "product": line.product,
-                    "location": line.location,
-                    "invoiced": False,
-                },
-            )
-            created.append(charge.uf)
+                unit_price = (total / qty).quantize(Decimal("0.0001"))
+
+                charges.append(
+                    _billing_charge(
+                        company=company,
+                        contact_id=contact_id,
+                        billing_period=period,
+                        charge_type=charge_type,
+                        source_model=source_model,
+                        source_uf=line_uf,
+                        unit_type=unit,
+                        quantity=qty,
+                        unit_price=unit_price,
+                        product_id=product_id,
+                        location_id=location_id,
+                    )
+                )
 
-    return created
+    return _upsert_billing_charges(
+        charges,
+        update_fields=["quantity", "unit_price", "total", "product", "location", "invoiced"],
+    )
 
 
 @transaction.atomic
 def regenerate_all_billing_charges_for_period(*, company, period, contact_ids=None):
+    tariffs = BillingTariffResolver(company, period, contact_ids)
+    revenue_from = revenue_days_from(company=company, period=period, contact_ids=contact_ids)
+
     storage_created = regenerate_storage_billing_for_period(
         company=company,
         period=period,
         contact_ids=contact_ids,
+        tariffs=tariffs,
     )
 
     handling_created = regenerate_handling_billing_for_period(
         company=company,
         period=period,
         contact_ids=contact_ids,
+        tariffs=tariffs,
     )
 
     inbound_extra_created = regenerate_inbound_extra_charges_for_period(
         company=company,
         period=period,
         contact_ids=contact_ids,
-    )    
+    )
+
+    refresh_contact_revenue(company=company, contact_ids=contact_ids, date_from=revenue_from)
 
     return {
         "storage": storage_created,
@@ -671,11 +808,10 @@ def regenerate_all_billing_charges_for_period(*, company, period, contact_ids=No
 @transaction.atomic
 def generate_inbound_extra_charges_for_period(*, company, period, contact_ids=None):
     start_dt, end_dt = _period_bounds(period)
-    created = []
+    charges = []
 
     inbound_charges = (
         WHInboundCharge.objects
-        .select_related("inbound")
         .filter(
             inbound__company=company,
             inbound__status=WHInbound.Status.RECEIVED,
@@ -688,71 +824,52 @@ def generate_inbound_extra_charges_for_period(*, company, period, contact_ids=No
     if contact_ids:
         inbound_charges = inbound_charges.filter(inbound__owner_id__in=contact_ids)
 
-    for extra in inbound_charges:
-        inbound = extra.inbound
-        contact = inbound.owner
-
-        if extra.charge_type == "handling_unloading":
+    for extra_uf, contact_id, extra_type, unit_type, quantity, unit_price in (
+        inbound_charges.values_list(
+            "uf", "inbound__owner_id", "charge_type", "unit_type", "quantity", "unit_price"
+        )
+    ):
+        if extra_type == "handling_unloading":
             billing_charge_type = WHBillingCharge.Type.HANDLING_UNLOADING
-        elif extra.charge_type == "handling_loading":
+        elif extra_type == "handling_loading":
             billing_charge_type = WHBillingCharge.Type.HANDLING_LOADING
-        elif extra.charge_type == "inbound_per_line":
+        elif extra_type == "inbound_per_line":
             billing_charge_type = WHBillingCharge.Type.INBOUND
         else:
             billing_charge_type = WHBillingCharge.Type.MANUAL
 
-        charge, _ = WHBillingCharge.objects.update_or_create(
-            company=company,
-            contact=contact,
-            billing_period=period,
-            charge_type=billing_charge_type,
-            source_model="inbound_charge",
-            source_uf=extra.uf,
-            unit_type=extra.unit_type,
-            pallet_type=None,
-            defaults={
-                "quantity": extra.quantity,
-                "unit_price": extra.unit_price,
-                "invoiced": False,
-            },
+        charges.append(
+            _billing_charge(
+                company=company,
+                contact_id=contact_id,
+                billing_period=period,
+                charge_type=billing_charge_type,
+                source_model="inbound_charge",
+                source_uf=extra_uf,
+                unit_type=unit_type,
+                quantity=quantity,
+                unit_price=unit_price,
+            )
         )
 
-        created.append(charge.uf)
-
-    return created
+    return _upsert_billing_charges(
+        charges,
+        update_fields=["quantity", "unit_price", "total", "invoiced"],
+    )
 
 
 @transaction.atomic
 def regenerate_inbound_extra_charges_for_period(*, company, period, contact_ids=None):
-    locked_qs = WHBillingCharge.objects.filter(
+    _clear_uninvoiced_charges(
         company=company,
-        billing_period=period,
-        source_model="inbound_charge",
-        invoiced=True,
-    )
-
-    if contact_ids:
-        locked_qs = locked_qs.filter(contact_id__in=contact_ids)
-
-    if locked_qs.exists():
-        raise ValueError(
-            "Cannot regenerate inbound extra charges because some charges are already billed."
-        )
-
-    qs = WHBillingCharge.objects.filter(
-        company=company,
-        billing_period=period,
-        source_model="inbound_charge",
-        invoiced=False,
+        period=period,
+        contact_ids=contact_ids,
+        charge_filter=INBOUND_EXTRA_CHARGES,
+        locked_message="Cannot regenerate inbound extra charges because some charges are already billed.",
     )
 
-    if contact_ids:
-        qs = qs.filter(contact_id__in=contact_ids)
-
-    qs.delete()
-
     return generate_inbound_extra_charges_for_period(
         company=company,
         period=period,
         contact_ids=contact_ids,
-    )
\ No newline at end of file
+    )
@@ -0,0 +1,315 @@
+import logging
+import time
+from datetime import timedelta
+
+from asgiref.sync import async_to_sync
+from channels.layers import get_channel_layer
+from django.db import transaction
+from django.db.models import Q
+from django.utils import timezone
+
+from logistic.models import (
+    WHBillingCharge,
+    WHBillingRun,
+    WHInboundCharge,
+    WHInboundLine,
+    WHOutboundLine,
+    WHStockLedger,
+    WHStockLotSnapshot,
+)
+from logistic.services.wms_billing_engine import (
+    HANDLING_CHARGES,
+    INBOUND_EXTRA_CHARGES,
+    STORAGE_CHARGES,
+    BillingTariffResolver,
+    _latest_stock_snapshot,
+    _period_bounds,
+    check_billing_charges_unlocked,
+    clear_all_billing_charges_for_period,
+    generate_handling_billing_for_period,
+    generate_inbound_extra_charges_for_period,
+    generate_storage_billing_for_period,
+)
+from logistic.services.wms_dashboard import refresh_contact_revenue, revenue_days_from
+
+logger = logging.getLogger(__name__)
+
+CONTACT_CHUNK_SIZE = 50
+
+ACTIVE_RUN_STATUSES = [WHBillingRun.Status.PENDING, WHBillingRun.Status.RUNNING]
+# a pending / running run older than this is considered lost
+STALE_RUN_AFTER = timedelta(hours=2)
+
+
+def _billing_contact_ids(company, period):
+    """
+    Every contact that can receive a storage, handling or inbound extra charge
+    in the period.
+    """
+    start_dt, end_dt = _period_bounds(period)
+    snapshot = _latest_stock_snapshot(company, start_dt)
+
+    ledger = WHStockLedger.objects.filter(company=company, created_at__lt=end_dt)
+    if snapshot:
+        ledger = ledger.filter(created_at__gte=snapshot.snapshot_at)
+
+    contact_ids = set(ledger.order_by().values_list("owner_id", flat=True).distinct())
+
+    if snapshot:
+        contact_ids.update(
+            WHStockLotSnapshot.objects
+            .filter(snapshot=snapshot)
+            .order_by()
+            .values_list("owner_id", flat=True)
+            .distinct()
+        )
+
+    contact_ids.update(
+        WHInboundLine.objects
+        .filter(
+            inbound__company=company,
+            inbound__received_at__gte=start_dt,
+            inbound__received_at__lt=end_dt,
+        )
+        .order_by()
+        .values_list("inbound__owner_id", flat=True)
+        .distinct()
+    )
+
+    # contacts with nothing left to bill still get their old charges cleared
+    contact_ids.update(
+        WHBillingCharge.objects
+        .filter(company=company, billing_period=period)
+        .filter(Q(**STORAGE_CHARGES) | Q(**HANDLING_CHARGES) | Q(**INBOUND_EXTRA_CHARGES))
+        .order_by()
+        .values_list("contact_id", flat=True)
+        .distinct()
+    )
+
+    # inbound extra charges can exist on inbounds without lines
+    contact_ids.update(
+        WHInboundCharge.objects
+        .filter(
+            inbound__company=company,
+            inbound__received_at__gte=start_dt,
+            inbound__received_at__lt=end_dt,
+        )
+        .order_by()
+        .values_list("inbound__owner_id", flat=True)
+        .distinct()
+    )
+
+    contact_ids.update(
+        WHOutboundLine.objects
+        .filter(
+            outbound__company=company,
+            outbound__shipped_at__gte=start_dt,
+            outbound__shipped_at__lt=end_dt,
+        )
+        .order_by()
+        .values_list("outbound__owner_id", flat=True)
+        .distinct()
+    )
+
+    return sorted(contact_ids)
+
+
+def _notify(run):
+    """
+    Push run progress to the company group (bch.mixins.wms_billing_run).
+    Progress is also persisted, so a lost message only delays the UI until it polls.
+    """
+    try:
+        async_to_sync(get_channel_layer().group_send)(
+            f"company_{run.company_id}",
+            {
+                "type": "forward_wms_billing_run",
+                "payload": {
+                    "type": "wms_billing_run",
+                    "data": {
+                        "uf": run.uf,
+                        "period_uf": run.period.uf,
+                        "status": run.status,
+                        "progress": run.progress,
+                        "processed_contacts": run.processed_contacts,
+                        "total_contacts": run.total_contacts,
+                        "created_count": run.created_count,
+                        "errors": run.errors,
+                    },
+                },
+            },
+        )
+    except Exception:
+        logger.exception("Could not push billing run progress: run=%s", run.uf)
+
+
+def _add_timing(run, stage, started):
+    run.stage_timings[stage] = round(
+        run.stage_timings.get(stage, 0) + (time.monotonic() - started), 3
+    )
+
+
+def start_billing_run(*, company, period, contact_ids=None, user=None):
+    """
+    Create a pending run and queue it once the surrounding transaction commits.
+    """
+    from logistic.tasks import run_billing_charges_task
+
+    run = WHBillingRun.objects.create(
+        company=company,
+        period=period,
+        contact_ids=contact_ids or None,
+        created_by=user,
+    )
+
+    def queue():
+        try:
+            run_billing_charges_task.delay(run.id)
+        except Exception as exc:
+            logger.exception("Could not queue billing run: run=%s", run.uf)
+            _fail_run(run, "queue", exc)
+
+    transaction.on_commit(queue)
+
+    return run
+
+
+def _fail_run(run, stage, exc):
+    """
+    Mark the run failed, with a plain UPDATE: the run object may hold
+    unsaved progress of a run that broke halfway.
+    """
+    run.status = WHBillingRun.Status.FAILED
+    run.errors = [*(run.errors or []), {"stage": stage, "error": str(exc)}]
+    run.finished_at = timezone.now()
+
+    WHBillingRun.objects.filter(pk=run.pk).update(
+        status=run.status,
+        errors=run.errors,
+        stage_timings=run.stage_timings,
+        finished_at=run.finished_at,
+    )
+    _notify(run)
+
+
+def fail_stale_billing_runs(*, company, period):
+    """
+    Fail the pending / running runs of the period that did not finish within
+    STALE_RUN_AFTER (worker lost, task never queued), so a new run can start.
+    """
+    cutoff = timezone.now() - STALE_RUN_AFTER
+
+    return (
+        WHBillingRun.objects
+        .filter(company=company, period=period, status__in=ACTIVE_RUN_STATUSES)
+        .filter(Q(started_at__lt=cutoff) | Q(started_at__isnull=True, created_at__lt=cutoff))
+        .update(
+            status=WHBillingRun.Status.FAILED,
+            errors=[{"stage": "stale", "error": "Billing run did not finish in time"}],
+            finished_at=timezone.now(),
+        )
+    )
+
+
+def execute_billing_run(run):
+    """
+    Regenerate all charges of the run's period, one contact chunk per transaction.
+
+    Invoiced charges block the whole run, as in
+    regenerate_all_billing_charges_for_period. Each chunk clears and regenerates
+    its own charges; a failing chunk is rolled back, recorded in run.errors and
+    the remaining chunks still run. Any other error fails the run.
+    """
+    try:
+        return _execute_billing_run(run)
+    except Exception as exc:
+        logger.exception("Billing run failed: run=%s", run.uf)
+        _fail_run(run, "run", exc)
+        return run
+
+
+def _execute_billing_run(run):
+    company = run.company
+    period = run.period
+
+    run.status = WHBillingRun.Status.RUNNING
+    run.started_at = timezone.now()
+    run.save(update_fields=["status", "started_at"])
+
+    try:
+        started = time.monotonic()
+        contact_ids = run.contact_ids or _billing_contact_ids(company, period)
+        check_billing_charges_unlocked(company=company, period=period, contact_ids=run.contact_ids)
+        _add_timing(run, "prepare", started)
+    except Exception as exc:
+        _fail_run(run, "prepare", exc)
+        return run
+
+    run.total_contacts = len(contact_ids)
+    run.save(update_fields=["total_contacts", "stage_timings"])
+    _notify(run)
+
+    tariffs = BillingTariffResolver(company, period, run.contact_ids)
+
+    for start in range(0, len(contact_ids), CONTACT_CHUNK_SIZE):
+        chunk = contact_ids[start:start + CONTACT_CHUNK_SIZE]
+        stage = None
+        chunk_created = 0
+
+        try:
+            with transaction.atomic():
+                # cleared with the chunk, so a failed chunk keeps its previous charges
+                stage = "clear"
+                started = time.monotonic()
+                revenue_from = revenue_days_from(company=company, period=period, contact_ids=chunk)
+                clear_all_billing_charges_for_period(company=company, period=period, contact_ids=chunk)
+                _add_timing(run, stage, started)
+
+                for stage, generate in (
+                    ("storage", generate_storage_billing_for_period),
+                    ("handling", generate_handling_billing_for_period),
+                    ("inbound_extra", generate_inbound_extra_charges_for_period),
+                ):
+                    kwargs = {"tariffs": tariffs} if stage != "inbound_extra" else {}
+
+                    started = time.monotonic()
+                    created = generate(
+                        company=company,
+                        period=period,
+                        contact_ids=chunk,
+                        **kwargs,
+                    )
+                    _add_timing(run, stage, started)
+
+                    chunk_created += len(created)
+
+                stage = "dashboard"
+                started = time.monotonic()
+                refresh_contact_revenue(company=company, contact_ids=chunk, date_from=revenue_from)
+                _add_timing(run, stage, started)
+
+            run.created_count += chunk_created
+
+        except Exception as exc:
+            logger.exception("Billing run chunk failed: run=%s stage=%s", run.uf, stage)
+            run.errors.append({
+                "stage": stage,
+                "contact_ids": chunk,
+                "error": str(exc),
+            })
+
+        run.processed_contacts += len(chunk)
+        run.save(update_fields=[
+            "processed_contacts",
+            "created_count",
+            "stage_timings",
+            "errors",
+        ])
+        _notify(run)
+
+    run.status = WHBillingRun.Status.FAILED if run.errors else WHBillingRun.Status.COMPLETED
+    run.finished_at = timezone.now()
+    run.save(update_fields=["status", "finished_at"])
+    _notify(run)
+
+    return run
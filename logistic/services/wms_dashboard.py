@@ -0,0 +1,154 @@
+from datetime import datetime, time, timedelta
+from decimal import Decimal
+from zoneinfo import ZoneInfo
+
+from django.db import transaction
+from django.db.models import F, Max, Min, Sum
+from django.db.models.functions import TruncDate
+from django.utils import timezone
+
+from logistic.models import (
+    WHBillingCharge,
+    WHDashboardDailyRevenue,
+    WHDashboardOwnerStats,
+    WHStock,
+    WHStockLedger,
+)
+DASHBOARD_TZ = ZoneInfo("Europe/Chisinau")
+
+STOCK_MEASURES = ("pallets", "area_m2", "volume_m3", "quantity")
+
+BULK_BATCH_SIZE = 1000
+
+
+def dashboard_today():
+    return timezone.localtime(timezone.now(), DASHBOARD_TZ).date()
+
+
+def _day_start(day):
+    return timezone.make_aware(datetime.combine(day, time.min), DASHBOARD_TZ)
+
+
+def revenue_days_from(*, company, period, contact_ids=None):
+    """
+    First dashboard day holding charges of the period (today when none): the
+    days a regeneration of the period can change run from it to today.
+    Call it before the period's charges are cleared.
+    """
+    charges = WHBillingCharge.objects.filter(company=company, billing_period=period)
+    if contact_ids:
+        charges = charges.filter(contact_id__in=contact_ids)
+
+    first = charges.aggregate(first=Min("created_at"))["first"]
+    today = dashboard_today()
+
+    if first is None:
+        return today
+
+    return min(timezone.localtime(first, DASHBOARD_TZ).date(), today)
+
+
+@transaction.atomic
+def refresh_contact_revenue(*, company, contact_ids=None, date_from=None, date_to=None):
+    """
+    Rebuild WHDashboardDailyRevenue of the given contacts (the whole company
+    when None) from their charges, for the days in [date_from, date_to] (all
+    days when None). Called after charges are regenerated, in the same
+    transaction, so the dashboard never sees a half-written period.
+    """
+    charges = WHBillingCharge.objects.filter(company=company)
+    existing = WHDashboardDailyRevenue.objects.filter(company=company)
+
+    if contact_ids:
+        charges = charges.filter(contact_id__in=contact_ids)
+        existing = existing.filter(contact_id__in=contact_ids)
+
+    if date_from:
+        charges = charges.filter(created_at__gte=_day_start(date_from))
+        existing = existing.filter(day__gte=date_from)
+
+    if date_to:
+        charges = charges.filter(created_at__lt=_day_start(date_to + timedelta(days=1)))
+        existing = existing.filter(day__lte=date_to)
+
+    rows = (
+        charges
+        .annotate(day=TruncDate("created_at", tzinfo=DASHBOARD_TZ))
+        .values("contact_id", "day")
+        .annotate(value=Sum("total"))
+        .order_by()
+    )
+
+    existing.delete()
+
+    return WHDashboardDailyRevenue.objects.bulk_create(
+        [
+            WHDashboardDailyRevenue(
+                company=company,
+                contact_id=row["contact_id"],
+                day=row["day"],
+                total=row["value"] or Decimal("0"),
+            )
+            for row in rows
+        ],
+        batch_size=BULK_BATCH_SIZE,
+    )
+
+
+def apply_owner_stock_deltas(*, company, owner_id, totals, moved_at):
+    """
+    Add one posting's deltas to the owner's WHDashboardOwnerStats row.
+    totals: {"pallets": Decimal, "area_m2": ..., "volume_m3": ..., "quantity": ...}
+    """
+    WHDashboardOwnerStats.objects.bulk_create(
+        [WHDashboardOwnerStats(company=company, owner_id=owner_id)],
+        ignore_conflicts=True,
+    )
+
+    WHDashboardOwnerStats.objects.filter(company=company, owner_id=owner_id).update(
+        **{measure: F(measure) + totals[measure] for measure in STOCK_MEASURES},
+        last_movement_at=moved_at,
+        updated_at=moved_at,
+    )
+
+
+@transaction.atomic
+def rebuild_owner_stats(*, company):
+    """
+    Recompute every WHDashboardOwnerStats row of the company from WHStock
+    and WHStockLedger (backfill / repair).
+    """
+    stats = {}
+
+    for row in (
+        WHStock.objects
+        .filter(company=company, owner__isnull=False)
+        .values("owner_id")
+        .annotate(**{measure: Sum(measure) for measure in STOCK_MEASURES})
+        .order_by()
+    ):
+        stats[row["owner_id"]] = WHDashboardOwnerStats(
+            company=company,
+            owner_id=row["owner_id"],
+            **{measure: row[measure] or Decimal("0") for measure in STOCK_MEASURES},
+        )
+
+    for owner_id, last_movement_at in (
+        WHStockLedger.objects
+        .filter(company=company)
+        .values("owner_id")
+        .annotate(last=Max("created_at"))
+        .values_list("owner_id", "last")
+        .order_by()
+    ):
+        stats.setdefault(
+            owner_id,
+            WHDashboardOwnerStats(company=company, owner_id=owner_id),
+        ).last_movement_at = last_movement_at
+
+    WHDashboardOwnerStats.objects.filter(company=company).delete()
+
+    return WHDashboardOwnerStats.objects.bulk_create(
+        stats.values(),
+        batch_size=BULK_BATCH_SIZE,
+    )
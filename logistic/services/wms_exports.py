@@ -0,0 +1,300 @@
+from datetime import datetime, time, timedelta
+from zoneinfo import ZoneInfo
+
+from django.conf import settings
+from django.db.models import Q
+from django.utils import timezone
+from django.utils.dateparse import parse_date
+from django.utils.translation import get_language, gettext as _
+
+from abb.exports import EXPORT_CHUNK_SIZE, save_export
+from abb.utils import generate_signed_url, hex_uuid
+from logistic.models import WHPalletType, WHStock, WHStockLedger
+
+EXPORT_TZ = "Europe/Chisinau"
+EXPORT_STORAGE_DIR = "wms_exports"
+EXPORT_LINK_TTL_SECONDS = 24 * 60 * 60
+
+STOCK_FILTERS = ("owner", "product", "location", "pallet_type", "in_stock")
+MOVEMENT_FILTERS = ("owner", "product", "location", "source_type", "date_from", "date_to")
+
+PALLET_TYPE_LABELS = dict(WHPalletType.choices)
+SOURCE_TYPE_LABELS = dict(WHStockLedger.SourceType.choices)
+
+
+def filter_stock_queryset(qs, params):
+    owner = params.get("owner")
+    product = params.get("product")
+    location = params.get("location")
+    pallet_type = params.get("pallet_type")
+    in_stock = params.get("in_stock")
+
+    if owner:
+        qs = qs.filter(product__owner__uf=owner)
+
+    if product:
+        qs = qs.filter(product__uf=product)
+
+    if location:
+        qs = qs.filter(location__uf=location)
+
+    if pallet_type:
+        qs = qs.filter(pallet_type=pallet_type)
+
+    if in_stock == "true":
+        qs = qs.filter(
+            Q(quantity__gt=0) |
+            Q(pallets__gt=0) |
+            Q(area_m2__gt=0) |
+            Q(volume_m3__gt=0)
+        )
+
+    return qs.order_by(
+        "product__name",
+        "location__code",
+        "pallet_type",
+    )
+
+
+def _day_start(value):
+    """
+    Start of a YYYY-MM-DD day in EXPORT_TZ, so created_at is compared as a range
+    and stays on the (company, ..., created_at) indexes.
+    """
+    day = parse_date(value)
+    if day is None:
+        raise ValueError(f"Invalid date: {value}")
+
+    return timezone.make_aware(datetime.combine(day, time.min), ZoneInfo(EXPORT_TZ))
+
+
+def filter_movements_queryset(qs, params):
+    """
+    Raises ValueError for a malformed date_from / date_to.
+    """
+    owner = params.get("owner")
+    product = params.get("product")
+    location = params.get("location")
+    source_type = params.get("source_type")
+    date_from = params.get("date_from")
+    date_to = params.get("date_to")
+
+    if owner:
+        qs = qs.filter(owner__uf=owner)
+
+    if product:
+        qs = qs.filter(product__uf=product)
+
+    if location:
+        qs = qs.filter(location__uf=location)
+
+    if source_type:
+        qs = qs.filter(source_type=source_type)
+
+    if date_from:
+        qs = qs.filter(created_at__gte=_day_start(date_from))
+
+    if date_to:
+        # inclusive: everything before the start of the next day
+        qs = qs.filter(created_at__lt=_day_start(date_to) + timedelta(days=1))
+
+    return qs
+
+
+def _exported_at():
+    timezone.activate(ZoneInfo(EXPORT_TZ))
+    return timezone.localtime(timezone.now())
+
+
+def stock_export(company, params):
+    """
+    Export definition for abb.exports: rows are read with a values_list
+    projection and a server-side cursor, never as model instances.
+    """
+    now = _exported_at()
+
+    qs = filter_stock_queryset(WHStock.objects.filter(company=company), params)
+
+    rows = (
+        (
+            owner_name or "",
+            sku or "",
+            product_name or "",
+            location_name or "",
+            PALLET_TYPE_LABELS.get(pallet_type, "") if pallet_type else "",
+            float(quantity or 0),
+            float(pallets or 0),
+            float(area_m2 or 0),
+            float(volume_m3 or 0),
+        )
+        for (
+            owner_name,
+            sku,
+            product_name,
+            location_name,
+            pallet_type,
+            quantity,
+            pallets,
+            area_m2,
+            volume_m3,
+        ) in qs.values_list(
+            "owner__company_name",
+            "product__sku",
+            "product__name",
+            "location__name",
+            "pallet_type",
+            "quantity",
+            "pallets",
+            "area_m2",
+            "volume_m3",
+        ).iterator(chunk_size=EXPORT_CHUNK_SIZE)
+    )
+
+    return now, {
+        "title": _("stock_export"),
+        "sheet_title": _("stock"),
+        "meta": (_("exported_at"), now.strftime("%d-%m-%Y %H:%M")),
+        "headers": [
+            _("owner"),
+            _("product_sku"),
+            _("product_name"),
+            _("location"),
+            _("pallet_type"),
+            _("quantity"),
+            _("pallets"),
+            _("area_m2"),
+            _("area_m3"),
+        ],
+        "widths": (24, 18, 30, 18, 18, 12, 12, 12, 12),
+        "rows": rows,
+    }
+
+
+def _direction_label(direction):
+    if direction == "in":
+        return _("inbound")
+
+    if direction == "out":
+        return _("outbound")
+
+    return ""
+
+
+def movements_export(company, params):
+    now = _exported_at()
+
+    qs = filter_movements_queryset(
+        WHStockLedger.objects.filter(company=company),
+        params,
+    ).order_by("-created_at", "-id")
+
+    rows = (
+        (
+            timezone.localtime(created_at).strftime("%Y-%m-%d %H:%M:%S") if created_at else "",
+            owner_name or "",
+            product_name or "",
+            location_name or "",
+            _direction_label(direction),
+            _(SOURCE_TYPE_LABELS.get(source_type, "")) if source_type else "",
+            PALLET_TYPE_LABELS.get(pallet_type, "") if pallet_type else "",
+            float(pallets or 0),
+            float(area_m2 or 0),
+            float(volume_m3 or 0),
+            float(quantity or 0),
+        )
+        for (
+            created_at,
+            owner_name,
+            product_name,
+            location_name,
+            direction,
+            source_type,
+            pallet_type,
+            pallets,
+            area_m2,
+            volume_m3,
+            quantity,
+        ) in qs.values_list(
+            "created_at",
+            "owner__company_name",
+            "product__name",
+            "location__name",
+            "movement_direction",
+            "source_type",
+            "pallet_type",
+            "delta_pallets",
+            "delta_area_m2",
+            "delta_volume_m3",
+            "delta_quantity",
+        ).iterator(chunk_size=EXPORT_CHUNK_SIZE)
+    )
+
+    return now, {
+        "title": _("stock_movements_export"),
+        "sheet_title": _("stock_movements"),
+        "meta": (_("exported_at"), now.strftime("%d-%m-%Y %H:%M")),
+        "headers": [
+            _("date"),
+            _("owner"),
+            _("product"),
+            _("location"),
+            _("direction"),
+            _("source"),
+            _("pallet_type"),
+            _("pallets"),
+            _("area_m2"),
+            _("area_m3"),
+            _("units"),
+        ],
+        "widths": (20, 24, 30, 18, 14, 16, 18, 12, 12, 12, 12),
+        "rows": rows,
+    }
+
+
+EXPORTS = {
+    "stock": (stock_export, STOCK_FILTERS),
+    "stock_movements": (movements_export, MOVEMENT_FILTERS),
+}
+
+
+def export_filename(kind, now):
+    return f"{kind}_{now.strftime('%Y%m%d_%H%M%S')}"
+
+
+def export_storage_name(token, filename):
+    return f"{EXPORT_STORAGE_DIR}/{token}/{filename}"
+
+
+def start_background_export(*, kind, company, params, file_format):
+    """
+    Queue an export that is too large for a request and return a signed
+    download link. The link answers 202 until the file has been written.
+    """
+    from logistic.tasks import build_wms_export_task
+
+    _build, filters = EXPORTS[kind]
+    token = hex_uuid()
+    filename = f"{export_filename(kind, _exported_at())}.{file_format}"
+
+    build_wms_export_task.delay(
+        kind=kind,
+        company_id=company.pk,
+        params={key: params.get(key) for key in filters if params.get(key)},
+        file_format=file_format,
+        storage_name=export_storage_name(token, filename),
+        language=get_language(),
+    )
+
+    signed_path = generate_signed_url(
+        f"/api/wms/exports/{token}/{filename}/",
+        EXPORT_LINK_TTL_SECONDS,
+    )
+
+    return f"{settings.BACKEND_URL}{signed_path}"
+
+
+def build_export_file(*, kind, company, params, file_format, storage_name):
+    build, _filters = EXPORTS[kind]
+    _now, export = build(company, params)
+
+    return save_export(export, file_format=file_format, name=storage_name)
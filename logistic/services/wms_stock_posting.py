@@ -0,0 +1,157 @@
+from decimal import Decimal
+from functools import reduce
+from operator import or_
+
+from django.db import transaction
+from django.db.models import F, Q
+from django.utils import timezone
+
+from logistic.models import WHStock, WHStockLedger
+from logistic.services.wms_dashboard import apply_owner_stock_deltas
+
+MEASURES = ("quantity", "pallets", "area_m2", "volume_m3")
+
+INSUFFICIENT_STOCK_MESSAGES = {
+    "quantity": "Not enough quantity in stock",
+    "pallets": "Not enough pallets in stock",
+    "area_m2": "Not enough area in stock",
+    "volume_m3": "Not enough volume in stock",
+}
+
+
+def _stock_key(line):
+    return (line.product_id, line.location_id, line.pallet_type)
+
+
+def _sort_key(key):
+    product_id, location_id, pallet_type = key
+    return (product_id, location_id, pallet_type or "")
+
+
+def _key_filter(key):
+    product_id, location_id, pallet_type = key
+
+    if pallet_type is None:
+        return Q(product_id=product_id, location_id=location_id, pallet_type__isnull=True)
+
+    return Q(product_id=product_id, location_id=location_id, pallet_type=pallet_type)
+
+
+@transaction.atomic
+def post_stock_movements(
+    *,
+    company,
+    owner_id,
+    lines,
+    direction,
+    source_type,
+    source_uf,
+    actor_user=None,
+    actor_portal=None,
+):
+    """
+    Apply inbound ("in") or outbound ("out") lines to WHStock and write their ledger rows.
+
+    lines: WHInboundLine / WHOutboundLine-like objects (product_id, location_id,
+    pallet_type, quantity, pallets, area_m2, volume_m3).
+
+    Missing stock rows are inserted first, then every affected row is locked
+    with select_for_update in id order, so concurrent postings touching the
+    same rows queue up instead of deadlocking or losing updates. Deltas are
+    applied with F() in one bulk_update and ledger rows are bulk inserted.
+
+    Raises ValueError when an outbound line exceeds the locked stock.
+    """
+    sign = Decimal("1") if direction == "in" else Decimal("-1")
+
+    deltas = {}
+    ledger_rows = []
+
+    for line in lines:
+        values = {
+            measure: sign * Decimal(getattr(line, measure) or 0)
+            for measure in MEASURES
+        }
+
+        if not any(values.values()):
+            continue
+
+        key = _stock_key(line)
+        totals = deltas.setdefault(key, dict.fromkeys(MEASURES, Decimal("0")))
+
+        for measure, value in values.items():
+            totals[measure] += value
+
+        ledger_rows.append(
+            WHStockLedger(
+                company=company,
+                owner_id=owner_id,
+                product_id=line.product_id,
+                location_id=line.location_id,
+                pallet_type=line.pallet_type,
+                delta_quantity=values["quantity"],
+                delta_pallets=values["pallets"],
+                delta_area_m2=values["area_m2"],
+                delta_volume_m3=values["volume_m3"],
+                source_type=source_type,
+                source_uf=source_uf,
+                actor_user=actor_user,
+                actor_portal=actor_portal,
+                movement_direction=direction,
+            )
+        )
+
+    if not deltas:
+        return []
+
+    keys = sorted(deltas, key=_sort_key)
+
+    WHStock.objects.bulk_create(
+        [
+            WHStock(
+                company=company,
+                owner_id=owner_id,
+                product_id=product_id,
+                location_id=location_id,
+                pallet_type=pallet_type,
+            )
+            for product_id, location_id, pallet_type in keys
+        ],
+        ignore_conflicts=True,
+    )
+
+    stocks = list(
+        WHStock.objects
+        .select_for_update()
+        .filter(company=company, owner_id=owner_id)
+        .filter(reduce(or_, (_key_filter(key) for key in keys)))
+        .order_by("id")
+    )
+
+    now = timezone.now()
+
+    for stock in stocks:
+        totals = deltas[(stock.product_id, stock.location_id, stock.pallet_type)]
+
+        for measure in MEASURES:
+            # the row is locked, so the value read here is the one being updated
+            if getattr(stock, measure) + totals[measure] < 0:
+                raise ValueError(INSUFFICIENT_STOCK_MESSAGES[measure])
+
+            setattr(stock, measure, F(measure) + totals[measure])
+
+        stock.updated_at = now
+
+    WHStock.objects.bulk_update(stocks, [*MEASURES, "updated_at"])
+
+    apply_owner_stock_deltas(
+        company=company,
+        owner_id=owner_id,
+        totals={
+            measure: sum(totals[measure] for totals in deltas.values())
+            for measure in MEASURES
+        },
+        moved_at=now,
+    )
+
+    return WHStockLedger.objects.bulk_create(ledger_rows)
@@ -0,0 +1,164 @@
+from collections import defaultdict
+
+from django.db import transaction
+from django.utils import timezone
+
+from logistic.models import (
+    WHBillingPeriod,
+    WHStockLedger,
+    WHStockLotSnapshot,
+    WHStockSnapshot,
+)
+from logistic.services.wms_billing_engine import (
+    BULK_BATCH_SIZE,
+    LEDGER_CHUNK_SIZE,
+    _FifoLots,
+)
+
+# measures kept for every owner, independent of the storage mode it bills in
+SPANNING_MEASURES = (
+    WHStockLotSnapshot.Measure.QUANTITY,
+    WHStockLotSnapshot.Measure.AREA_M2,
+    WHStockLotSnapshot.Measure.VOLUME_M3,
+)
+
+
+def snapshot_at_for_period(period):
+    """
+    Snapshot point for a closed period: start of its end_date.
+
+    The next period starts on that same date (see _get_or_create_current_period),
+    so the snapshot is always at or before the next period start.
+    """
+    return timezone.make_aware(
+        timezone.datetime.combine(period.end_date, timezone.datetime.min.time())
+    )
+
+
+@transaction.atomic
+def build_stock_lot_snapshot(*, company, snapshot_at, period=None):
+    """
+    Persist the open FIFO lots of every owner at snapshot_at.
+
+    Starts from the latest earlier snapshot and replays only the ledger rows
+    between the two points. Rebuilding an existing snapshot_at replaces it.
+    """
+    previous = (
+        WHStockSnapshot.objects
+        .filter(company=company, snapshot_at__lt=snapshot_at)
+        .order_by("-snapshot_at")
+        .first()
+    )
+
+    # start_dt = snapshot_at: nothing is billed, the lots are only rolled forward
+    states = defaultdict(lambda: _FifoLots(snapshot_at, 1))
+
+    if previous:
+        for owner_id, measure, pallet_type, started_at, remaining in (
+            WHStockLotSnapshot.objects
+            .filter(snapshot=previous)
+            .order_by("id")
+            .values_list("owner_id", "measure", "pallet_type", "started_at", "remaining")
+            .iterator(chunk_size=LEDGER_CHUNK_SIZE)
+        ):
+            states[(owner_id, measure, pallet_type)].feed(started_at, remaining)
+
+    ledger = (
+        WHStockLedger.objects
+        .filter(company=company, created_at__lt=snapshot_at)
+        .order_by("created_at", "id")
+        .values_list(
+            "owner_id",
+            "pallet_type",
+            "created_at",
+            "delta_pallets",
+            "delta_quantity",
+            "delta_area_m2",
+            "delta_volume_m3",
+        )
+    )
+
+    if previous:
+        ledger = ledger.filter(created_at__gte=previous.snapshot_at)
+
+    ledger_rows = 0
+
+    for owner_id, pallet_type, created_at, pallets, quantity, area_m2, volume_m3 in (
+        ledger.iterator(chunk_size=LEDGER_CHUNK_SIZE)
+    ):
+        ledger_rows += 1
+
+        if pallet_type and pallets:
+            states[(owner_id, WHStockLotSnapshot.Measure.PALLETS, pallet_type)].feed(
+                created_at, pallets
+            )
+
+        for measure, delta in zip(SPANNING_MEASURES, (quantity, area_m2, volume_m3)):
+            if delta:
+                states[(owner_id, measure, None)].feed(created_at, delta)
+
+    WHStockSnapshot.objects.filter(company=company, snapshot_at=snapshot_at).delete()
+
+    snapshot = WHStockSnapshot.objects.create(
+        company=company,
+        period=period,
+        snapshot_at=snapshot_at,
+        ledger_rows=ledger_rows,
+    )
+
+    lots = [
+        WHStockLotSnapshot(
+            snapshot=snapshot,
+            owner_id=owner_id,
+            measure=measure,
+            pallet_type=pallet_type,
+            started_at=lot["started_at"],
+            remaining=lot["remaining"],
+        )
+        for (owner_id, measure, pallet_type), fifo in states.items()
+        for lot in fifo.lots
+    ]
+
+    WHStockLotSnapshot.objects.bulk_create(lots, batch_size=BULK_BATCH_SIZE)
+
+    return snapshot
+
+
+def refresh_stock_lot_snapshots(*, company, rebuild=False):
+    """
+    Build missing snapshots for the company's closed billing periods, oldest first,
+    so every build only replays one period of ledger rows.
+    """
+    periods = (
+        WHBillingPeriod.objects
+        .filter(company=company, is_closed=True)
+        .order_by("end_date", "id")
+    )
+
+    if rebuild:
+        WHStockSnapshot.objects.filter(company=company).delete()
+
+    existing = set(
+        WHStockSnapshot.objects
+        .filter(company=company)
+        .values_list("snapshot_at", flat=True)
+    )
+
+    now = timezone.now()
+    built = []
+
+    for period in periods:
+        snapshot_at = snapshot_at_for_period(period)
+
+        if snapshot_at in existing or snapshot_at > now:
+            continue
+
+        snapshot = build_stock_lot_snapshot(
+            company=company,
+            snapshot_at=snapshot_at,
+            period=period,
+        )
+        existing.add(snapshot_at)
+        built.append(snapshot.uf)
+
+    return built
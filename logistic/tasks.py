@@ -1,20 +1,103 @@
-# from xumma.celery import app
+import logging
 
-# from app.models import Company
-# from logistic.models import WHBillingPeriod
-# from logistic.services.wms_billing_engine import generate_pallet_storage_billing_for_period
+from django.utils import translation
 
+from xumma.celery import app
 
+from app.models import Company
+from logistic.models import WHBillingRun
+from logistic.services.wms_billing_runs import execute_billing_run
+from logistic.services.wms_dashboard import rebuild_owner_stats, refresh_contact_revenue
+from logistic.services.wms_exports import build_export_file
+from logistic.services.wms_stock_snapshots import refresh_stock_lot_snapshots
 
-# @app.task(bind=True)
-# def run_pallet_storage_billing(self, company_id: int, period_id: int, contact_ids=None):
-#     company = Company.objects.get(pk=company_id)
-#     period = WHBillingPeriod.objects.get(pk=period_id, company=company)
+logger = logging.getLogger(__name__)
 
-#     generate_pallet_storage_billing_for_period(
-#         company=company,
-#         period=period,
-#         contact_ids=contact_ids,
-#         create_invoice=True,
-#     )
-#     return {"company_id": company_id, "period_id": period_id, "status": "ok"}
\ No newline at end of file
+
+@app.task(bind=True, queue="low_priority")
+def refresh_stock_lot_snapshots_task(self, company_id=None, rebuild=False):
+    """
+    Build WHStockSnapshot rows for closed billing periods.
+    Runs for one company (on period close) or for all companies (beat).
+    """
+    companies = Company.objects.all()
+
+    if company_id:
+        companies = companies.filter(pk=company_id)
+
+    built = {}
+
+    for company in companies:
+        snapshots = refresh_stock_lot_snapshots(company=company, rebuild=rebuild)
+
+        if snapshots:
+            built[company.pk] = snapshots
+            logger.info(
+                "Stock lot snapshots built: company=%s count=%s",
+                company.pk,
+                len(snapshots),
+            )
+
+    return built
+
+
+@app.task(bind=True, queue="low_priority")
+def run_billing_charges_task(self, run_id):
+    """
+    Execute a WHBillingRun created by start_billing_run.
+    """
+    run = WHBillingRun.objects.select_related("company", "period").get(pk=run_id)
+
+    if run.status != WHBillingRun.Status.PENDING:
+        logger.warning("Billing run %s is already %s, skipping", run.uf, run.status)
+        return {"run": run.uf, "status": run.status}
+
+    run.task_id = self.request.id
+    run.save(update_fields=["task_id"])
+
+    run = execute_billing_run(run)
+
+    return {
+        "run": run.uf,
+        "status": run.status,
+        "created_count": run.created_count,
+    }
+
+
+@app.task(bind=True, queue="low_priority")
+def build_wms_export_task(self, kind, company_id, params, file_format, storage_name, language=None):
+    """
+    Write a large WMS export to default storage; served by WmsExportDownloadView.
+    """
+    company = Company.objects.get(pk=company_id)
+
+    with translation.override(language):
+        name = build_export_file(
+            kind=kind,
+            company=company,
+            params=params,
+            file_format=file_format,
+            storage_name=storage_name,
+        )
+
+    logger.info("WMS export written: kind=%s company=%s file=%s", kind, company_id, name)
+
+    return name
+
+
+@app.task(bind=True, queue="low_priority")
+def rebuild_wms_dashboard_aggregates_task(self, company_id=None):
+    """
+    Recompute the WMS dashboard aggregate tables from charges, stock and ledger.
+    They are kept up to date on write; this is the repair path.
+    """
+    companies = Company.objects.all()
+
+    if company_id:
+        companies = companies.filter(pk=company_id)
+
+    for company in companies:
+        refresh_contact_revenue(company=company)
+        rebuild_owner_stats(company=company)
+
+    return list(companies.values_list("pk", flat=True))
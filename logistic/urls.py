@@ -1,13 +1,13 @@
 from django.urls import path
 from rest_framework.routers import DefaultRouter
 
-from logistic.views.wms_billing import WHBillingDocumentViewSet, WHBillingInvoiceViewSet, WHBillingPeriodViewSet
+from logistic.views.wms_billing import WHBillingDocumentViewSet, WHBillingInvoiceViewSet, WHBillingPeriodViewSet, WHBillingRunViewSet
 from logistic.views.wms_dashboard import WmsDashboardCustomersSummaryAPIView, WmsStorageOccupancyAPIView
 from logistic.views.wms_inbound import WHInboundChargeOptionsApiView, WHInboundChargePriceApiView, WHInboundViewSet
 from logistic.views.wms_location import WHLocationViewSet
 from logistic.views.wms_outbound import WHOutboundChargeOptionsApiView, WHOutboundChargePriceApiView, WHOutboundViewSet
 from logistic.views.wms_product import WHProductViewSet
-from logistic.views.wms_stock import WHStockViewSet
+from logistic.views.wms_stock import WHStockViewSet, WmsExportDownloadView
 from logistic.views.wms_tariff import WHTariffViewSet
 
 
@@ -22,6 +22,7 @@ router.register(r"tariffs", WHTariffViewSet, basename="wms-tariffs")
 router.register(r"billing-periods", WHBillingPeriodViewSet, basename="wms-billing-periods")
 router.register(r"billing-documents", WHBillingDocumentViewSet, basename="wms-billing-documents")
 router.register(r"billing-invoices", WHBillingInvoiceViewSet, basename="wms-billing-invoices")
+router.register(r"billing-runs", WHBillingRunViewSet, basename="wms-billing-runs")
 
 
 urlpatterns = [
@@ -34,6 +35,8 @@ urlpatterns = [
     path("outbound-charge-options/", WHOutboundChargeOptionsApiView.as_view()),
     path("outbound-charge-price/", WHOutboundChargePriceApiView.as_view()),
 
+    path("exports/<str:token>/<str:filename>/", WmsExportDownloadView.as_view()),
+
 ]
 
 urlpatterns += router.urls
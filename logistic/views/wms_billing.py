@@ -7,7 +7,7 @@ from django.utils import timezone
 from django.db.models import F, Q
 from django.shortcuts import get_object_or_404
 from django.db.models import Prefetch, Sum
-from django.db import transaction
+from django.db import IntegrityError, transaction
 from rest_framework.permissions import IsAuthenticated
 from rest_framework.response import Response
 from rest_framework import status
@@ -24,11 +24,13 @@ from openpyxl.worksheet.properties import PageSetupProperties
 
 from abb.utils import get_user_company
 from att.models import Contact
-from logistic.models import WHBillingCharge, WHBillingInvoice, WHBillingInvoiceLine, WHBillingPeriod
-from logistic.serializers.wms_billing import WHBillingInvoiceManualLinesCreateSerializer, WHBillingInvoiceSerializer, WHBillingPeriodSerializer, WHIssueBillingDocumentsSerializer
+from logistic.models import WHBillingCharge, WHBillingInvoice, WHBillingInvoiceLine, WHBillingPeriod, WHBillingRun
+from logistic.serializers.wms_billing import WHBillingInvoiceManualLinesCreateSerializer, WHBillingInvoiceSerializer, WHBillingPeriodSerializer, WHBillingRunSerializer, WHIssueBillingDocumentsSerializer
 from logistic.services.wms_billing_documents import issue_billing_documents_for_period
 from logistic.services.wms_billing_engine import (regenerate_all_billing_charges_for_period, 
                                                     )
+from logistic.services.wms_billing_runs import ACTIVE_RUN_STATUSES, fail_stale_billing_runs, start_billing_run
+from logistic.tasks import refresh_stock_lot_snapshots_task
 
 logger = logging.getLogger(__name__)
 
@@ -172,7 +174,110 @@ class WHBillingPeriodViewSet(viewsets.ModelViewSet):
         period.is_closed = True
         period.save(update_fields=["is_closed"])
 
+        transaction.on_commit(
+            lambda: refresh_stock_lot_snapshots_task.delay(company_id=period.company_id)
+        )
+
         return Response({"detail": "Billing period closed"})
+
+    @action(detail=True, methods=["post"], url_path="generate-charges-async")
+    def generate_charges_async(self, request, uf=None):
+        """
+        Queue charge generation; poll billing-runs/<uf>/ or listen for
+        "wms_billing_run" messages on the websocket.
+        """
+        company = get_user_company(request.user)
+
+        period = get_object_or_404(
+            WHBillingPeriod,
+            uf=uf,
+            company=company,
+        )
+
+        if period.is_closed:
+            return Response(
+                {"detail": "Billing period is closed"},
+                status=status.HTTP_400_BAD_REQUEST,
+            )
+
+        fail_stale_billing_runs(company=company, period=period)
+
+        def active_run_conflict():
+            active_run = WHBillingRun.objects.filter(
+                company=company,
+                period=period,
+                status__in=ACTIVE_RUN_STATUSES,
+            ).first()
+
+            if active_run:
+                return Response(
+                    WHBillingRunSerializer(active_run).data,
+                    status=status.HTTP_409_CONFLICT,
+                )
+
+        conflict = active_run_conflict()
+        if conflict:
+            return conflict
+
+        contact_ufs = set(request.data.get("contacts") or [])
+        contact_ids = None
+        if contact_ufs:
+            contacts = dict(
+                Contact.objects
+                .filter(company=company, uf__in=contact_ufs)
+                .values_list("uf", "id")
+            )
+
+            if contact_ufs - contacts.keys():
+                return Response(
+                    {"detail": "Unknown contacts", "contacts": sorted(contact_ufs - contacts.keys())},
+                    status=status.HTTP_400_BAD_REQUEST,
+                )
+
+            contact_ids = sorted(contacts.values())
+
+        try:
+            with transaction.atomic():
+                run = start_billing_run(
+                    company=company,
+                    period=period,
+                    contact_ids=contact_ids,
+                    user=request.user,
+                )
+        except IntegrityError:
+            # started concurrently (unique_active_billing_run_per_period)
+            return active_run_conflict() or Response(
+                {"detail": "A billing run is already in progress"},
+                status=status.HTTP_409_CONFLICT,
+            )
+
+        return Response(
+            WHBillingRunSerializer(run).data,
+            status=status.HTTP_202_ACCEPTED,
+        )
+
+
+class WHBillingRunViewSet(viewsets.ReadOnlyModelViewSet):
+    permission_classes = [IsAuthenticated]
+    serializer_class = WHBillingRunSerializer
+    lookup_field = "uf"
+
+    def get_queryset(self):
+        company = get_user_company(self.request.user)
+
+        queryset = (
+            WHBillingRun.objects
+            .filter(company=company)
+            .select_related("period")
+            .order_by("-created_at")
+        )
+
+        period = self.request.query_params.get("period")
+
+        if period:
+            queryset = queryset.filter(period__uf=period)
+
+        return queryset
     
 
 class WHBillingDocumentViewSet(viewsets.ModelViewSet):
@@ -1,7 +1,8 @@
 from datetime import timedelta
 from decimal import Decimal
 
-from django.db.models import Sum, Q
+from django.core.cache import cache
+from django.db.models import Q, Sum
 from django.db.models.functions import Coalesce
 from django.utils import timezone
 from rest_framework.views import APIView
@@ -10,8 +11,18 @@ from rest_framework.permissions import IsAuthenticated
 
 from abb.utils import get_user_company
 from att.models import Contact
-from logistic.models import WHBillingCharge, WHStock, WHStockLedger
+from logistic.models import (
+    WHDashboardDailyRevenue,
+    WHDashboardOwnerStats,
+    WHInbound,
+    WHOutbound,
+    WHProduct,
+    WHStock,
+)
 from logistic.serializers.wms_dashboard import WmsDashboardCustomersSummarySerializer
+from logistic.services.wms_dashboard import dashboard_today
+
+DASHBOARD_CACHE_TTL = 60
 
 
 class WmsDashboardCustomersSummaryAPIView(APIView):
@@ -26,14 +37,27 @@ class WmsDashboardCustomersSummaryAPIView(APIView):
         except (TypeError, ValueError):
             days = 30
 
+        cache_key = f"wms_dashboard:customers_summary:{company.id}:{days}"
+        data = cache.get(cache_key)
+
+        if data is None:
+            data = WmsDashboardCustomersSummarySerializer(
+                self._summary(company, days)
+            ).data
+            cache.set(cache_key, data, DASHBOARD_CACHE_TTL)
+
+        return Response(data)
+
+    def _summary(self, company, days):
         since_dt = timezone.now() - timedelta(days=days)
+        since_day = dashboard_today() - timedelta(days=days)
 
         # -----------------------------
         # 1) TOP REVENUE CUSTOMERS
         # -----------------------------
         revenue_rows = (
-            WHBillingCharge.objects
-            .filter(company=company, created_at__gte=since_dt)
+            WHDashboardDailyRevenue.objects
+            .filter(company=company, day__gt=since_day)
             .values("contact__uf", "contact__company_name")
             .annotate(value=Coalesce(Sum("total"), Decimal("0")))
             .order_by("-value")[:10]
@@ -53,19 +77,17 @@ class WmsDashboardCustomersSummaryAPIView(APIView):
         # current stock in warehouse
         # -----------------------------
         pallet_rows = (
-            WHStock.objects
-            .filter(company=company, owner__isnull=False)
-            .values("owner__uf", "owner__company_name")
-            .annotate(value=Coalesce(Sum("pallets"), Decimal("0")))
-            .filter(value__gt=0)
-            .order_by("-value")[:10]
+            WHDashboardOwnerStats.objects
+            .filter(company=company, pallets__gt=0)
+            .values("owner__uf", "owner__company_name", "pallets")
+            .order_by("-pallets")[:10]
         )
 
         customers_by_pallet_usage = [
             {
                 "uf": row["owner__uf"],
                 "name": row["owner__company_name"] or "-",
-                "value": row["value"] or Decimal("0"),
+                "value": row["pallets"],
             }
             for row in pallet_rows
         ]
@@ -76,20 +98,23 @@ class WmsDashboardCustomersSummaryAPIView(APIView):
         # inactive = no ledger movement in last N days
         # -----------------------------
         customer_universe = Contact.objects.filter(
-            Q(owner_wh_products__company=company) |
-            Q(owner_wh_stocks__company=company) |
-            Q(owner_wh_inbounds__company=company) |
-            Q(owner_wh_outbounds__company=company)
-        ).distinct()
-
-        active_customer_ids = set(
-            WHStockLedger.objects
-            .filter(company=company, created_at__gte=since_dt)
-            .values_list("owner_id", flat=True)
-            .distinct()
+            Q(id__in=WHProduct.objects.filter(company=company).values("owner_id")) |
+            Q(id__in=WHStock.objects.filter(company=company).values("owner_id")) |
+            Q(id__in=WHInbound.objects.filter(company=company).values("owner_id")) |
+            Q(id__in=WHOutbound.objects.filter(company=company).values("owner_id"))
         )
 
-        inactive_qs = customer_universe.exclude(id__in=active_customer_ids).order_by("company_name")[:10]
+        active_customers = WHDashboardOwnerStats.objects.filter(
+            company=company,
+            last_movement_at__gte=since_dt,
+        ).values("owner_id")
+
+        inactive_qs = (
+            customer_universe
+            .exclude(id__in=active_customers)
+            .only("uf", "company_name")
+            .order_by("company_name")[:10]
+        )
 
         inactive_customers = [
             {
@@ -100,15 +125,12 @@ class WmsDashboardCustomersSummaryAPIView(APIView):
             for c in inactive_qs
         ]
 
-        payload = {
+        return {
             "top_revenue_customers": top_revenue_customers,
             "customers_by_pallet_usage": customers_by_pallet_usage,
             "inactive_customers": inactive_customers,
         }
 
-        serializer = WmsDashboardCustomersSummarySerializer(payload)
-        return Response(serializer.data)
-
 
 
 class WmsStorageOccupancyAPIView(APIView):
@@ -116,29 +138,35 @@ class WmsStorageOccupancyAPIView(APIView):
     def get(self, request):
         company = get_user_company(request.user)
 
-        qs = (
-            WHStock.objects
-            .filter(company=company)
-            .values("owner__id", "owner__company_name")
-            .annotate(
-                pallets=Sum("pallets"),
-                m2=Sum("area_m2"),
-                m3=Sum("volume_m3"),
-                units=Sum("quantity"),
+        cache_key = f"wms_dashboard:storage_occupancy:{company.id}"
+        data = cache.get(cache_key)
+
+        if data is None:
+            qs = (
+                WHDashboardOwnerStats.objects
+                .filter(company=company)
+                .values(
+                    "owner__id",
+                    "owner__company_name",
+                    "pallets",
+                    "area_m2",
+                    "volume_m3",
+                    "quantity",
+                )
+                .order_by("-pallets")[:10]
             )
-            .order_by("-pallets")[:10]
-        )
-
-        data = [
-            {
-                "id": r["owner__id"],
-                "name": r["owner__company_name"],
-                "pallets": r["pallets"] or 0,
-                "m2": r["m2"] or 0,
-                "m3": r["m3"] or 0,
-                "units": r["units"] or 0,
-            }
-            for r in qs
-        ]
 
-        return Response(data)
\ No newline at end of file
+            data = [
+                {
+                    "id": r["owner__id"],
+                    "name": r["owner__company_name"],
+                    "pallets": r["pallets"] or 0,
+                    "m2": r["area_m2"] or 0,
+                    "m3": r["volume_m3"] or 0,
+                    "units": r["quantity"] or 0,
+                }
+                for r in qs
+            ]
+            cache.set(cache_key, data, DASHBOARD_CACHE_TTL)
+
+        return Response(data)
@@ -1,18 +1,21 @@
 from decimal import Decimal, InvalidOperation
+from django.db import transaction
 from django.utils import timezone
 from rest_framework.viewsets import ModelViewSet
 from rest_framework.views import APIView
 from rest_framework.permissions import IsAuthenticated
 from rest_framework.decorators import action
+from rest_framework.exceptions import ValidationError
 from rest_framework.response import Response
 from rest_framework import status
 
 from abb.permissions import IsCompanyUserNotContactUser
 from abb.utils import get_user_company
 from att.models import Contact
-from logistic.models import WHHandlingFeeType, WHInbound, WHStock, WHStockLedger
+from logistic.models import WHHandlingFeeType, WHInbound, WHStockLedger
 from logistic.serializers.wms_inbound import (WHInboundChargeOptionSerializer, WHInboundDetailSerializer, 
                                               WHInboundSerializer)
+from logistic.services.wms_stock_posting import post_stock_movements
 from logistic.services.wms_tariffs import get_effective_contact_tariff, resolve_handling_unit_price
 
 
@@ -49,8 +52,11 @@ class WHInboundViewSet(ModelViewSet):
     
     # RECEIVE INBOUND   
     @action(detail=True, methods=["post"], permission_classes=[IsAuthenticated, IsCompanyUserNotContactUser])
+    @transaction.atomic
     def receive(self, request, uf=None):
         inbound = self.get_object()
+        # lock the document so two receive calls cannot both post stock
+        inbound = WHInbound.objects.select_for_update().get(pk=inbound.pk)
 
         if inbound.status == WHInbound.Status.RECEIVED:
             return Response(
@@ -63,42 +69,18 @@ class WHInboundViewSet(ModelViewSet):
         inbound.received_by = request.user
         inbound.save(update_fields=["status", "received_at", "received_by"])
 
-        for line in inbound.inbound_lines.all():
-            stock, _ = WHStock.objects.get_or_create(
-                company=inbound.company,
-                owner=inbound.owner,
-                product=line.product,
-                location=line.location,
-                pallet_type=line.pallet_type,
-                defaults=dict(
-                    quantity=0,
-                    pallets=0,
-                    area_m2=0,
-                    volume_m3=0,
-                ),
-            )
-
-            stock.quantity += line.quantity or 0
-            stock.pallets += line.pallets or 0
-            stock.area_m2 += line.area_m2 or 0
-            stock.volume_m3 += line.volume_m3 or 0
-            stock.save()
-
-            WHStockLedger.objects.create(
+        try:
+            post_stock_movements(
                 company=inbound.company,
-                owner=inbound.owner,
-                product=line.product,
-                location=line.location,
-                pallet_type=line.pallet_type,
-                delta_quantity=line.quantity or 0,
-                delta_pallets=line.pallets or 0,
-                delta_area_m2=line.area_m2 or 0,
-                delta_volume_m3=line.volume_m3 or 0,
+                owner_id=inbound.owner_id,
+                lines=inbound.inbound_lines.all(),
+                direction="in",
                 source_type=WHStockLedger.SourceType.INBOUND,
                 source_uf=inbound.uf,
                 actor_user=request.user,
-                movement_direction="in",
             )
+        except ValueError as exc:
+            raise ValidationError(str(exc))
 
         return Response({"status": "received"})
     
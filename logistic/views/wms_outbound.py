@@ -13,8 +13,9 @@ from rest_framework.exceptions import ValidationError
 
 from abb.utils import get_user_company
 from att.models import Contact
-from logistic.models import WHHandlingFeeType, WHOutbound, WHStock, WHStockLedger
+from logistic.models import WHHandlingFeeType, WHOutbound, WHStockLedger
 from logistic.serializers.wms_outbound import WHOutboundChargeOptionSerializer, WHOutboundDetailSerializer, WHOutboundListSerializer
+from logistic.services.wms_stock_posting import post_stock_movements
 from logistic.services.wms_tariffs import get_effective_contact_tariff, resolve_handling_price
 
 
@@ -72,56 +73,18 @@ class WHOutboundViewSet(ModelViewSet):
                 status=status.HTTP_400_BAD_REQUEST,
             )
 
-        company = get_user_company(request.user)
-
-        for line in outbound.outbound_lines.all():
-            stock, _ = WHStock.objects.get_or_create(
-                company=company,
-                owner=outbound.owner,
-                product=line.product,
-                location=line.location,
-                pallet_type=line.pallet_type,
-                defaults={
-                    "quantity": 0,
-                    "pallets": 0,
-                    "area_m2": 0,
-                    "volume_m3": 0,
-                },
-            )
-
-            if stock.quantity < (line.quantity or 0):
-                raise ValidationError("Not enough quantity in stock")
-
-            if stock.pallets < (line.pallets or 0):
-                raise ValidationError("Not enough pallets in stock")
-
-            if stock.area_m2 < (line.area_m2 or 0):
-                raise ValidationError("Not enough area in stock")
-
-            if stock.volume_m3 < (line.volume_m3 or 0):
-                raise ValidationError("Not enough volume in stock")
-
-            WHStockLedger.objects.create(
-                company=company,
-                owner=outbound.owner,
-                product=line.product,
-                location=line.location,
-                pallet_type=line.pallet_type,
-                delta_quantity=-(line.quantity or 0),
-                delta_pallets=-(line.pallets or 0),
-                delta_area_m2=-(line.area_m2 or 0),
-                delta_volume_m3=-(line.volume_m3 or 0),
+        try:
+            post_stock_movements(
+                company=outbound.company,
+                owner_id=outbound.owner_id,
+                lines=outbound.outbound_lines.all(),
+                direction="out",
                 source_type=WHStockLedger.SourceType.OUTBOUND,
                 source_uf=outbound.uf,
                 actor_user=request.user,
-                movement_direction="out",
             )
-
-            stock.quantity -= (line.quantity or 0)
-            stock.pallets -= (line.pallets or 0)
-            stock.area_m2 -= (line.area_m2 or 0)
-            stock.volume_m3 -= (line.volume_m3 or 0)
-            stock.save(update_fields=["quantity", "pallets", "area_m2", "volume_m3"])
+        except ValueError as exc:
+            raise ValidationError(str(exc))
 
         outbound.status = "shipped"
         outbound.shipped_at = timezone.now()
@@ -1,20 +1,25 @@
-from io import BytesIO
-from datetime import datetime
-from zoneinfo import ZoneInfo
-from django.db.models import F, Q
-from django.http import HttpResponse
-from django.utils import timezone
-from django.utils.translation import gettext as _
+from django.core.files.storage import default_storage
+from django.http import FileResponse, HttpResponseForbidden, JsonResponse
+from django.views import View
+from rest_framework import status
 from rest_framework.viewsets import ReadOnlyModelViewSet
 from rest_framework.permissions import IsAuthenticated
 from rest_framework.decorators import action
 from rest_framework.response import Response
-from openpyxl import Workbook
-from openpyxl.styles import Font
 
-from abb.utils import get_user_company
+from abb.exports import EXPORT_FORMATS, export_response
+from abb.pagination import StockMovementCursorPagination
+from abb.utils import get_user_company, verify_signed_url
 from logistic.models import WHStock, WHStockLedger
 from logistic.serializers.wms_stock import WHStockSerializer
+from logistic.services.wms_exports import (
+    EXPORTS,
+    export_filename,
+    export_storage_name,
+    filter_movements_queryset,
+    filter_stock_queryset,
+    start_background_export,
+)
 
 
 class WHStockViewSet(ReadOnlyModelViewSet):
@@ -36,303 +41,133 @@ class WHStockViewSet(ReadOnlyModelViewSet):
             )
         )
 
-        owner = self.request.query_params.get("owner")
-        product = self.request.query_params.get("product")
-        location = self.request.query_params.get("location")
-        pallet_type = self.request.query_params.get("pallet_type")
-        in_stock = self.request.query_params.get("in_stock")
+        return filter_stock_queryset(qs, self.request.query_params)
 
-
-        if owner:
-            qs = qs.filter(product__owner__uf=owner)
-
-        if product:
-            qs = qs.filter(product__uf=product)
-
-        if location:
-            qs = qs.filter(location__uf=location)
-        
-        print('2114', len(qs), pallet_type)
-
-        if pallet_type:
-            qs = qs.filter(pallet_type=pallet_type)
-
-        if in_stock == "true":
-            qs = qs.filter(
-                Q(quantity__gt=0) |
-                Q(pallets__gt=0) |
-                Q(area_m2__gt=0) |
-                Q(volume_m3__gt=0)
-            )
-
-        return qs.order_by(
-            "product__name",
-            "location__code",
-            "pallet_type",
-        )
-    
-    # RECEIVE INBOUND   
+    # STOCK MOVEMENTS
     @action(detail=False, methods=["get"], permission_classes=[IsAuthenticated])
     def movements(self, request):
+        """
+        Cursor-paginated ledger rows, newest first.
+        Filters: owner, product, location, source_type, date_from, date_to (YYYY-MM-DD).
+        """
         company = get_user_company(request.user)
 
-        product = request.GET.get("product")
-        owner = request.GET.get("owner")
-        location = request.GET.get("location")
+        try:
+            qs = filter_movements_queryset(
+                WHStockLedger.objects.filter(company=company),
+                request.query_params,
+            )
+        except ValueError as exc:
+            return Response({"detail": str(exc)}, status=400)
 
-        qs = (
-            WHStockLedger.objects
-            .filter(company=company)
-            .select_related("product", "location", "owner")
-            .order_by("-created_at")
+        qs = qs.values(
+            "id",
+            "uf",
+            "product__name",
+            "location__name",
+            "owner__company_name",
+            "delta_quantity",
+            "delta_pallets",
+            "delta_area_m2",
+            "delta_volume_m3",
+            "movement_direction",
+            "source_type",
+            "created_at",
         )
 
-        if product:
-            qs = qs.filter(product__uf=product)
-
-        if owner:
-            qs = qs.filter(owner__uf=owner)
-
-        if location:
-            qs = qs.filter(location__uf=location)
+        paginator = StockMovementCursorPagination()
+        page = paginator.paginate_queryset(qs, request, view=self)
 
         data = [
             {
-                "id": x.uf,
-                "product_name": x.product.name,
-                "location_name": x.location.name,
-                "owner_name": x.owner.company_name,
-                "delta_quantity": x.delta_quantity,
-                "delta_pallets": x.delta_pallets,
-                "delta_m2": x.delta_area_m2,
-                "delta_m3": x.delta_volume_m3,
-                "movement_direction": x.movement_direction,
-                "source_type": x.source_type,
-                "created_at": x.created_at,
+                "id": x["uf"],
+                "product_name": x["product__name"],
+                "location_name": x["location__name"],
+                "owner_name": x["owner__company_name"],
+                "delta_quantity": x["delta_quantity"],
+                "delta_pallets": x["delta_pallets"],
+                "delta_m2": x["delta_area_m2"],
+                "delta_m3": x["delta_volume_m3"],
+                "movement_direction": x["movement_direction"],
+                "source_type": x["source_type"],
+                "created_at": x["created_at"],
             }
-            for x in qs
+            for x in page
         ]
 
-        return Response(data)
+        return paginator.get_paginated_response(data)
 
-    # EXPORT EXCEL
-    @action(detail=False, methods=["get"], permission_classes=[IsAuthenticated])
-    def export(self, request):
-        queryset = self.get_queryset()
-
-        wb = Workbook()
-        ws = wb.active
-        ws.title = _("stock")
-
-        user_tz = "Europe/Chisinau"
-        timezone.activate(ZoneInfo(user_tz))
-
-        now = timezone.localtime(timezone.now())
-
-        # top meta rows
-        ws["A1"] = _("stock_export")
-        ws["A1"].font = Font(bold=True, size=14)
-
-        ws["A2"] = _("exported_at")
-        ws["B2"] = now.strftime("%d-%m-%Y %H:%M")        
-
-        headers = [
-            _("owner"),
-            _("product_sku"),
-            _("product_name"),
-            _("location"),
-            _("pallet_type"),
-            _("quantity"),
-            _("pallets"),
-            _("area_m2"),
-            _("area_m3"),
-        ]
-
-        header_row = 4
-        for col_idx, header in enumerate(headers, start=1):
-            cell = ws.cell(row=header_row, column=col_idx, value=header)
-            cell.font = Font(bold=True)
-
-        data_row = header_row + 1
-
-        for row in queryset:
-            ws.cell(row=data_row, column=1, value=getattr(row.owner, "company_name", "") if row.owner else "")
-            ws.cell(row=data_row, column=2, value=getattr(row.product, "sku", "") if row.product else "")
-            ws.cell(row=data_row, column=3, value=getattr(row.product, "name", "") if row.product else "")
-            ws.cell(row=data_row, column=4, value=getattr(row.location, "name", "") if row.location else "")
-            ws.cell(
-                row=data_row,
-                column=5,
-                value=row.get_pallet_type_display() if row.pallet_type else ""
+    def _export(self, request, kind):
+        """
+        file_format=xlsx|csv, background=true queues the export and returns
+        a signed download link instead of the file.
+        """
+        company = get_user_company(request.user)
+        params = request.query_params
+
+        file_format = params.get("file_format") or "xlsx"
+        if file_format not in EXPORT_FORMATS:
+            return Response({"detail": "Unsupported file_format"}, status=400)
+
+        build, _filters = EXPORTS[kind]
+
+        try:
+            # only builds the queryset, rows are read when the response is written
+            now, export = build(company, params)
+        except ValueError as exc:
+            return Response({"detail": str(exc)}, status=400)
+
+        if params.get("background") == "true":
+            download_url = start_background_export(
+                kind=kind,
+                company=company,
+                params=params,
+                file_format=file_format,
             )
-            ws.cell(row=data_row, column=6, value=float(row.quantity or 0))
-            ws.cell(row=data_row, column=7, value=float(row.pallets or 0))
-            ws.cell(row=data_row, column=8, value=float(row.area_m2 or 0))
-            ws.cell(row=data_row, column=9, value=float(row.volume_m3 or 0))
-
-            data_row += 1
+            return Response({"download_url": download_url}, status=status.HTTP_202_ACCEPTED)
 
-        # simple column widths
-        widths = {
-            "A": 24,
-            "B": 18,
-            "C": 30,
-            "D": 18,
-            "E": 18,
-            "F": 12,
-            "G": 12,
-            "H": 12,
-            "I": 12,
-        }
-        for col, width in widths.items():
-            ws.column_dimensions[col].width = width
-
-        output = BytesIO()
-        wb.save(output)
-        output.seek(0)
-
-        filename_dt = now.strftime("%Y%m%d_%H%M%S")
-        response = HttpResponse(
-            output.getvalue(),
-            content_type="application/vnd.openxmlformats-officedocument.spreadsheetml.sheet",
+        return export_response(
+            export,
+            file_format=file_format,
+            filename=export_filename(kind, now),
         )
-        response["Content-Disposition"] = f'attachment; filename="stock_{filename_dt}.xlsx"'
-        return response
 
+    # EXPORT EXCEL
+    @action(detail=False, methods=["get"], permission_classes=[IsAuthenticated])
+    def export(self, request):
+        return self._export(request, "stock")
 
     # EXPORT STOCK MOVEMENT
     @action(detail=False, methods=["get"], permission_classes=[IsAuthenticated], url_path="movements/export")
     def export_movements(self, request):
-        company = get_user_company(request.user)
+        return self._export(request, "stock_movements")
 
-        qs = (
-            WHStockLedger.objects
-            .filter(company=company)
-            .select_related("product", "location", "owner")
-            .order_by("-created_at", "-id")
-        )
-
-        owner = request.query_params.get("owner")
-        product = request.query_params.get("product")
-        location = request.query_params.get("location")
-
-        if owner:
-            qs = qs.filter(owner__uf=owner)
-
-        if product:
-            qs = qs.filter(product__uf=product)
 
-        if location:
-            qs = qs.filter(location__uf=location)
+class WmsExportDownloadView(View):
+    """
+    Signed download of a background export (start_background_export).
+    """
 
-        wb = Workbook()
-        ws = wb.active
-        ws.title = _("stock_movements")
+    def get(self, request, token, filename):
+        expires = request.GET.get("expires")
+        signature = request.GET.get("signature")
 
-        user_tz = "Europe/Chisinau"
-        timezone.activate(ZoneInfo(user_tz))
+        if not expires or not signature:
+            return HttpResponseForbidden("Missing signature")
 
-        now = timezone.localtime(timezone.now())
+        if not verify_signed_url(request.path, expires, signature):
+            return HttpResponseForbidden("Invalid or expired URL")
 
-        ws["A1"] = _("stock_movements_export")
-        ws["A1"].font = Font(bold=True, size=14)
-
-        ws["A2"] = _("exported_at")
-        ws["B2"] = now.strftime("%d-%m-%Y %H:%M")
-
-        headers = [
-            _("date"),
-            _("owner"),
-            _("product"),
-            _("location"),
-            _("direction"),
-            _("source"),
-            _("pallet_type"),
-            _("pallets"),
-            _("area_m2"),
-            _("area_m3"),
-            _("units"),
-        ]
+        name = export_storage_name(token, filename)
 
-        header_row = 4
-        for col_idx, header in enumerate(headers, start=1):
-            cell = ws.cell(row=header_row, column=col_idx, value=header)
-            cell.font = Font(bold=True)
+        if not default_storage.exists(name):
+            return JsonResponse({"detail": "Export is not ready yet"}, status=202)
 
-        row_num = header_row + 1
-
-        for row in qs:
-            ws.cell(
-                row=row_num,
-                column=1,
-                value=timezone.localtime(row.created_at).strftime("%Y-%m-%d %H:%M:%S")
-                if row.created_at else "",
-            )
-            ws.cell(
-                row=row_num,
-                column=2,
-                value=row.owner.company_name if row.owner else "",
-            )
-            ws.cell(
-                row=row_num,
-                column=3,
-                value=row.product.name if row.product else "",
-            )
-            ws.cell(
-                row=row_num,
-                column=4,
-                value=row.location.name if row.location else "",
-            )
-            ws.cell(
-                row=row_num,
-                column=5,
-                value=_("inbound") if row.movement_direction == "in"
-                else _("outbound") if row.movement_direction == "out"
-                else "",
-            )
-            ws.cell(
-                row=row_num,
-                column=6,
-                value=_(row.get_source_type_display()) if row.source_type else "",
-            )
-            ws.cell(
-                row=row_num,
-                column=7,
-                value=row.get_pallet_type_display() if row.pallet_type else "",
-            )
-            ws.cell(row=row_num, column=8, value=float(row.delta_pallets or 0))
-            ws.cell(row=row_num, column=9, value=float(row.delta_area_m2 or 0))
-            ws.cell(row=row_num, column=10, value=float(row.delta_volume_m3 or 0))
-            ws.cell(row=row_num, column=11, value=float(row.delta_quantity or 0))
-
-            row_num += 1
-
-        widths = {
-            "A": 20,
-            "B": 24,
-            "C": 30,
-            "D": 18,
-            "E": 14,
-            "F": 16,
-            "G": 18,
-            "H": 12,
-            "I": 12,
-            "J": 12,
-            "K": 12,
-        }
-        for col, width in widths.items():
-            ws.column_dimensions[col].width = width
-
-        output = BytesIO()
-        wb.save(output)
-        output.seek(0)
-
-        filename_dt = now.strftime("%Y%m%d_%H%M%S")
-        response = HttpResponse(
-            output.getvalue(),
-            content_type="application/vnd.openxmlformats-officedocument.spreadsheetml.sheet",
-        )
-        response["Content-Disposition"] = (
-            f'attachment; filename="stock_movements_{filename_dt}.xlsx"'
+        response = FileResponse(
+            default_storage.open(name, "rb"),
+            as_attachment=True,
+            filename=filename,
         )
-        return response
\ No newline at end of file
+        response["Cache-Control"] = "no-store"
+        response["X-Robots-Tag"] = "noindex, nofollow"
+        return response
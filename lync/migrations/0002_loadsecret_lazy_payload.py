@@ -0,0 +1,19 @@
+# Generated by Django 5.2.10 on 2026-10-17 12:52
+
+import abb.security.fields
+from django.db import migrations
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('lync', '0001_initial'),
+    ]
+
+    operations = [
+        migrations.AlterField(
+            model_name='loadsecret',
+            name='payload',
+            field=abb.security.fields.EncryptedJSONField(blank=True, lazy=True, null=True),
+        ),
+    ]
@@ -22,7 +22,8 @@ class LoadSecret(models.Model):
         db_index=True
     )
 
-    payload = EncryptedJSONField(blank=True, null=True)
+    # decrypted on first access of secret.payload
+    payload = EncryptedJSONField(blank=True, null=True, lazy=True)
 
     created_by = models.ForeignKey(
         User,